@@ -0,0 +1,55 @@
+"""
+Замер сводного отчёта по профилям (DataManager.consolidated_report) на
+синтетических профилях: чтение и подсчёт профилей по одному в приложении и
+в отдельных процессах. Заодно проверяется, что оба способа дают одинаковый
+отчёт.
+
+Запуск из корня репозитория:
+    python benchmarks/consolidated_report.py [--profiles 8] [--orders 5000] [--workers 0]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+from synthetic import make_profile  # noqa: E402
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--profiles", type=int, default=8)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--backend", default="sharded")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp()
+    dm = main.DataManager(storage_backend=args.backend, write_behind_delay=0, data_dir=data_dir)
+    for i in range(args.profiles):
+        dm.update_profile_data(f"bench{i}", make_profile(args.products, args.orders, seed=i))
+    dm.close()
+
+    today = date.today()
+    date_from = today - timedelta(days=365)
+    print(f"Профилей: {args.profiles}, заказов в каждом: {args.orders}, ядер: {os.cpu_count()}")
+    reports = []
+    for label, workers in (("в приложении", 1), ("в процессах", args.workers)):
+        # Профили не загружены: каждый раз читаются из файлов
+        dm = main.DataManager(storage_backend=args.backend, write_behind_delay=0, data_dir=data_dir)
+        started = time.perf_counter()
+        reports.append(dm.consolidated_report(date_from, today, workers=workers))
+        print(f"{label:>14}: {(time.perf_counter() - started) * 1000:8.1f} мс")
+        dm.close()
+    assert reports[0] == reports[1], "отчёты разошлись"
+
+
+if __name__ == '__main__':
+    main_benchmark()
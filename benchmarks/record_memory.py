@@ -0,0 +1,56 @@
+"""
+Замер памяти профиля в виде словарей и в виде записей модели
+(Product, Order, OrderItem, StockEntry) через tracemalloc.
+
+Запуск из корня репозитория:
+    python benchmarks/record_memory.py [--orders 20000] [--products 200]
+"""
+import os
+import sys
+import json
+import argparse
+import tracemalloc
+
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+from synthetic import make_profile  # noqa: E402
+
+
+def traced(build):
+    """Объём памяти, занятой результатом build(), в байтах"""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--products", type=int, default=200)
+    args = parser.parse_args()
+
+    text = json.dumps(make_profile(args.products, args.orders), ensure_ascii=False)
+    # Оба варианта строятся из одного текста, как при загрузке файла
+    as_dicts, dict_size = traced(lambda: json.loads(text))
+    as_records, record_size = traced(lambda: main._profile_to_records(json.loads(text)))
+
+    # Преобразование без потерь: тот же JSON байт в байт
+    codec = main.JsonCodec('json')
+    assert codec.dumps(as_records, indent=True) == codec.dumps(as_dicts, indent=True)
+    assert as_records == as_dicts
+
+    history = sum(len(s["history"]) for s in as_dicts["stock"].values())
+    items = sum(len(o["items"]) for o in as_dicts["orders"])
+    print(f"Профиль: товаров {args.products}, заказов {args.orders}, "
+          f"позиций {items}, операций склада {history}")
+    print(f"словари: {dict_size / 1024 / 1024:8.1f} МБ")
+    print(f"записи:  {record_size / 1024 / 1024:8.1f} МБ   ({record_size / dict_size:.0%})")
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,63 @@
+"""
+Замер анализа продаж за период (DataManager.sales_analysis: строки с прибылью
+и затратами и итог) на синтетическом профиле: расчёт по своду продаж и
+векторный расчёт по столбцам позиций заказов (NumPy). Заодно проверяется,
+что оба способа дают одинаковые числа.
+
+Запуск из корня репозитория (нужен NumPy):
+    python benchmarks/sales_analysis.py [--orders 20000] [--products 200] [--repeat 10]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import timeit
+from datetime import date, timedelta
+
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+from synthetic import make_profile  # noqa: E402
+
+
+def analysis(dm, engine, date_from, date_to):
+    """Анализ выбранным способом без кэша результатов"""
+    dm.analytics_engine = engine
+    dm._analysis_cache = main.LRUCache(main.ANALYSIS_CACHE_SIZE)
+    return dm.sales_analysis("bench", date_from, date_to)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+    if main.numpy is None:
+        sys.exit("NumPy не установлен")
+
+    dm = main.DataManager(storage_backend='sharded', write_behind_delay=0,
+                          data_dir=tempfile.mkdtemp())
+    dm.update_profile_data("bench", make_profile(args.products, args.orders))
+
+    today = date.today()
+    print(f"Профиль: товаров {args.products}, заказов {args.orders}")
+    print(f"{'период':>8} {'свод, мс':>10} {'NumPy, мс':>10} {'строк':>6}")
+    for days in (7, 30, 365):
+        date_from = today - timedelta(days=days)
+        rollup = analysis(dm, 'python', date_from, today)
+        vector = analysis(dm, 'numpy', date_from, today)
+        assert rollup == vector, "расчёты разошлись"
+        timings = [
+            timeit.timeit(lambda: analysis(dm, engine, date_from, today), number=args.repeat)
+            for engine in ('python', 'numpy')
+        ]
+        print(f"{days:>6} д {timings[0] / args.repeat * 1000:>10.2f} "
+              f"{timings[1] / args.repeat * 1000:>10.2f} {len(vector[0]):>6}")
+    dm.close()
+
+
+if __name__ == '__main__':
+    main_benchmark()
@@ -0,0 +1,67 @@
+"""
+Замер запроса продаж за период (DataManager.query_sales) на синтетическом
+профиле: прежний полный проход по заказам с разбором дат, чтение свода продаж
+и итог за период по суммам свода (DataManager.sales_totals).
+
+Запуск из корня репозитория:
+    python benchmarks/sales_query.py [--orders 20000] [--products 200] [--repeat 20]
+"""
+import os
+import sys
+import argparse
+import tempfile
+import timeit
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+from synthetic import make_profile  # noqa: E402
+
+
+def full_scan(orders, date_from, date_to):
+    """Прежний способ: разбор даты каждого заказа и проверка попадания в период"""
+    sales_data = defaultdict(lambda: defaultdict(lambda: [0.0, 0.0]))
+    for order in orders:
+        order_date = datetime.strptime(order.date, "%Y-%m-%d").date()
+        if not (date_from <= order_date <= date_to):
+            continue
+        for item in order.positions:
+            sales_data[order.date][item.product_id][0] += item.quantity
+            sales_data[order.date][item.product_id][1] += item.total
+    return sum(len(v) for v in sales_data.values())
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    dm = main.DataManager(storage_backend='sharded', write_behind_delay=0,
+                          data_dir=tempfile.mkdtemp())
+    dm.update_profile_data("bench", make_profile(args.products, args.orders))
+    orders = dm.get_profile_data("bench")["orders"]
+
+    today = date.today()
+    # Индекс итогов строится при первом обращении — вне замеров
+    dm.sales_totals("bench", today, today)
+    print(f"Профиль: товаров {args.products}, заказов {args.orders}")
+    print(f"{'период':>8} {'полный проход, мс':>18} {'свод, мс':>11} {'итог, мс':>11} {'строк':>6}")
+    for days in (7, 30, 365):
+        date_from = today - timedelta(days=days)
+        scan = timeit.timeit(lambda: full_scan(orders, date_from, today), number=args.repeat)
+        rollup = timeit.timeit(lambda: dm.query_sales("bench", date_from, today), number=args.repeat)
+        totals = timeit.timeit(lambda: dm.sales_totals("bench", date_from, today), number=args.repeat)
+        rows = len(dm.query_sales("bench", date_from, today))
+        print(f"{days:>6} д {scan / args.repeat * 1000:>18.2f} "
+              f"{rollup / args.repeat * 1000:>11.2f} {totals / args.repeat * 1000:>11.2f} {rows:>6}")
+    dm.close()
+
+
+if __name__ == '__main__':
+    main_benchmark()
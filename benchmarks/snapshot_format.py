@@ -0,0 +1,64 @@
+"""
+Замер форматов SNAPSHOT_FORMAT и JSON-кодеков: размер файла, время записи
+и чтения синтетического профиля через DataManager._save_safe / _load_safe.
+
+Запуск из корня репозитория:
+    python benchmarks/snapshot_format.py [--orders 20000] [--products 200]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import main  # noqa: E402
+from synthetic import make_profile  # noqa: E402
+
+FORMATS = ('json', 'compact', 'gzip', 'zlib', 'lzma')
+
+
+def best_of(repeat: int, func) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3, help="повторов на формат (не меньше 2)")
+    args = parser.parse_args()
+
+    profiles = {"Синтетика": make_profile(args.products, args.orders)}
+    print(f"Профиль: товаров {args.products}, заказов {args.orders}")
+    codecs = ['json'] + [name for name in ('orjson', 'msgspec') if getattr(main, name) is not None]
+    print(f"{'кодек':<8} {'формат':<8} {'размер, КБ':>11} {'запись, мс':>11} {'чтение, мс':>11}")
+    baseline = None
+    for codec, fmt in [(codec, fmt) for codec in codecs for fmt in FORMATS]:
+        with tempfile.TemporaryDirectory() as data_dir:
+            dm = main.DataManager(storage_backend='json', write_behind_delay=0,
+                                  snapshot_format=fmt, data_dir=data_dir)
+            dm.codec = main.JsonCodec(codec)
+            path = os.path.join(data_dir, "bench.json")
+            # Снимок в бэкап делается только при первой записи (BACKUP_INTERVAL),
+            # поэтому минимум по повторам — время самой записи
+            save = best_of(args.repeat, lambda: dm._save_safe(profiles, path))
+            load = best_of(args.repeat, lambda: dm._load_safe(path))
+            assert dm._load_safe(path) == profiles
+            size = os.path.getsize(path)
+            dm.close()
+        baseline = baseline or size
+        print(f"{codec:<8} {fmt:<8} {size / 1024:>11.0f} {save * 1000:>11.1f} {load * 1000:>11.1f}"
+              f"   ({size / baseline:.0%} от json)")
+
+
+if __name__ == '__main__':
+    main_benchmark()
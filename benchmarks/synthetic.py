@@ -0,0 +1,57 @@
+"""
+Синтетический профиль для замеров: товары, складская история и заказы
+в той же структуре, что создаёт приложение
+"""
+import random
+from datetime import date, timedelta
+from typing import Dict
+
+
+def make_profile(products: int = 200, orders: int = 20000, days: int = 730, seed: int = 1) -> Dict:
+    """Профиль с заданным числом товаров и заказов за последние days дней"""
+    rnd = random.Random(seed)
+    start = date.today() - timedelta(days=days)
+    data = {"products": [], "stock": {}, "orders": [], "daily_stats": {}, "next_order_number": 1}
+    for i in range(products):
+        name = f"Товар {i:04d}"
+        cost = round(rnd.uniform(100, 900), 2)
+        data["products"].append({
+            "id": i + 1, "name": name, "cost_price": cost, "profit": round(cost * 0.2, 2),
+            "expenses": round(cost * 0.05, 2), "percent_expenses": 5.0, "percent_profit": 20.0
+        })
+        balance = 0.0
+        history = []
+        for _ in range(rnd.randint(2, 10)):
+            day = start + timedelta(days=rnd.randrange(days))
+            qty = float(rnd.randint(5, 50))
+            balance += qty
+            history.append({"date": f"{day.isoformat()} 10:00:00", "quantity": qty,
+                            "price_per_kg": cost, "operation": "приход",
+                            "total_amount": qty * cost, "balance_after": balance})
+        history.sort(key=lambda h: h["date"])
+        data["stock"][str(i + 1)] = {"current_quantity": balance, "total_value": balance * cost,
+                               "history": history}
+    order_dates = sorted(start + timedelta(days=rnd.randrange(days)) for _ in range(orders))
+    for number, day in enumerate(order_dates, 1):
+        items = []
+        for product in rnd.sample(data["products"], rnd.randint(1, 5)):
+            qty = float(rnd.randint(1, 10))
+            price = product["cost_price"] + product["profit"] + product["expenses"]
+            items.append({"product_id": product["id"], "quantity": qty,
+                          "cost_price": price, "total": qty * price})
+        subtotal = sum(item["total"] for item in items)
+        delivery = float(rnd.choice([0, 0, 150, 300]))
+        data["orders"].append({"number": number, "date": day.isoformat(), "items": items,
+                               "subtotal": subtotal, "delivery_cost": delivery,
+                               "total": subtotal + delivery})
+        stats = data["daily_stats"].setdefault(day.isoformat(), {
+            "orders_count": 0, "delivery_count": 0, "delivery_sum": 0.0, "total_revenue": 0.0
+        })
+        stats["orders_count"] += 1
+        if delivery:
+            stats["delivery_count"] += 1
+            stats["delivery_sum"] += delivery
+        stats["total_revenue"] += subtotal + delivery
+    data["next_order_number"] = orders + 1
+    data["next_product_id"] = products + 1
+    return data
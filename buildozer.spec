@@ -4,8 +4,11 @@ package.name = ordermanager
 package.domain = org.example
 source.dir = .
 source.include_exts = py,png,jpg,kv,atlas,json
+source.exclude_dirs = benchmarks,tests
 version = 0.1
-requirements = python3,kivy==2.2.0
+# main.py требует Python 3.10+ (bisect с key=); sqlite3 — модуль стандартной
+# библиотеки, который python-for-android собирает отдельным рецептом
+requirements = python3==3.11.5,hostpython3==3.11.5,sqlite3,kivy==2.2.0
 orientation = portrait
 fullscreen = 0
 android.permissions = INTERNET,READ_EXTERNAL_STORAGE,WRITE_EXTERNAL_STORAGE
@@ -4,12 +4,46 @@
 ВЕРСИЯ ДЛЯ ANDROID: все пути к данным используют user_data_dir
 """
 import os
+import re
 import json
 import sys
 import shutil
+import copy
+import zlib
+import gzip
+import lzma
+import bisect
+import heapq
+import hashlib
+import sqlite3
+import threading
+import time
+import multiprocessing
+import urllib.parse
 from datetime import datetime, date, timedelta
-from collections import defaultdict
-from typing import Dict, List, Optional, Any, Tuple
+from array import array
+from itertools import groupby
+from collections import defaultdict, OrderedDict
+from collections.abc import Mapping, MutableMapping
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+# Быстрые JSON-библиотеки (необязательные): используются, если установлены
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+# NumPy (необязательно): векторный анализ продаж, без него — расчёт по своду продаж
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 # === ИМПОРТЫ KIVY ===
 from kivy.app import App
@@ -25,15 +59,17 @@ from kivy.uix.dropdown import DropDown
 from kivy.graphics import Color, Rectangle, Line
 from kivy.core.window import Window
 from kivy.clock import Clock
+from kivy.utils import escape_markup, platform
 
 # === НАСТРОЙКИ ОКНА (адаптивность) ===
-# На Android не меняем размер — полноэкранный режим; на ПК — удобное окно
+# На Android не меняем размер — полноэкранный режим; на ПК — удобное окно.
+# Без дисплея (тесты, замеры, процессы сводного отчёта) окна нет: Window is None
 try:
-    from kivy.utils import platform
-    if platform != 'android':
+    if platform != 'android' and Window is not None:
         Window.size = (360, 640)
 except Exception:
-    Window.size = (360, 640)
+    if Window is not None:
+        Window.size = (360, 640)
 
 
 def get_table_width():
@@ -69,6 +105,63 @@ BTN_TILE_H = 118
 BTN_ACTION_H = 52
 BTN_BACK_H = 48
 
+# === НАСТРОЙКИ ХРАНИЛИЩА ===
+# 'json'    — единый profiles.json, полная перезапись при каждом сохранении
+# 'journal' — profiles.json как снимок + журнал изменений profiles.journal
+# 'sharded' — каталог на профиль + индекс profiles/index.json; заказы,
+#             дневная статистика и свод продаж разбиты на файлы-части
+#             (данные из profiles.json переносятся автоматически, прежний
+#             файл остаётся как profiles.json.migrated; при возврате на
+#             'json' или 'journal' профили переносятся обратно в profiles.json)
+# 'sqlite'  — база profiles.db с таблицами товаров, склада и заказов
+#             (данные из каталогов или profiles.json переносятся автоматически)
+STORAGE_BACKEND = 'sharded'
+# Контрольная точка (перезапись снимка) после стольких записей или байт журнала
+JOURNAL_CHECKPOINT_RECORDS = 500
+JOURNAL_CHECKPOINT_BYTES = 512 * 1024
+# Отложенная запись: изменения копятся в памяти и сохраняются фоновым потоком
+# через столько секунд после первого изменения; 0 — запись сразу
+WRITE_BEHIND_DELAY = 1.5
+# Бэкапы: не чаще одного снимка файла за столько секунд; хранение — дней
+BACKUP_INTERVAL = 10 * 60
+BACKUP_KEEP_DAYS = 7
+# Формат файлов данных и фрагментов бэкапа:
+# 'json' — читаемый JSON с отступами, 'compact' — JSON без пробелов,
+# 'gzip' / 'zlib' / 'lzma' — компактный JSON со сжатием.
+# При чтении формат определяется автоматически, поэтому его можно менять
+# в любой момент: файлы перезаписываются в новом формате по мере сохранения.
+SNAPSHOT_FORMAT = 'json'
+# Сколько профилей держать в памяти целиком (хранилища 'sharded' и 'sqlite');
+# остальные выгружаются, начиная с давно не открывавшихся
+MAX_RESIDENT_PROFILES = 3
+# JSON-кодек: 'auto' — orjson или msgspec, если установлены, иначе стандартный json
+JSON_CODEC = 'auto'
+# Сколько результатов анализа продаж хранить в кэше (по давности использования)
+ANALYSIS_CACHE_SIZE = 32
+# Расчёт анализа продаж: 'auto' — NumPy, если установлен; 'numpy'; 'python' — по своду продаж
+ANALYTICS_ENGINE = 'auto'
+# Сколько секунд кадра отводить на отрисовку строк анализа продаж
+ANALYSIS_FRAME_BUDGET = 0.008
+# Шаг строк анализа продаж: день или уровень свода (неделя, месяц, квартал)
+SALES_GRANULARITIES = {
+    'day': 'По дням',
+    'week': 'По неделям',
+    'month': 'По месяцам',
+    'quarter': 'По кварталам',
+}
+# Сравнение анализа продаж с другим периодом той же длины
+SALES_COMPARISONS = {
+    'none': 'Без сравнения',
+    'previous': 'С прошлым периодом',
+    'year': 'С прошлым годом',
+}
+# Процессов для сводного отчёта по профилям: 0 — по числу ядер; 1 — без
+# отдельных процессов (на Android и iOS отчёт всегда считается в приложении)
+REPORT_WORKERS = 0
+# Сверять сводку склада с пересчётом по остаткам при каждой загрузке профиля
+# (отладка); без неё сводка пересчитывается только при переходе формата данных
+VERIFY_STOCK_TOTALS = False
+
 # ============================================================================
 # МОДУЛЬ: БИЗНЕС-ЛОГИКА (ВСЕ РАСЧЕТЫ СОХРАНЕНЫ БЕЗ ИЗМЕНЕНИЙ)
 # ============================================================================
@@ -103,47 +196,2970 @@ class BusinessLogic:
         else:
             return 200
 
+# ============================================================================
+# МОДУЛЬ: МОДЕЛЬ ДАННЫХ (КОМПАКТНЫЕ ЗАПИСИ)
+# ============================================================================
+class Record(MutableMapping):
+    """Запись с __slots__ вместо словаря: в несколько раз меньше памяти.
+
+    Поля доступны как атрибуты (product.cost_price) и по ключам JSON
+    (product["cost_price"]), поэтому код, работающий со словарями, работает
+    и с записями. Отсутствующий ключ — незаполненный слот; неизвестные ключи
+    хранятся в _extra, так что преобразование в словарь и обратно без потерь.
+    KEYS — ключи JSON в порядке записи, __slots__ — имена атрибутов для них.
+    """
+    __slots__ = ("_extra",)
+    KEYS: Tuple[str, ...] = ()
+    # Поля со списками вложенных записей: ключ -> класс записи
+    NESTED: Dict[str, type] = {}
+    # Строковые поля с частыми повторами (названия товаров, даты): хранятся
+    # одной строкой на все записи через sys.intern
+    INTERNED: Tuple[str, ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._ATTRS = dict(zip(cls.KEYS, cls.__slots__))
+
+    def __init__(self, **values):
+        self._extra = None
+        for key, value in values.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data: Any) -> 'Record':
+        """Запись из словаря формата JSON (запись возвращается как есть)"""
+        if isinstance(data, cls):
+            return data
+        record = cls.__new__(cls)
+        record._extra = None
+        attrs = cls._ATTRS
+        for key, value in data.items():
+            attr = attrs.get(key)
+            if attr is None:
+                if record._extra is None:
+                    record._extra = {}
+                record._extra[key] = value
+                continue
+            nested = cls.NESTED.get(key)
+            if nested is not None and isinstance(value, list):
+                value = [nested.from_dict(v) for v in value]
+            elif key in cls.INTERNED and type(value) is str:
+                value = sys.intern(value)
+            setattr(record, attr, value)
+        return record
+
+    def to_dict(self) -> Dict:
+        """Словарь в формате JSON (вложенные записи тоже становятся словарями)"""
+        result = {}
+        for key, attr in self._ATTRS.items():
+            try:
+                value = getattr(self, attr)
+            except AttributeError:
+                continue
+            if key in self.NESTED and isinstance(value, list):
+                value = [v.to_dict() if isinstance(v, Record) else v for v in value]
+            result[key] = value
+        if self._extra:
+            result.update(self._extra)
+        return result
+
+    def __getitem__(self, key: str) -> Any:
+        attr = self._ATTRS.get(key)
+        if attr is not None:
+            try:
+                return getattr(self, attr)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        attr = self._ATTRS.get(key)
+        if attr is not None:
+            return getattr(self, attr, default)
+        return self._extra.get(key, default) if self._extra else default
+
+    def __setitem__(self, key: str, value: Any):
+        attr = self._ATTRS.get(key)
+        if attr is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+            return
+        nested = self.NESTED.get(key)
+        if nested is not None and isinstance(value, list):
+            value = [nested.from_dict(v) for v in value]
+        elif key in self.INTERNED and type(value) is str:
+            value = sys.intern(value)
+        setattr(self, attr, value)
+
+    def __delitem__(self, key: str):
+        attr = self._ATTRS.get(key)
+        try:
+            if attr is not None:
+                delattr(self, attr)
+            else:
+                del self._extra[key]
+        except (AttributeError, KeyError, TypeError):
+            raise KeyError(key) from None
+
+    def __contains__(self, key: Any) -> bool:
+        attr = self._ATTRS.get(key)
+        if attr is not None:
+            return hasattr(self, attr)
+        return bool(self._extra) and key in self._extra
+
+    def __iter__(self):
+        for key, attr in self._ATTRS.items():
+            if hasattr(self, attr):
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class Product(Record):
+    """Товар каталога.
+
+    id неизменен после создания товара: по нему на товар ссылаются остатки
+    склада (ключ str(id)) и позиции заказов, поэтому переименование и
+    удаление товара не трогают историю.
+    """
+    __slots__ = ("id", "name", "cost_price", "profit", "expenses", "percent_expenses", "percent_profit")
+    KEYS = __slots__
+    id: int
+    name: str
+    cost_price: float
+    profit: float
+    expenses: float
+    percent_expenses: float
+    percent_profit: float
+
+    @property
+    def stock_key(self) -> str:
+        """Ключ товара в разделе stock"""
+        return str(self.id)
+
+
+class StockEntry(Record):
+    """Операция в истории склада (пополнение, списание, корректировка)"""
+    __slots__ = ("date", "quantity", "price_per_kg", "operation", "total_amount", "balance_after")
+    KEYS = __slots__
+    INTERNED = ("operation",)
+    date: str
+    quantity: float
+    price_per_kg: float
+    operation: str
+    total_amount: float
+    balance_after: float
+
+
+class OrderItem(Record):
+    """Позиция заказа: товар задаётся product_id, название берётся из каталога.
+
+    product (название) есть только у позиций, товар которых был удалён до
+    перехода на id, — для них название хранится как было.
+    """
+    __slots__ = ("product_id", "product", "quantity", "cost_price", "total")
+    KEYS = __slots__
+    INTERNED = ("product",)
+    product_id: int
+    product: str
+    quantity: float
+    cost_price: float
+    total: float
+
+
+class Order(Record):
+    """Заказ; позиции доступны как order.positions и order["items"]
+    (атрибут items занят методом словаря)"""
+    __slots__ = ("number", "date", "positions", "subtotal", "delivery_cost", "total")
+    KEYS = ("number", "date", "items", "subtotal", "delivery_cost", "total")
+    NESTED = {"items": OrderItem}
+    INTERNED = ("date",)
+    number: int
+    date: str
+    positions: List[OrderItem]
+    subtotal: float
+    delivery_cost: float
+    total: float
+
+
+def _records_default(value: Any) -> Any:
+    """Хук сериализации JSON для записей модели"""
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _profile_to_records(data: Dict) -> Dict:
+    """Замена словарей товаров, заказов и операций склада записями (на месте)"""
+    if isinstance(data.get("products"), list):
+        data["products"] = [Product.from_dict(p) for p in data["products"]]
+    if isinstance(data.get("orders"), list):
+        data["orders"] = [Order.from_dict(o) for o in data["orders"]]
+    for stock_data in data.get("stock", {}).values():
+        if isinstance(stock_data, dict) and isinstance(stock_data.get("history"), list):
+            stock_data["history"] = [StockEntry.from_dict(h) for h in stock_data["history"]]
+    return data
+
+
+def _value_to_records(path: List, value: Any) -> Any:
+    """Значение, записываемое по пути профиля, в виде записей модели"""
+    if not path:
+        return _profile_to_records(value) if isinstance(value, dict) else value
+    section, depth = path[0], len(path)
+    if section == "products":
+        if depth == 1 and isinstance(value, list):
+            return [Product.from_dict(p) for p in value]
+        if depth == 2 and isinstance(value, Mapping):
+            return Product.from_dict(value)
+    elif section == "orders":
+        if depth == 1 and isinstance(value, list):
+            return [Order.from_dict(o) for o in value]
+        if depth == 2 and isinstance(value, Mapping):
+            return Order.from_dict(value)
+        if depth == 3 and path[2] == "items" and isinstance(value, list):
+            return [OrderItem.from_dict(i) for i in value]
+        if depth == 4 and path[2] == "items" and isinstance(value, Mapping):
+            return OrderItem.from_dict(value)
+    elif section == "stock":
+        if depth == 1 and isinstance(value, dict):
+            return _profile_to_records({"stock": value})["stock"]
+        if depth == 2 and isinstance(value, dict):
+            return _profile_to_records({"stock": {path[1]: value}})["stock"][path[1]]
+        if depth == 3 and path[2] == "history" and isinstance(value, list):
+            return [StockEntry.from_dict(h) for h in value]
+        if depth == 4 and path[2] == "history" and isinstance(value, Mapping):
+            return StockEntry.from_dict(value)
+    return value
+
+
 # ============================================================================
 # МОДУЛЬ: УПРАВЛЕНИЕ ДАННЫМИ (СОВМЕСТИМОСТЬ С ANDROID)
 # ============================================================================
+# Формат данных профиля (format_version): 1 — ключи-названия без приставки,
+# 2 — ключи-названия NAME_KEY + название
+PROFILE_FORMAT = 2
+
+
+def _new_profile_data() -> Dict:
+    """Пустая структура профиля"""
+    return {
+        "products": [],
+        "stock": {},
+        "orders": [],
+        "daily_stats": {},
+        "next_order_number": 1
+    }
+
+
+def _profile_meta(data: Dict) -> Dict:
+    """Краткие сведения о профиле для индекса (без разбора истории)"""
+    orders = data.get("orders", [])
+    last_activity = orders[-1]["date"] if orders else ""
+    for stock_data in data.get("stock", {}).values():
+        history = stock_data.get("history", [])
+        if history:
+            last_activity = max(last_activity, history[-1].get("date", "")[:10])
+    return {
+        "products": len(data.get("products", [])),
+        "orders": len(orders),
+        "last_activity": last_activity
+    }
+
+
+def _stock_history_page(stock: Mapping, limit: int,
+                        cursor: Optional[Tuple[str, int, int]] = None) -> List[Tuple[Tuple[str, int, int], str, Any]]:
+    """Операции склада по всем товарам, новые сверху, начиная после cursor.
+
+    История каждой позиции дописывается по времени, поэтому последние
+    операции получаются слиянием (heapq.merge) историй, прочитанных с конца,
+    без копирования и сортировки всей истории. Возвращает не более limit
+    троек (ключ, ключ склада, операция); ключ (дата, позиция склада, номер
+    операции) последней тройки — курсор следующей страницы. При равных
+    датах раньше идут позиции склада в порядке раздела, внутри позиции —
+    более поздние операции.
+    """
+    def newest_first(position: int, stock_key: str, history: List) -> Any:
+        start = len(history)
+        if cursor is not None:
+            cursor_date, cursor_position, cursor_seq = cursor
+            date_of = lambda op: op.get("date", "")
+            if position < cursor_position:
+                start = bisect.bisect_left(history, cursor_date, key=date_of)
+            elif position > cursor_position:
+                start = bisect.bisect_right(history, cursor_date, key=date_of)
+            else:
+                start = min(bisect.bisect_right(history, cursor_date, key=date_of), cursor_seq)
+        for seq in range(start - 1, -1, -1):
+            op = history[seq]
+            yield (op.get("date", ""), -position, seq), stock_key, op
+
+    streams = [newest_first(position, stock_key, entry.get("history", []))
+               for position, (stock_key, entry) in enumerate(stock.items())]
+    page = []
+    for (op_date, negated_position, seq), stock_key, op in heapq.merge(
+            *streams, key=lambda item: item[0], reverse=True):
+        if len(page) >= limit:
+            break
+        page.append(((op_date, -negated_position, seq), stock_key, op))
+    return page
+
+
+# Название для позиций заказов, товар которых удалён из каталога
+DELETED_PRODUCT = "УДАЛЕННЫЙ ТОВАР"
+# Ключи склада и свода продаж: str(id) товара каталога или NAME_KEY + название
+# для товаров, которых не было в каталоге при переходе на id (название
+# «7» не совпадает с ключом товара с id 7)
+NAME_KEY = "n:"
+
+
+def _name_key(name: str) -> str:
+    return NAME_KEY + name
+
+
+def _key_title(key: str) -> str:
+    """Название из ключа-названия (без NAME_KEY); ключ id — как есть"""
+    return key[len(NAME_KEY):] if key.startswith(NAME_KEY) else key
+
+
+class ProductCatalog:
+    """Индекс каталога товаров профиля: по id, по названию без учёта регистра
+    и в порядке названий.
+
+    Создаётся DataManager.catalog() и обновляется по мере изменения раздела
+    products в транзакциях, поэтому экраны не перебирают и не сортируют
+    каталог при каждом обращении.
+    """
+    SOURCE_TYPE = list
+
+    def __init__(self, products: List[Product]):
+        # Индексируемый список товаров профиля
+        self.source = products
+        self._by_id: Dict[int, Product] = {}
+        self._by_name: Dict[str, Product] = {}
+        # Ключи сортировки (название, id) по возрастанию и ключ каждого товара
+        self._order: List[Tuple[str, int]] = []
+        self._keys: Dict[int, Tuple[str, int]] = {}
+        # Позиции товаров в списке по id (строятся при первом обращении)
+        self._positions: Optional[Dict[int, int]] = None
+        for product in products:
+            self._put(product)
+
+    @staticmethod
+    def _fold(name: str) -> str:
+        return name.strip().casefold()
+
+    def _put(self, product: Product):
+        """Добавление товара или обновление его записи в индексе"""
+        self._remove(product.id)
+        key = (product.name, product.id)
+        self._by_id[product.id] = product
+        self._by_name.setdefault(self._fold(product.name), product)
+        self._keys[product.id] = key
+        bisect.insort(self._order, key)
+
+    def _remove(self, product_id: int):
+        key = self._keys.pop(product_id, None)
+        if key is None:
+            return
+        del self._by_id[product_id]
+        folded = self._fold(key[0])
+        if self._by_name.get(folded) is not None and self._by_name[folded].id == product_id:
+            del self._by_name[folded]
+        del self._order[bisect.bisect_left(self._order, key)]
+
+    def apply(self, record: Dict):
+        """Учёт записи транзакции, уже применённой к разделу products"""
+        path = record["path"]
+        if len(path) == 1:
+            if record["op"] == "append":
+                self._put(record["v"])
+                if self._positions is not None:
+                    self._positions[record["v"].id] = len(self.source) - 1
+            elif record["op"] == "set":
+                self.source = record["v"]
+                self._positions = None
+                ids = {p.id for p in self.source}
+                for product_id in [i for i in self._by_id if i not in ids]:
+                    self._remove(product_id)
+                for product in self.source:
+                    if self._by_id.get(product.id) is not product:
+                        self._put(product)
+        elif isinstance(path[1], int) and path[1] < len(self.source):
+            self._put(self.source[path[1]])
+            if len(path) == 2:
+                self._positions = None
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def position(self, product_id: int) -> Optional[int]:
+        """Позиция товара в списке products профиля — для путей транзакций"""
+        if self._positions is None:
+            self._positions = {product.id: i for i, product in enumerate(self.source)}
+        return self._positions.get(product_id)
+
+    def get(self, product_id: Any) -> Optional[Product]:
+        """Товар по id (или ключу склада str(id))"""
+        if isinstance(product_id, str):
+            if not product_id.isdigit():
+                return None
+            product_id = int(product_id)
+        return self._by_id.get(product_id)
+
+    def find(self, name: str) -> Optional[Product]:
+        """Товар по названию без учёта регистра и крайних пробелов"""
+        return self._by_name.get(self._fold(name))
+
+    def by_name(self) -> List[Product]:
+        """Товары в порядке названий"""
+        return [self._by_id[product_id] for _, product_id in self._order]
+
+    def names(self) -> List[str]:
+        """Названия товаров в алфавитном порядке"""
+        return [name for name, _ in self._order]
+
+    def product_name(self, product_id: Optional[int], legacy_name: Optional[str] = None) -> str:
+        """Название товара позиции заказа: по product_id или сохранённое"""
+        if product_id is None:
+            return legacy_name or DELETED_PRODUCT
+        product = self._by_id.get(product_id)
+        return product.name if product is not None else DELETED_PRODUCT
+
+    def key_name(self, key: str) -> str:
+        """Название товара по ключу свода продаж (str(id) или NAME_KEY + название)"""
+        if key.isdigit():
+            return self.product_name(int(key))
+        return _key_title(key)
+
+    def stock_name(self, stock_key: str) -> str:
+        """Название товара по ключу склада; остатки без товара в каталоге
+        (сохранённые до перехода на id) хранятся под ключом-названием"""
+        product = self.get(stock_key)
+        return product.name if product is not None else _key_title(stock_key)
+
+
+def _date_ordinal(value: Any) -> Optional[int]:
+    """Порядковый номер дня для даты заказа "ГГГГ-ММ-ДД"; None, если дата не разобрана"""
+    try:
+        return date.fromisoformat(value).toordinal()
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def _order_number(value: Any) -> Optional[int]:
+    """Номер заказа как целое; None, если номер не разобран"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CatalogShares:
+    """Названия товаров и доли прибыли и затрат из каталога на момент
+    создания — для анализа продаж, который считается без блокировки данных"""
+
+    def __init__(self, catalog: 'ProductCatalog'):
+        self._names = {product_id: product.name for product_id, product in catalog._by_id.items()}
+        self._by_id = {product_id: self._shares(product) for product_id, product in catalog._by_id.items()}
+
+    @staticmethod
+    def _shares(product: Product) -> Tuple[float, float]:
+        return product.get("percent_profit", 0.0), product.get("percent_expenses", 0.0)
+
+    def key_name(self, key: str) -> str:
+        """Как ProductCatalog.key_name"""
+        if key.isdigit():
+            return self._names.get(int(key), DELETED_PRODUCT)
+        return _key_title(key)
+
+    def key_percents(self, key: str) -> Tuple[float, float]:
+        """(процент прибыли, процент затрат) по ключу свода; нули для удалённых товаров"""
+        return self._by_id.get(int(key), (0.0, 0.0)) if key.isdigit() else (0.0, 0.0)
+
+
+class OrderIndex:
+    """Индекс заказов профиля по дате и по номеру.
+
+    Хранит отсортированные ключи (номер дня, позиция заказа), поэтому заказы
+    за период находятся двумя bisect без разбора строк дат, и ключи (номер
+    заказа, позиция) для последних заказов. Заказы добавляются с растущими
+    номерами, поэтому новый ключ номера встаёт в конец списка, а страница
+    последних заказов читается срезом с конца. Заказы без разбираемой даты
+    или номера в соответствующий индекс не попадают. Обновляется по записям
+    транзакций раздела orders, как и ProductCatalog.
+    """
+    SOURCE_TYPE = list
+
+    def __init__(self, orders: List[Order]):
+        # Индексируемый список заказов профиля
+        self.source = orders
+        self._build()
+
+    def _build(self):
+        self._ordinals: Dict[int, int] = {}
+        self._numbers: Dict[int, int] = {}
+        for position, order in enumerate(self.source):
+            ordinal = _date_ordinal(order.get("date"))
+            if ordinal is not None:
+                self._ordinals[position] = ordinal
+            number = _order_number(order.get("number"))
+            if number is not None:
+                self._numbers[position] = number
+        self._keys: List[Tuple[int, int]] = sorted(
+            (ordinal, position) for position, ordinal in self._ordinals.items()
+        )
+        self._by_number: List[Tuple[int, int]] = sorted(
+            (number, position) for position, number in self._numbers.items()
+        )
+
+    @staticmethod
+    def _reindex(keys: List[Tuple[int, int]], values: Dict[int, int], position: int, value: Optional[int]):
+        """Замена ключа (значение, позиция) заказа в отсортированном списке"""
+        old = values.pop(position, None)
+        if old is not None:
+            del keys[bisect.bisect_left(keys, (old, position))]
+        if value is not None:
+            values[position] = value
+            bisect.insort(keys, (value, position))
+
+    def _put(self, position: int):
+        """Добавление заказа или обновление его даты и номера в индексе"""
+        order = self.source[position]
+        self._reindex(self._keys, self._ordinals, position, _date_ordinal(order.get("date")))
+        self._reindex(self._by_number, self._numbers, position, _order_number(order.get("number")))
+
+    def apply(self, record: Dict):
+        """Учёт записи транзакции, уже применённой к разделу orders"""
+        path = record["path"]
+        if len(path) == 1:
+            if record["op"] == "append":
+                if record["i"] < len(self.source):
+                    self._put(record["i"])
+            elif record["op"] == "set":
+                self.source = record["v"]
+                self._build()
+        elif (isinstance(path[1], int) and path[1] < len(self.source)
+              and (len(path) == 2 or path[2] in ("date", "number"))):
+            self._put(path[1])
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def ordinal(self, position: int) -> Optional[int]:
+        """Номер дня заказа на позиции position (None, если дата не разобрана)"""
+        return self._ordinals.get(position)
+
+    def range(self, date_from: date, date_to: date) -> List[Order]:
+        """Заказы с датой в [date_from, date_to] по возрастанию даты, внутри дня — по порядку"""
+        lo = bisect.bisect_left(self._keys, (date_from.toordinal(),))
+        hi = bisect.bisect_left(self._keys, (date_to.toordinal() + 1,))
+        return [self.source[position] for _, position in self._keys[lo:hi]]
+
+    def latest(self, limit: int, cursor: Optional[Tuple[int, int]] = None
+               ) -> Tuple[List[Order], Optional[Tuple[int, int]]]:
+        """Страница заказов по убыванию номера, начиная после cursor.
+
+        Возвращает заказы и курсор (номер, позиция) для следующей, более
+        старой страницы; None, если заказов больше нет.
+        """
+        hi = len(self._by_number) if cursor is None else bisect.bisect_left(self._by_number, tuple(cursor))
+        lo = max(0, hi - limit)
+        keys = self._by_number[lo:hi]
+        orders = [self.source[position] for _, position in reversed(keys)]
+        return orders, (keys[0] if lo > 0 else None)
+
+
+class ProductPostings:
+    """Обратный индекс товар -> позиции заказов.
+
+    Для каждого ключа товара свода (str(id) или NAME_KEY + название
+    удалённого товара, см. _item_key) хранит список (позиция заказа,
+    позиция в заказе) по возрастанию, поэтому вопросы по одному товару (сколько продано, в каких
+    заказах) не перебирают все заказы. Заказы только дописываются, поэтому
+    добавление заказа дописывает его позиции; прочие изменения раздела orders
+    перестраивают индекс.
+    """
+    SOURCE_TYPE = list
+
+    def __init__(self, orders: List[Order]):
+        # Индексируемый список заказов профиля
+        self.source = orders
+        self._build()
+
+    def _build(self):
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._count = 0
+        self._extend()
+
+    def _extend(self):
+        """Индексация заказов, добавленных после последнего учтённого"""
+        for position in range(self._count, len(self.source)):
+            for item_position, item in enumerate(self.source[position].get("items", [])):
+                self._postings.setdefault(_item_key(item), []).append((position, item_position))
+        self._count = len(self.source)
+
+    def apply(self, record: Dict):
+        """Учёт записи транзакции, уже применённой к разделу orders"""
+        if record["op"] == "append" and len(record["path"]) == 1 and record["i"] >= self._count:
+            self._extend()
+        else:
+            if record["op"] == "set" and len(record["path"]) == 1:
+                self.source = record["v"]
+            self._build()
+
+    def postings(self, key: str) -> List[Tuple[int, int]]:
+        """(позиция заказа, позиция в заказе) товара по возрастанию"""
+        return self._postings.get(key, [])
+
+    def items(self, key: str) -> Any:
+        """Пары (позиция заказа, позиция заказа-товар) товара"""
+        for position, item_position in self.postings(key):
+            yield position, self.source[position]["items"][item_position]
+
+    def sold(self, key: str) -> Tuple[float, float, int]:
+        """(количество, сумма, число заказов) товара за всё время"""
+        quantity = total = 0.0
+        orders = 0
+        last_position = None
+        for position, item in self.items(key):
+            quantity += item["quantity"]
+            total += item["total"]
+            if position != last_position:
+                orders += 1
+                last_position = position
+        return quantity, total, orders
+
+
+class SalesColumns:
+    """Позиции заказов профиля по столбцам для векторного анализа продаж (NumPy).
+
+    Четыре столбца array: номер дня заказа, код товара (номер ключа свода
+    в keys), количество и сумма. Заказы только дописываются, поэтому новый
+    заказ дописывает свои позиции в конец столбцов; прочие изменения раздела
+    orders перестраивают столбцы. Для расчёта столбцы читаются через
+    numpy.frombuffer без копирования. Позиции заказов с неразбираемой датой
+    не учитываются, как и в своде продаж.
+    """
+    SOURCE_TYPE = list
+
+    def __init__(self, orders: List[Order]):
+        # Индексируемый список заказов профиля
+        self.source = orders
+        self._build()
+
+    def _build(self):
+        self._days = array('q')
+        self._codes = array('q')
+        self._quantities = array('d')
+        self._totals = array('d')
+        # Ключи товаров свода по коду и обратно
+        self.keys: List[str] = []
+        self._key_codes: Dict[str, int] = {}
+        self._count = 0
+        self._extend()
+
+    def _extend(self):
+        """Добавление позиций заказов, дописанных после последнего учтённого"""
+        for position in range(self._count, len(self.source)):
+            order = self.source[position]
+            ordinal = _date_ordinal(order.get("date"))
+            if ordinal is None:
+                continue
+            for item in order.get("items", []):
+                key = _item_key(item)
+                code = self._key_codes.get(key)
+                if code is None:
+                    code = self._key_codes[key] = len(self.keys)
+                    self.keys.append(key)
+                self._days.append(ordinal)
+                self._codes.append(code)
+                self._quantities.append(item["quantity"])
+                self._totals.append(item["total"])
+        self._count = len(self.source)
+
+    def apply(self, record: Dict):
+        """Учёт записи транзакции, уже применённой к разделу orders"""
+        if record["op"] == "append" and len(record["path"]) == 1 and record["i"] >= self._count:
+            self._extend()
+        else:
+            if record["op"] == "set" and len(record["path"]) == 1:
+                self.source = record["v"]
+            self._build()
+
+    def __len__(self) -> int:
+        return len(self._days)
+
+    def copy(self) -> 'SalesColumns':
+        """Копия столбцов (без списка заказов) для расчёта без блокировки данных"""
+        clone = SalesColumns.__new__(SalesColumns)
+        clone.source = None
+        clone._days, clone._codes = array('q', self._days), array('q', self._codes)
+        clone._quantities, clone._totals = array('d', self._quantities), array('d', self._totals)
+        clone.keys, clone._key_codes = list(self.keys), dict(self._key_codes)
+        clone._count = self._count
+        return clone
+
+    def group(self, date_from: date, date_to: date, key: Optional[str] = None) -> List[Tuple[int, int, float, float]]:
+        """Суммы позиций за период по (день, товар): (номер дня, код товара,
+        количество, сумма) по возрастанию дня, внутри дня — в порядке первой
+        продажи товара, как в своде продаж. Суммы накапливаются в порядке
+        позиций (numpy.bincount), поэтому совпадают со сводом до бита."""
+        if not len(self._days):
+            return []
+        days = numpy.frombuffer(self._days, dtype=numpy.int64)
+        codes = numpy.frombuffer(self._codes, dtype=numpy.int64)
+        selected = (days >= date_from.toordinal()) & (days <= date_to.toordinal())
+        if key is not None:
+            if key not in self._key_codes:
+                return []
+            selected &= codes == self._key_codes[key]
+        positions = numpy.flatnonzero(selected)
+        if not positions.size:
+            return []
+        first_day = int(days[positions].min())
+        group_keys = (days[positions] - first_day) * len(self.keys) + codes[positions]
+        groups, first_seen, inverse = numpy.unique(group_keys, return_index=True, return_inverse=True)
+        quantities = numpy.bincount(inverse, weights=numpy.frombuffer(self._quantities)[positions],
+                                    minlength=groups.size)
+        totals = numpy.bincount(inverse, weights=numpy.frombuffer(self._totals)[positions],
+                                minlength=groups.size)
+        group_days, group_codes = numpy.divmod(groups, len(self.keys))
+        order = numpy.lexsort((first_seen, group_days))
+        return list(zip((group_days[order] + first_day).tolist(), group_codes[order].tolist(),
+                        quantities[order].tolist(), totals[order].tolist()))
+
+
+class DaySums:
+    """Суммы значения по дням для итогов за любой период за O(log n).
+
+    Значения лежат в дереве Фенвика по смещению номера дня от base; изменение
+    дня и сумма за период — O(log n). Если день выходит за пределы диапазона,
+    дерево перестраивается за O(n) с запасом, поэтому добавление новых дней
+    в среднем остаётся логарифмическим. Узлы дерева меняются прибавлением
+    разности, и погрешность округления float в них накапливается; значения
+    дней хранятся точно, и после стольких изменений, сколько дней в
+    диапазоне, дерево пересчитывается по ним (в среднем O(1) на изменение).
+    """
+    __slots__ = ("base", "values", "tree", "updates")
+    # Запас дней при перестройке (примерно месяц новых заказов)
+    SPARE_DAYS = 32
+
+    def __init__(self, values: Optional[Dict[int, float]] = None):
+        self.base = 0
+        self.values = array('d')
+        self.tree = array('d', [0.0])
+        self.updates = 0
+        if values:
+            first, last = min(values), max(values)
+            self._rebuild(first, last - first + 1 + self.SPARE_DAYS, values)
+
+    def _rebuild(self, base: int, size: int, values: Dict[int, float]):
+        """Перестройка дерева за O(n) для дней base..base+size-1"""
+        self.base = base
+        self.values = array('d', bytes(8 * size))
+        for ordinal, value in values.items():
+            self.values[ordinal - base] = value
+        self._build()
+
+    def _build(self):
+        """Дерево заново по точным значениям дней (сбрасывает погрешность узлов)"""
+        size = len(self.values)
+        tree = array('d', [0.0])
+        tree.extend(self.values)
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self.tree = tree
+        self.updates = 0
+
+    def _prefix(self, count: int) -> float:
+        """Сумма первых count дней диапазона"""
+        count = min(max(count, 0), len(self.values))
+        total = 0.0
+        while count > 0:
+            total += self.tree[count]
+            count -= count & -count
+        return total
+
+    def set(self, ordinal: int, value: float):
+        """Значение дня (номер дня date.toordinal())"""
+        offset = ordinal - self.base
+        if not 0 <= offset < len(self.values):
+            if not value:
+                return
+            values = {self.base + i: v for i, v in enumerate(self.values) if v}
+            first = min(ordinal, self.base) if values else ordinal
+            last = max(ordinal, self.base + len(self.values) - 1) if values else ordinal
+            span = last - first + 1
+            size = max(2 * span, span + self.SPARE_DAYS)
+            # Ранняя дата: запас оставляется перед первым днём
+            base = first - (size - span) if ordinal < self.base and values else first
+            self._rebuild(base, size, values)
+            offset = ordinal - self.base
+        delta = value - self.values[offset]
+        if not delta:
+            return
+        self.values[offset] = value
+        size = len(self.values)
+        self.updates += 1
+        if self.updates >= size:
+            self._build()
+            return
+        i = offset + 1
+        while i <= size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def total(self, first: int, last: int) -> float:
+        """Сумма за дни first..last включительно"""
+        if first > last:
+            return 0.0
+        return self._prefix(last - self.base + 1) - self._prefix(first - self.base)
+
+
+class DailyStatsTotals:
+    """Итоги дневной статистики (daily_stats) за период за O(log n).
+
+    По каждому полю статистики — DaySums. Обновляется по записям транзакций
+    раздела daily_stats: при сохранении заказа меняется один день.
+    """
+    FIELDS = ("orders_count", "delivery_count", "delivery_sum", "total_revenue")
+    SOURCE_TYPE = dict
+
+    def __init__(self, daily_stats: Dict[str, Dict]):
+        # Индексируемый раздел daily_stats профиля
+        self.source = daily_stats
+        self._build()
+
+    def _build(self):
+        values = {field: {} for field in self.FIELDS}
+        for day, stats in self.source.items():
+            ordinal = _date_ordinal(day)
+            if ordinal is None:
+                continue
+            for field in self.FIELDS:
+                values[field][ordinal] = stats.get(field, 0)
+        self._sums = {field: DaySums(values[field]) for field in self.FIELDS}
+
+    def apply(self, record: Dict):
+        """Учёт записи транзакции, уже применённой к разделу daily_stats"""
+        path = record["path"]
+        if len(path) == 1:
+            self.source = record["v"]
+            self._build()
+            return
+        ordinal = _date_ordinal(path[1])
+        if ordinal is None:
+            return
+        stats = self.source.get(path[1], {})
+        for field in self.FIELDS:
+            self._sums[field].set(ordinal, stats.get(field, 0))
+
+    def totals(self, date_from: date, date_to: date) -> Dict[str, float]:
+        """Суммы полей статистики за дни [date_from, date_to]"""
+        first, last = date_from.toordinal(), date_to.toordinal()
+        return {field: sums.total(first, last) for field, sums in self._sums.items()}
+
+
+class SalesRollupTotals:
+    """Итоги свода продаж (sales_rollup) за период за O(log n).
+
+    Количество и сумма по каждому ключу товара свода (str(id) или NAME_KEY +
+    название удалённого товара) лежат в DaySums. Обновляется по записям транзакций
+    раздела sales_rollup: сохранение заказа меняет один день.
+    """
+    SOURCE_TYPE = dict
+
+    def __init__(self, sales_rollup: Dict[str, Dict]):
+        # Индексируемый раздел sales_rollup профиля
+        self.source = sales_rollup
+        self._build()
+
+    def _build(self):
+        values: Dict[str, Tuple[Dict[int, float], Dict[int, float]]] = {}
+        # Ключи товаров по дням: для обнуления товаров, исчезнувших из дня
+        self._day_keys: Dict[int, set] = {}
+        for day, products in self.source.items():
+            ordinal = _date_ordinal(day)
+            if ordinal is None:
+                continue
+            self._day_keys[ordinal] = set(products)
+            for key, entry in products.items():
+                quantity, total = values.setdefault(key, ({}, {}))
+                quantity[ordinal] = entry["quantity"]
+                total[ordinal] = entry["total"]
+        self._sums = {key: (DaySums(quantity), DaySums(total))
+                      for key, (quantity, total) in values.items()}
+
+    def _set_day(self, ordinal: int, products: Dict[str, Dict]):
+        for key in self._day_keys.pop(ordinal, set()) - set(products):
+            for sums in self._sums[key]:
+                sums.set(ordinal, 0.0)
+        for key, entry in products.items():
+            quantity, total = self._sums.setdefault(key, (DaySums(), DaySums()))
+            quantity.set(ordinal, entry["quantity"])
+            total.set(ordinal, entry["total"])
+        if products:
+            self._day_keys[ordinal] = set(products)
+
+    def apply(self, record: Dict):
+        """Учёт записи транзакции, уже применённой к разделу sales_rollup"""
+        path = record["path"]
+        if len(path) == 1:
+            self.source = record["v"]
+            self._build()
+            return
+        ordinal = _date_ordinal(path[1])
+        if ordinal is not None:
+            self._set_day(ordinal, self.source.get(path[1], {}))
+
+    def totals(self, date_from: date, date_to: date) -> Dict[str, Tuple[float, float]]:
+        """(количество, сумма) за дни [date_from, date_to] по ключам товаров с продажами"""
+        first, last = date_from.toordinal(), date_to.toordinal()
+        result = {}
+        for key, (quantity, total) in self._sums.items():
+            row = (quantity.total(first, last), total.total(first, last))
+            if row[0] or row[1]:
+                result[key] = row
+        return result
+
+    def key_totals(self, key: str, date_from: date, date_to: date) -> Tuple[float, float]:
+        """(количество, сумма) одного товара за дни [date_from, date_to]"""
+        sums = self._sums.get(key)
+        if sums is None:
+            return 0.0, 0.0
+        first, last = date_from.toordinal(), date_to.toordinal()
+        return sums[0].total(first, last), sums[1].total(first, last)
+
+    def compare(self, date_from: date, date_to: date, prev_from: date, prev_to: date,
+                key: Optional[str] = None) -> Dict[str, Tuple[float, float, float, float]]:
+        """За один проход по товарам: (количество, сумма) за [date_from, date_to]
+        и за [prev_from, prev_to] по ключам с продажами хотя бы в одном из
+        периодов; с key — только этот товар"""
+        first, last = date_from.toordinal(), date_to.toordinal()
+        prev_first, prev_last = prev_from.toordinal(), prev_to.toordinal()
+        items = self._sums.items() if key is None else [(key, self._sums[key])] if key in self._sums else []
+        result = {}
+        for sums_key, (quantity, total) in items:
+            row = (quantity.total(first, last), total.total(first, last),
+                   quantity.total(prev_first, prev_last), total.total(prev_first, prev_last))
+            if any(row):
+                result[sums_key] = row
+        return result
+
+
+def _comparison_period(date_from: date, date_to: date, mode: str) -> Tuple[date, date]:
+    """Период для сравнения: 'previous' — столько же дней непосредственно
+    перед выбранным, 'year' — те же даты годом раньше (29 февраля -> 28)"""
+    if mode == 'previous':
+        days = date_to - date_from + timedelta(days=1)
+        return date_from - days, date_to - days
+
+    def year_ago(day: date) -> date:
+        try:
+            return day.replace(year=day.year - 1)
+        except ValueError:
+            return day.replace(year=day.year - 1, day=28)
+
+    return year_ago(date_from), year_ago(date_to)
+
+
+def _period_start(ordinal: int, granularity: str) -> int:
+    """Первый день недели (с понедельника), месяца или квартала, в который попадает день"""
+    day = date.fromordinal(ordinal)
+    if granularity == 'week':
+        return ordinal - day.weekday()
+    if granularity == 'month':
+        return date(day.year, day.month, 1).toordinal()
+    if granularity == 'quarter':
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1).toordinal()
+    return ordinal
+
+
+def _period_end(start: int, granularity: str) -> int:
+    """Последний день периода, начинающегося с дня start"""
+    if granularity == 'week':
+        return start + 6
+    if granularity in ('month', 'quarter'):
+        day = date.fromordinal(start)
+        month = day.month + (3 if granularity == 'quarter' else 1)
+        year = day.year + (month - 1) // 12
+        return date(year, (month - 1) % 12 + 1, 1).toordinal() - 1
+    return start
+
+
+def _period_label(start: int, granularity: str) -> str:
+    """Подпись периода в таблице: 2024-03-15, 2024-W11, 2024-03, 2024-Q1"""
+    day = date.fromordinal(start)
+    if granularity == 'week':
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if granularity == 'month':
+        return f"{day.year}-{day.month:02d}"
+    if granularity == 'quarter':
+        return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+    return day.isoformat()
+
+
+class SalesRollupTiers:
+    """Недельный, месячный и квартальный уровни свода продаж (sales_rollup).
+
+    Для каждого уровня: первый день периода -> {ключ товара: (количество,
+    сумма)}. Сохранение заказа меняет один день свода, и пересчитываются
+    только три периода, в которые он попадает (не больше 92 дней свода
+    каждый), поэтому отчёт за год по месяцам читает 12 готовых периодов,
+    а не дни или заказы. Дни внутри периода суммируются по возрастанию
+    даты — при полной перестройке и при обновлении одинаково.
+    """
+    SOURCE_TYPE = dict
+    TIERS = ('week', 'month', 'quarter')
+
+    def __init__(self, sales_rollup: Dict[str, Dict]):
+        # Индексируемый раздел sales_rollup профиля
+        self.source = sales_rollup
+        self._build()
+
+    def _build(self):
+        # Порядковый номер дня -> ключ дня в своде
+        self._days: Dict[int, str] = {}
+        for day in self.source:
+            ordinal = _date_ordinal(day)
+            if ordinal is not None:
+                self._days[ordinal] = day
+        self._ordinals = sorted(self._days)
+        self._periods: Dict[str, Dict[int, Dict[str, Tuple[float, float]]]] = {
+            tier: {} for tier in self.TIERS
+        }
+        for tier in self.TIERS:
+            starts = {_period_start(ordinal, tier) for ordinal in self._ordinals}
+            for start in sorted(starts):
+                self._update_period(tier, start)
+
+    def _sum_days(self, first: int, last: int) -> Dict[str, Tuple[float, float]]:
+        """Сумма дней свода [first, last] по ключам товаров"""
+        result: Dict[str, Tuple[float, float]] = {}
+        lo = bisect.bisect_left(self._ordinals, first)
+        hi = bisect.bisect_right(self._ordinals, last)
+        for ordinal in self._ordinals[lo:hi]:
+            for key, entry in self.source.get(self._days[ordinal], {}).items():
+                qty, total = result.get(key, (0.0, 0.0))
+                result[key] = (qty + entry["quantity"], total + entry["total"])
+        return result
+
+    def _update_period(self, tier: str, start: int):
+        sums = self._sum_days(start, _period_end(start, tier))
+        if sums:
+            self._periods[tier][start] = sums
+        else:
+            self._periods[tier].pop(start, None)
+
+    def apply(self, record: Dict):
+        """Учёт записи транзакции, уже применённой к разделу sales_rollup"""
+        path = record["path"]
+        if len(path) == 1:
+            self.source = record["v"]
+            self._build()
+            return
+        ordinal = _date_ordinal(path[1])
+        if ordinal is None:
+            return
+        if path[1] in self.source:
+            if ordinal not in self._days:
+                bisect.insort(self._ordinals, ordinal)
+            self._days[ordinal] = path[1]
+        elif self._days.get(ordinal) == path[1]:
+            del self._days[ordinal]
+            self._ordinals.remove(ordinal)
+        for tier in self.TIERS:
+            self._update_period(tier, _period_start(ordinal, tier))
+
+    def periods(self, granularity: str, date_from: date, date_to: date
+                ) -> List[Tuple[int, Dict[str, Tuple[float, float]]]]:
+        """Продажи за [date_from, date_to] по периодам уровня: (первый день
+        периода, {ключ товара: (количество, сумма)}) по возрастанию. Крайние
+        периоды, выходящие за границы, досчитываются по дням свода."""
+        first, last = date_from.toordinal(), date_to.toordinal()
+        tier = self._periods[granularity]
+        lo, hi = _period_start(first, granularity), _period_start(last, granularity)
+        result = []
+        for start in sorted(p for p in tier if lo <= p <= hi):
+            end = _period_end(start, granularity)
+            if first <= start and end <= last:
+                sums = tier[start]
+            else:
+                sums = self._sum_days(max(first, start), min(last, end))
+            if sums:
+                result.append((start, sums))
+        return result
+
+
+def _migrate_product_ids(data: Dict) -> bool:
+    """Однократный переход со ссылок по названию на id товаров (на месте).
+
+    Товары получают id по порядку каталога, остатки склада — ключи str(id),
+    позиции заказов — product_id вместо названия. Остатки товаров, которых
+    уже нет в каталоге, получают ключ NAME_KEY + название, позиции заказов —
+    сохраняют название. True, если данные изменены и профиль нужно записать.
+    """
+    if "next_product_id" in data:
+        return False
+    data["format_version"] = PROFILE_FORMAT
+    products = data.setdefault("products", [])
+    next_id = max((p["id"] for p in products if "id" in p), default=0) + 1
+    ids = {}
+    for product in products:
+        if "id" not in product:
+            product["id"] = next_id
+            next_id += 1
+        ids.setdefault(product["name"], product["id"])
+    data["next_product_id"] = next_id
+    data["stock"] = {
+        str(ids[key]) if key in ids else _name_key(key): entry
+        for key, entry in data.get("stock", {}).items()
+    }
+    for order in data.get("orders", []):
+        for item in order.get("items", []):
+            if "product_id" not in item and item.get("product") in ids:
+                item["product_id"] = ids[item["product"]]
+                del item["product"]
+    return True
+
+
+def _migrate_name_keys(data: Dict) -> bool:
+    """Переход на ключи NAME_KEY + название (формат 2) для профиля, уже
+    переведённого на id: ключи-названия склада и свода продаж получают
+    приставку. Ключи из одних цифр остаются ключами id — прежде название
+    из цифр было от них неотличимо. Ключи с приставкой не меняются: данные
+    формата 2 без format_version (переданные в update_profile_data) не
+    получают её дважды"""
+    data["format_version"] = PROFILE_FORMAT
+
+    def rename(key: str) -> str:
+        return key if key.isdigit() or key.startswith(NAME_KEY) else _name_key(key)
+
+    data["stock"] = {rename(key): entry for key, entry in data.get("stock", {}).items()}
+    if "sales_rollup" in data:
+        data["sales_rollup"] = {day: {rename(key): entry for key, entry in sums.items()}
+                                for day, sums in data["sales_rollup"].items()}
+    return True
+
+
+def _item_key(item: Mapping) -> str:
+    """Ключ товара позиции заказа в своде продаж: str(product_id) или
+    NAME_KEY + сохранённое название"""
+    product_id = item.get("product_id")
+    return str(product_id) if product_id is not None else _name_key(item.get("product", DELETED_PRODUCT))
+
+
+def _rollup_items(day: Dict, items: List[Mapping]):
+    """Добавление позиций заказа в свод продаж одного дня (на месте)"""
+    for item in items:
+        entry = day.get(_item_key(item))
+        if entry is None:
+            entry = day[_item_key(item)] = {"quantity": 0.0, "total": 0.0}
+        entry["quantity"] += item["quantity"]
+        entry["total"] += item["total"]
+
+
+def _rollup_add(day: Dict, items: List[Mapping]) -> Dict:
+    """Свод продаж дня с добавленными позициями заказа (исходный словарь не меняется)"""
+    day = {key: dict(entry) for key, entry in day.items()}
+    _rollup_items(day, items)
+    return day
+
+
+def _build_sales_rollup(orders: List[Mapping]) -> Dict:
+    """Свод продаж "дата -> товар -> количество и сумма", пересчитанный по заказам.
+
+    Даты приводятся к виду ГГГГ-ММ-ДД, заказы с неразбираемой датой пропускаются.
+    """
+    rollup = {}
+    for order in orders:
+        ordinal = _date_ordinal(order.get("date"))
+        if ordinal is not None:
+            _rollup_items(rollup.setdefault(date.fromordinal(ordinal).isoformat(), {}),
+                          order.get("items", []))
+    return dict(sorted(rollup.items()))
+
+
+def _build_stock_totals(stock: Mapping) -> Dict:
+    """Сводка склада, пересчитанная по всем позициям: общая стоимость,
+    общий остаток (кг), число позиций и позиций с остатком"""
+    totals = {"total_value": 0.0, "total_quantity": 0.0, "sku_count": 0, "in_stock_count": 0}
+    for entry in stock.values():
+        _add_stock_position(totals, 1, (entry["current_quantity"], entry["total_value"]))
+    return totals
+
+
+def _add_stock_position(totals: Dict, sign: int, position: Tuple[float, float]):
+    """Добавление (sign=1) или вычитание (sign=-1) позиции (остаток, стоимость)"""
+    quantity, value = position
+    totals["total_value"] += sign * value
+    totals["total_quantity"] += sign * quantity
+    totals["sku_count"] += sign
+    totals["in_stock_count"] += sign * (quantity > 0)
+
+
+def _update_stock_totals(tx: 'ProfileTransaction', before: Optional[Tuple[float, float]],
+                         after: Optional[Tuple[float, float]]):
+    """Учёт изменения одной складской позиции в сводке stock_totals.
+
+    before/after — (остаток, стоимость) позиции до и после изменения;
+    None — позиции нет (создание или удаление).
+    """
+    totals = dict(tx.profile_data.get("stock_totals") or _build_stock_totals({}))
+    if before is not None:
+        _add_stock_position(totals, -1, before)
+    if after is not None:
+        _add_stock_position(totals, 1, after)
+    # Погрешность разностей не накапливается и не даёт «-0.00» на экране
+    for field in ("total_value", "total_quantity"):
+        totals[field] = round(totals[field], 6) + 0.0
+    tx.set(["stock_totals"], totals)
+
+
+def _verified_stock_totals(data: Mapping) -> Optional[Dict]:
+    """Сверка сводки склада с пересчётом по позициям: None, если сводка верна,
+    иначе пересчитанная сводка"""
+    expected = _build_stock_totals(data.get("stock", {}))
+    stored = data.get("stock_totals")
+    if stored is None:
+        return expected
+    if all(abs(stored.get(field, 0) - value) < 1e-6 for field, value in expected.items()):
+        return None
+    print(f"[!] Сводка склада расходилась с остатками и пересчитана: {stored} -> {expected}")
+    return expected
+
+
+def _upgrade_profile(data: Dict) -> bool:
+    """Однократные переходы загруженного профиля на текущий формат данных;
+    сводка склада сверяется только при переходе, если её нет или при
+    VERIFY_STOCK_TOTALS. True, если профиль изменён и его нужно записать"""
+    changed = _migrate_product_ids(data)
+    if data.get("format_version", 1) < 2:
+        changed |= _migrate_name_keys(data)
+    if "sales_rollup" not in data:
+        data["sales_rollup"] = _build_sales_rollup(data.get("orders", []))
+        # Хранилище может не отличать пустой свод от отсутствующего
+        changed |= bool(data["sales_rollup"])
+    if not (changed or VERIFY_STOCK_TOTALS or data.get("stock_totals") is None):
+        return False
+    stock_totals = _verified_stock_totals(data)
+    if stock_totals is not None:
+        data["stock_totals"] = stock_totals
+        changed = True
+    return changed
+
+
+def _profile_report(data: Mapping, catalog: 'ProductCatalog', date_from: date, date_to: date) -> Dict:
+    """Часть сводного отчёта по одному профилю за период: заказы, выручка,
+    продажи по названиям товаров, суммы дневной статистики и сводка склада"""
+    first, last = date_from.toordinal(), date_to.toordinal()
+    orders_count, revenue = 0, 0.0
+    products: Dict[str, List[float]] = {}
+    for order in data.get("orders", []):
+        ordinal = _date_ordinal(order["date"])
+        if ordinal is None or not first <= ordinal <= last:
+            continue
+        orders_count += 1
+        revenue += order["total"]
+        for item in order["items"]:
+            sold = products.setdefault(catalog.key_name(_item_key(item)), [0.0, 0.0])
+            sold[0] += item["quantity"]
+            sold[1] += item["total"]
+    daily_stats = dict.fromkeys(DailyStatsTotals.FIELDS, 0)
+    for day, stats in data.get("daily_stats", {}).items():
+        ordinal = _date_ordinal(day)
+        if ordinal is not None and first <= ordinal <= last:
+            for field in DailyStatsTotals.FIELDS:
+                daily_stats[field] += stats.get(field, 0)
+    return {
+        "orders_count": orders_count,
+        "revenue": revenue,
+        "products": {name: tuple(sold) for name, sold in products.items()},
+        "daily_stats": daily_stats,
+        "stock": dict(data.get("stock_totals") or _build_stock_totals(data.get("stock", {}))),
+    }
+
+
+def _merge_reports(parts: List[Dict]) -> Dict:
+    """Сложение частей сводного отчёта (в порядке профилей)"""
+    total = {
+        "orders_count": 0,
+        "revenue": 0.0,
+        "products": {},
+        "daily_stats": dict.fromkeys(DailyStatsTotals.FIELDS, 0),
+        "stock": {"total_value": 0.0, "total_quantity": 0.0, "sku_count": 0, "in_stock_count": 0},
+    }
+    for part in parts:
+        total["orders_count"] += part["orders_count"]
+        total["revenue"] += part["revenue"]
+        for name, (qty, sold) in part["products"].items():
+            merged_qty, merged_sold = total["products"].get(name, (0.0, 0.0))
+            total["products"][name] = (merged_qty + qty, merged_sold + sold)
+        for section in ("daily_stats", "stock"):
+            for field, value in part[section].items():
+                total[section][field] = total[section].get(field, 0) + value
+    return total
+
+
+def _stored_profile_report(storage: Any, profile_name: str, date_from: date, date_to: date) -> Optional[Dict]:
+    """Часть сводного отчёта по профилю, прочитанному из хранилища (без
+    загрузки в DataManager); None, если профиля нет"""
+    data = storage.load_profile(profile_name)
+    if data is None:
+        return None
+    _profile_to_records(data)
+    _migrate_product_ids(data)
+    return _profile_report(data, ProductCatalog(data["products"]), date_from, date_to)
+
+
+class StorageReader:
+    """Хранилище 'sharded' или 'sqlite' только для чтения — для процессов
+    сводного отчёта. Без DataManager: нет бэкапов, переносов данных и
+    обновления схемы, ничего не записывается; база SQLite открывается в
+    режиме ro. Повреждённый файл не восстанавливается из бэкапа, а
+    вызывает ошибку — такой профиль досчитывает приложение.
+    """
+
+    def __init__(self, storage_backend: str, data_dir: str):
+        self.data_dir = data_dir
+        self.codec = JsonCodec()
+        if storage_backend == 'sqlite':
+            self.storage = SqliteStorage(self)
+            uri = "file:" + urllib.parse.quote(self.storage.db_file) + "?mode=ro"
+            self.storage.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self.storage = ShardedStorage(self)
+
+    def _load_safe(self, filepath: str) -> Dict:
+        """Чтение файла данных (то же, что DataManager._load_safe, без восстановления)"""
+        if not os.path.exists(filepath):
+            return {}
+        with open(filepath, "rb") as f:
+            content = _decode_snapshot(f.read()).strip()
+        if not content:
+            raise EOFError("пустой файл")
+        return self.codec.loads(content)
+
+    def close(self):
+        conn = getattr(self.storage, "conn", None)
+        if conn is not None:
+            conn.close()
+
+
+# Хранилище процесса сводного отчёта (см. _report_worker_init)
+_report_reader: Optional[StorageReader] = None
+# Окружение процессов сводного отчёта: spawn заново импортирует этот модуль
+# до _report_worker_init, а с этими переменными Kivy не создаёт окно (KIVY_DOC),
+# не разбирает аргументы и не ведёт журнал
+REPORT_WORKER_ENV = {"KIVY_DOC": "1", "KIVY_NO_ARGS": "1", "KIVY_NO_FILELOG": "1", "KIVY_NO_CONSOLELOG": "1"}
+
+
+@contextmanager
+def _report_worker_env():
+    """REPORT_WORKER_ENV в окружении, пока запускаются процессы сводного
+    отчёта (они наследуют окружение); на само приложение не влияет — Kivy
+    уже загружен"""
+    saved = {name: os.environ.get(name) for name in REPORT_WORKER_ENV}
+    os.environ.update(REPORT_WORKER_ENV)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _report_worker_init(storage_backend: str, data_dir: str):
+    """Открытие хранилища для чтения в процессе сводного отчёта — один раз на процесс"""
+    global _report_reader
+    _report_reader = StorageReader(storage_backend, data_dir)
+
+
+def _report_worker(profile_name: str, date_from: date, date_to: date) -> Optional[Dict]:
+    """Процесс сводного отчёта: разбор и подсчёт одного профиля; None, если
+    профиля нет или его файлы не читаются (тогда считает приложение)"""
+    try:
+        return _stored_profile_report(_report_reader.storage, profile_name, date_from, date_to)
+    except SNAPSHOT_ERRORS + (OSError, sqlite3.Error):
+        return None
+
+
+class JsonCodec:
+    """Сериализация JSON через orjson/msgspec с откатом на стандартный json.
+
+    Вывод совпадает байт в байт с json.dumps(ensure_ascii=False) с отступом 2
+    или без пробелов. Быстрые библиотеки иначе записывают числа с порядком
+    (1e-05, 1e+16), NaN и целые больше 64 бит, поэтому результат с такими
+    местами (или похожим текстом в строках) пересчитывается стандартным json.
+    При чтении ошибка быстрой библиотеки тоже повторяется через json.loads:
+    он понимает NaN и длинные целые.
+    """
+    # Порядок числа (1e16, 2.5e-7); литерал в начале шаблона ускоряет поиск
+    _EXPONENT_RE = re.compile(rb'[eE][-+\d]')
+
+    def __init__(self, backend: str = JSON_CODEC):
+        if backend == 'auto':
+            backend = 'orjson' if orjson else 'msgspec' if msgspec else 'json'
+        if (backend == 'orjson' and orjson is None) or (backend == 'msgspec' and msgspec is None):
+            print(f"[!] JSON-кодек {backend} не установлен, используется json")
+            backend = 'json'
+        self.name = backend
+
+    @staticmethod
+    def _std_dumps(data: Any, indent: bool) -> bytes:
+        if indent:
+            return json.dumps(data, ensure_ascii=False, indent=2, default=_records_default).encode("utf-8")
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"),
+                          default=_records_default).encode("utf-8")
+
+    @classmethod
+    def _unsafe(cls, raw: bytes) -> bool:
+        """Есть ли в выводе места, где быстрый кодек мог разойтись с json"""
+        # null — возможный след NaN/Infinity, которые быстрые кодеки пишут как null
+        if b"null" in raw or cls._EXPONENT_RE.search(raw):
+            return True
+        # Числа меньше 1e-4: json пишет их с порядком, быстрые кодеки — нет
+        pos = raw.find(b"0.0000")
+        while pos != -1:
+            if pos == 0 or raw[pos - 1] not in b"0123456789.":
+                return True
+            pos = raw.find(b"0.0000", pos + 6)
+        return False
+
+    def dumps(self, data: Any, indent: bool = False) -> bytes:
+        """JSON в UTF-8: с отступом 2 или компактный"""
+        try:
+            if self.name == 'orjson':
+                raw = orjson.dumps(data, default=_records_default,
+                                   option=orjson.OPT_INDENT_2 if indent else 0)
+                if not self._unsafe(raw):
+                    return raw
+            elif self.name == 'msgspec' and not indent:
+                raw = msgspec.json.encode(data, enc_hook=_records_default)
+                # msgspec проверен хуже: откат и при любой escape-последовательности
+                if b"\\" not in raw and not self._unsafe(raw):
+                    return raw
+        except (TypeError, ValueError, OverflowError):
+            # Нестроковые ключи, длинные целые и т.п. — только стандартный json
+            pass
+        return self._std_dumps(data, indent)
+
+    def loads(self, content: Any) -> Any:
+        """Разбор JSON из bytes или str"""
+        if self.name == 'orjson':
+            try:
+                return orjson.loads(content)
+            except orjson.JSONDecodeError:
+                pass
+        elif self.name == 'msgspec':
+            try:
+                return msgspec.json.decode(content)
+            except msgspec.DecodeError:
+                pass
+        return json.loads(content)
+
+
+_SNAPSHOT_MAGIC = (
+    (b"\x1f\x8b", gzip.decompress),
+    (b"\xfd7zXZ\x00", lzma.decompress),
+    # Заголовок zlib: CMF=0x78 и любой из стандартных уровней сжатия
+    (b"\x78\x01", zlib.decompress),
+    (b"\x78\x5e", zlib.decompress),
+    (b"\x78\x9c", zlib.decompress),
+    (b"\x78\xda", zlib.decompress),
+)
+# Ошибки повреждённого файла данных (в любом формате)
+SNAPSHOT_ERRORS = (json.JSONDecodeError, UnicodeDecodeError, zlib.error,
+                   lzma.LZMAError, EOFError, gzip.BadGzipFile)
+
+
+def _encode_snapshot(data: Any, fmt: str, codec: JsonCodec) -> bytes:
+    """Сериализация данных в байты выбранного формата SNAPSHOT_FORMAT"""
+    if fmt == 'json':
+        return codec.dumps(data, indent=True)
+    return _compress_snapshot(codec.dumps(data), fmt)
+
+
+def _compress_snapshot(raw: bytes, fmt: str) -> bytes:
+    if fmt == 'gzip':
+        return gzip.compress(raw, compresslevel=6, mtime=0)
+    if fmt == 'zlib':
+        return zlib.compress(raw, 6)
+    if fmt == 'lzma':
+        return lzma.compress(raw, preset=1)
+    return raw
+
+
+def _decode_snapshot(content: bytes) -> bytes:
+    """Распаковка содержимого файла; JSON-текст возвращается как есть.
+
+    JSON не может начинаться с байтов 0x1f, 0xfd или 'x', поэтому сигнатуры
+    сжатых форматов не путаются с текстом.
+    """
+    for magic, decompress in _SNAPSHOT_MAGIC:
+        if content.startswith(magic):
+            return decompress(content)
+    return content
+
+
+class LRUCache:
+    """Кэш фиксированного размера с вытеснением давно не использованных значений"""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items: 'OrderedDict[Any, Any]' = OrderedDict()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if key not in self._items:
+            return default
+        self._items.move_to_end(key)
+        return self._items[key]
+
+    def put(self, key: Any, value: Any):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+# Отметка «значения не было» в обратных действиях транзакции
+_MISSING = object()
+
+
+class ProfileTransaction:
+    """Группа изменений одного профиля, сохраняемая одной записью в хранилище.
+
+    Изменения сразу применяются к данным в памяти, а при выходе из блока
+    with передаются в DataManager одним коммитом. Путь — список ключей
+    от корня профиля, например ["stock", "3", "history"]. На время
+    блока with фоновая запись не видит частично применённых изменений.
+    Если блок завершился исключением, изменения в памяти откатываются
+    и в хранилище не попадают.
+    """
+    def __init__(self, data_manager: 'DataManager', profile_name: str):
+        self.data_manager = data_manager
+        self.profile_name = profile_name
+        self.profile_data = data_manager.get_profile_data(profile_name)
+        self.records: List[Dict] = []
+        # Обратные действия для отката: (путь, прежнее значение или _MISSING)
+        self._undo: List[Tuple[List, Any]] = []
+
+    def __enter__(self) -> 'ProfileTransaction':
+        self.data_manager._lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is not None:
+                if self.records:
+                    self._rollback()
+            elif self.records:
+                self.data_manager._commit(self.records)
+        finally:
+            self.data_manager._lock.release()
+        return False
+
+    def _rollback(self):
+        """Возврат данных в памяти к состоянию до транзакции"""
+        for path, value in reversed(self._undo):
+            if value is _MISSING:
+                target = DataManager._resolve(self.profile_data, path[:-1])
+                if isinstance(target, MutableMapping):
+                    target.pop(path[-1], None)
+                elif isinstance(target, list) and target:
+                    target.pop()
+            else:
+                DataManager._resolve(self.profile_data, path[:-1])[path[-1]] = value
+        dm = self.data_manager
+        dm._bump_version(self.profile_name)
+        # Индексы обновлялись по каждой записи — строятся заново при обращении
+        dm._indexes.pop(self.profile_name, None)
+        print(f"[!] Изменения профиля «{self.profile_name}» отменены: {len(self.records)}")
+
+    def _remember(self, op: str, path: List):
+        """Обратное действие для записи: прежнее значение по пути или
+        _MISSING — удалить ключ (первый создаваемый) или добавленный элемент"""
+        if op == "append":
+            self._undo.append((list(path) + [None], _MISSING))
+            return
+        node = self.profile_data
+        for depth, key in enumerate(path):
+            if isinstance(node, list):
+                if not isinstance(key, int) or key >= len(node):
+                    return
+            elif key not in node:
+                if op == "set":
+                    self._undo.append((list(path[:depth + 1]), _MISSING))
+                return
+            if depth == len(path) - 1:
+                self._undo.append((list(path), node[key]))
+                return
+            node = node[key]
+
+    def _add(self, op: str, path: List, **fields):
+        self._remember(op, path)
+        record = {"op": op, "p": self.profile_name, "path": list(path)}
+        if "v" in fields:
+            # Словари товаров, заказов и операций склада становятся записями модели
+            value_path = list(path) + [fields["i"]] if op == "append" else path
+            fields["v"] = _value_to_records(value_path, fields["v"])
+        record.update(fields)
+        DataManager._apply_record(self.data_manager._profiles, record)
+        self.data_manager._bump_version(self.profile_name)
+        if path:
+            self.data_manager._indexes_changed(self.profile_name, record)
+        self.records.append(record)
+
+    def set(self, path: List, value: Any):
+        """Установка значения по пути (промежуточные словари создаются)"""
+        self._add("set", path, v=value)
+
+    def append(self, path: List, value: Any):
+        """Добавление элемента в конец списка по пути"""
+        target = DataManager._resolve(self.profile_data, path)
+        self._add("append", path, i=len(target), v=value)
+
+    def delete(self, path: List):
+        """Удаление ключа словаря по пути"""
+        self._add("del", path)
+
+
+def _set_aside(path: str):
+    """Перенесённый в другое хранилище файл или каталог — в <путь>.migrated
+    (копия на случай возврата; прежняя такая копия заменяется)"""
+    target = path + ".migrated"
+    if os.path.isdir(target):
+        shutil.rmtree(target)
+    os.replace(path, target)
+
+
+class JsonFileStorage:
+    """Все профили в одном profiles.json (режимы 'json' и 'journal').
+
+    В режиме журнала profiles.json — снимок, а изменения дописываются
+    в profiles.journal. Первая строка журнала — отпечаток снимка, к которому
+    он относится ({"generation": sha1 содержимого profiles.json}). Журнал
+    другого снимка не применяется: после сбоя между записью снимка и
+    очисткой журнала его изменения уже в снимке, а после восстановления из
+    бэкапа старый журнал поверх нового снимка (или наоборот) смешал бы
+    состояния — записи "set" хранят абсолютные значения, а "append"
+    пропускаются по индексу. При контрольной точке снимок и пустой журнал
+    нового поколения сохраняются в бэкапы вместе.
+    """
+    lazy = False
+
+    def __init__(self, data_manager: 'DataManager', journal: bool):
+        self.dm = data_manager
+        self.journal = journal
+        self.profiles_file = os.path.join(data_manager.data_dir, "profiles.json")
+        self.journal_file = os.path.join(data_manager.data_dir, "profiles.journal")
+        self._journal_records = 0
+        self._journal_bytes = 0
+        # Отпечаток снимка profiles.json, к которому относится журнал
+        # (None — профили ещё не загружались)
+        self._generation: Optional[str] = None
+
+    def ensure_files(self):
+        # Пустой файл — оборванная запись: его восстановит _load_safe из бэкапа
+        if not os.path.exists(self.profiles_file):
+            sharded = ShardedStorage(self.dm)
+            if os.path.exists(sharded.index_file):
+                self._migrate_sharded(sharded)
+                return
+            self.dm._save_safe({}, self.profiles_file)
+            print(f"[OK] Создан файл профилей: {self.profiles_file}")
+
+    def _migrate_sharded(self, sharded: 'ShardedStorage'):
+        """Возврат с хранилища 'sharded': профили из каталогов — в profiles.json"""
+        profiles = sharded.load_all()
+        self.dm._save_safe(profiles, self.profiles_file)
+        _set_aside(sharded.root)
+        print(f"[OK] Профили из каталогов перенесены в profiles.json: {len(profiles)}")
+
+    def load_all(self, exclude=()) -> Dict:
+        profiles = self.dm._load_safe(self.profiles_file)
+        if self.journal:
+            if self._replay_journal(profiles) and self._journal_records:
+                # Журнал прежнего формата (без отпечатка): изменения — в снимок
+                self.checkpoint(profiles)
+            elif not self._journal_records:
+                self._reset_journal()
+        return profiles
+
+    def _snapshot_generation(self) -> str:
+        """Отпечаток снимка profiles.json (по распакованному содержимому)"""
+        if not os.path.exists(self.profiles_file):
+            return ""
+        try:
+            with open(self.profiles_file, "rb") as f:
+                content = _decode_snapshot(f.read())
+        except SNAPSHOT_ERRORS:
+            content = b""
+        if not content.strip():
+            # Оборванная запись: снимок прочитан из последнего бэкапа (_load_safe)
+            content = self.dm.backups.latest(self.profiles_file) or b""
+        return hashlib.sha1(content).hexdigest()
+
+    def _replay_journal(self, profiles: Dict) -> bool:
+        """Применение журнала к загруженному снимку; True, если у журнала
+        нет отпечатка снимка (прежний формат)"""
+        self._journal_records = 0
+        self._journal_bytes = 0
+        self._generation = self._snapshot_generation()
+        if not os.path.exists(self.journal_file):
+            return False
+        legacy = True
+        with open(self.journal_file, "rb") as f:
+            for number, line in enumerate(f):
+                try:
+                    record = self.dm.codec.loads(line)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    # Недописанная последняя строка после сбоя — игнорируем
+                    print("[!] Пропущена повреждённая запись журнала")
+                    continue
+                if number == 0 and "generation" in record:
+                    legacy = False
+                    if record["generation"] != self._generation:
+                        print("[!] Журнал относится к другому снимку profiles.json и не применяется")
+                        self._journal_records = 0
+                        break
+                    continue
+                DataManager._apply_record(profiles, record)
+                self._journal_records += 1
+                self._journal_bytes += len(line)
+        if self._journal_records:
+            print(f"[OK] Применено записей журнала: {self._journal_records}")
+        return legacy
+
+    def _reset_journal(self):
+        """Пустой журнал текущего снимка: только строка с отпечатком"""
+        header = self.dm.codec.dumps({"generation": self._generation}) + b"\n"
+        self.dm._io(self._write_journal_header, header)
+        self._journal_records = 0
+        self._journal_bytes = 0
+
+    def _write_journal_header(self, header: bytes):
+        tmp_path = self.journal_file + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_file)
+        self.dm._create_backup(self.journal_file, force=True)
+
+    def _journal_append(self, records: List[Dict], profiles: Dict):
+        """Дозапись изменений в журнал одной операцией записи"""
+        if self._generation is None:
+            # Изменение до загрузки профилей (load_all): новый журнал
+            # начинается с отпечатка снимка, существующий дописывается
+            self._generation = self._snapshot_generation()
+            if not os.path.exists(self.journal_file):
+                self._reset_journal()
+        payload = b"".join(self.dm.codec.dumps(record) + b"\n" for record in records)
+        self.dm._io(self._write_journal, payload)
+        self._journal_records += len(records)
+        self._journal_bytes += len(payload)
+        if (self._journal_records >= JOURNAL_CHECKPOINT_RECORDS
+                or self._journal_bytes >= JOURNAL_CHECKPOINT_BYTES):
+            self.checkpoint(profiles)
+
+    def _write_journal(self, payload: bytes):
+        try:
+            with open(self.journal_file, "ab") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e:
+            print(f"[!] Ошибка записи журнала {self.journal_file}: {e}")
+            raise
+        # Версии журнала в бэкапах несут отпечаток своего снимка, поэтому
+        # журнал, не подходящий к восстановленному снимку, не применится
+        self.dm._create_backup(self.journal_file)
+
+    def commit(self, records: List[Dict], dirty: Dict[str, set], profiles: Dict):
+        if self.journal:
+            self._journal_append(records, profiles)
+        else:
+            self.dm._save_safe(profiles, self.profiles_file)
+
+    def checkpoint(self, profiles: Dict):
+        """Запись полного снимка и очистка журнала (новое поколение)"""
+        payload = self.dm._save_safe(profiles, self.profiles_file)
+        if not self.journal:
+            return
+        # Отпечаток — по закодированному снимку: при сбросе файл пишется позже
+        self._generation = hashlib.sha1(_decode_snapshot(payload)).hexdigest()
+        # Снимок и пустой журнал его поколения — в бэкапы вместе, без учёта интервала
+        self.dm._io(self.dm._create_backup, self.profiles_file, True)
+        self._reset_journal()
+
+
+class ShardedStorage:
+    """Каждый профиль в своём каталоге profiles/<каталог>/, по файлу на раздел.
+
+    Разделы профиля: products.json, stock/<товар>.json (по файлу на
+    складскую позицию), meta.json (next_order_number и порядок складских
+    позиций) и <раздел>.json для прочих разделов. Растущие разделы разбиты
+    на части: заказы — orders/<номер части>.json по ORDERS_PER_FILE заказов
+    в порядке списка, дневная статистика и свод продаж —
+    daily_stats/<ГГГГ-ММ>.json и sales_rollup/<ГГГГ-ММ>.json по месяцам.
+    Записываются только разделы, изменённые с последнего сброса, а у
+    разбитых разделов — только части, затронутые записями изменений:
+    сохранение заказа переписывает последнюю часть заказов и файлы месяца,
+    а не всю историю. Небольшой profiles/index.json хранит имена профилей,
+    их каталоги и краткие сведения, поэтому список профилей читается без
+    разбора историй.
+    """
+    lazy = True
+    FORMAT = 3
+    # Заказов в одном файле orders/<номер части>.json
+    ORDERS_PER_FILE = 500
+    # Разделы, разбитые на файлы по месяцам дат-ключей
+    MONTHLY_SECTIONS = ("daily_stats", "sales_rollup")
+    SPLIT_SECTIONS = ("orders",) + MONTHLY_SECTIONS
+
+    def __init__(self, data_manager: 'DataManager'):
+        self.dm = data_manager
+        self.root = os.path.join(data_manager.data_dir, "profiles")
+        self.index_file = os.path.join(self.root, "index.json")
+        self._index: Optional[Dict[str, Dict]] = None
+
+    def ensure_files(self):
+        os.makedirs(self.root, exist_ok=True)
+        if not os.path.exists(self.index_file):
+            self._migrate_legacy()
+        elif self.dm._load_safe(self.index_file).get("format", 1) < self.FORMAT:
+            self._migrate_formats()
+
+    def _migrate_legacy(self):
+        """Перенос данных из единого profiles.json (и его журнала) по каталогам"""
+        legacy = JsonFileStorage(self.dm, journal=True)
+        profiles = legacy.load_all()
+        self._index = {}
+        for name, data in profiles.items():
+            self._write_sections(name, data, None)
+        self._save_index()
+        for path in (legacy.profiles_file, legacy.journal_file):
+            if os.path.exists(path):
+                _set_aside(path)
+        if profiles:
+            print(f"[OK] Профили перенесены в отдельные файлы: {len(profiles)}")
+
+    def _migrate_formats(self):
+        """Разбиение profile.json (формат 1) на файлы разделов, а целых
+        orders.json, daily_stats.json и sales_rollup.json (формат 2) — на части.
+        Прежние файлы остаются рядом с расширением .migrated"""
+        for name in self.list_profiles():
+            profile_dir = self._profile_dir(name)
+            profile_file = os.path.join(profile_dir, "profile.json")
+            if os.path.exists(profile_file):
+                data = self.dm._load_safe(profile_file) or _new_profile_data()
+                legacy_files = [profile_file]
+            else:
+                legacy_files = [os.path.join(profile_dir, section + ".json") for section in self.SPLIT_SECTIONS]
+                legacy_files = [path for path in legacy_files if os.path.exists(path)]
+                if not legacy_files:
+                    continue
+                data = self.load_profile(name)
+            # Сначала части, потом переименование: после сбоя посередине
+            # целые файлы на месте, и load_profile читает их (см. _load_split)
+            self._write_sections(name, data, None)
+            for path in legacy_files:
+                _set_aside(path)
+        self._save_index()
+        print("[OK] Файлы профилей разбиты на разделы и части")
+
+    @staticmethod
+    def _file_name(name: str) -> str:
+        """Имя файла/каталога: читаемая ASCII-часть + хэш полного имени"""
+        slug = re.sub(r'[^A-Za-z0-9_-]+', '_', name).strip('_')[:24]
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:10]
+        return f"{slug}_{digest}" if slug else digest
+
+    def _profile_dir(self, profile_name: str) -> str:
+        entry = self.index().get(profile_name)
+        dir_name = entry["dir"] if entry else self._file_name(profile_name)
+        return os.path.join(self.root, dir_name)
+
+    def _stock_file(self, profile_dir: str, product: str) -> str:
+        return os.path.join(profile_dir, "stock", self._file_name(product) + ".json")
+
+    def index(self) -> Dict[str, Dict]:
+        if self._index is None:
+            self._index = self.dm._load_safe(self.index_file).get("profiles", {})
+        return self._index
+
+    def _save_index(self):
+        self.dm._save_safe({"format": self.FORMAT, "profiles": self._index}, self.index_file)
+
+    def list_profiles(self) -> List[str]:
+        return list(self.index().keys())
+
+    def profile_summaries(self) -> Dict[str, Dict]:
+        return {
+            name: {key: entry.get(key) for key in ("products", "orders", "last_activity")}
+            for name, entry in self.index().items()
+        }
+
+    def load_profile(self, profile_name: str) -> Optional[Dict]:
+        if profile_name not in self.index():
+            return None
+        profile_dir = self._profile_dir(profile_name)
+        data = _new_profile_data()
+        meta = self.dm._load_safe(os.path.join(profile_dir, "meta.json"))
+        data["next_order_number"] = meta.get("next_order_number", 1)
+        whole = set()
+        for fname in sorted(os.listdir(profile_dir)):
+            section, ext = os.path.splitext(fname)
+            if ext == ".json" and section != "meta":
+                data[section] = self.dm._load_safe(os.path.join(profile_dir, fname))
+                whole.add(section)
+        for section in self.SPLIT_SECTIONS:
+            if section not in whole and os.path.isdir(os.path.join(profile_dir, section)):
+                data[section] = self._load_split(profile_dir, section)
+        for product in meta.get("stock", []):
+            stock_file = self.dm._load_safe(self._stock_file(profile_dir, product))
+            data["stock"][product] = stock_file.get("data", {"current_quantity": 0.0,
+                                                            "total_value": 0.0,
+                                                            "history": []})
+        return data
+
+    def _load_split(self, profile_dir: str, section: str) -> Any:
+        """Раздел из частей: заказы — подряд по номерам частей, разделы по
+        месяцам — объединением. Целый файл раздела (формат 2, ещё не
+        перенесённый) читается вместо частей в load_profile"""
+        section_dir = os.path.join(profile_dir, section)
+        fnames = sorted(fname for fname in os.listdir(section_dir) if fname.endswith(".json"))
+        if section == "orders":
+            orders = []
+            for fname in fnames:
+                orders.extend(self.dm._load_safe(os.path.join(section_dir, fname)) or [])
+            return orders
+        days = {}
+        for fname in fnames:
+            days.update(self.dm._load_safe(os.path.join(section_dir, fname)))
+        return days
+
+    def load_all(self, exclude=()) -> Dict:
+        return {
+            name: self.load_profile(name)
+            for name in self.list_profiles() if name not in exclude
+        }
+
+    @staticmethod
+    def _month(day: Any) -> str:
+        """Часть раздела по месяцам для ключа-даты: ГГГГ-ММ, прочие ключи — в other"""
+        return day[:7] if isinstance(day, str) and re.match(r"\d{4}-\d{2}-", day) else "other"
+
+    def _split_parts(self, profile_name: str, records: List[Dict]) -> Dict[str, Optional[set]]:
+        """Части разбитых разделов профиля, затронутые записями: раздел ->
+        номера частей заказов или месяцы; None — раздел изменён целиком"""
+        parts: Dict[str, Optional[set]] = {}
+        for record in records:
+            path = record.get("path")
+            if record["p"] != profile_name or not path or path[0] not in self.SPLIT_SECTIONS:
+                continue
+            section = path[0]
+            if section in parts and parts[section] is None:
+                continue
+            if section == "orders" and record["op"] == "append" and len(path) == 1:
+                part = record["i"] // self.ORDERS_PER_FILE
+            elif section == "orders" and len(path) > 1 and isinstance(path[1], int):
+                part = path[1] // self.ORDERS_PER_FILE
+            elif section != "orders" and len(path) > 1:
+                part = self._month(path[1])
+            else:
+                parts[section] = None
+                continue
+            parts.setdefault(section, set()).add(part)
+        return parts
+
+    def _write_split(self, profile_dir: str, section: str, value: Any, parts: Optional[set]):
+        """Запись частей разбитого раздела (всех, если parts is None);
+        части, которых больше нет в данных, удаляются"""
+        section_dir = os.path.join(profile_dir, section)
+        if section == "orders":
+            size = self.ORDERS_PER_FILE
+            count = (len(value) + size - 1) // size
+            numbers = range(count) if parts is None else sorted(n for n in parts if n < count)
+            chunks = {f"{n:06d}": value[n * size:(n + 1) * size] for n in numbers}
+            touched = None if parts is None else {f"{n:06d}" for n in parts}
+        else:
+            chunks: Dict[str, Dict] = {}
+            for day, entry in value.items():
+                month = self._month(day)
+                if parts is None or month in parts:
+                    chunks.setdefault(month, {})[day] = entry
+            touched = parts
+        if touched is None:
+            touched = {fname[:-5] for fname in os.listdir(section_dir) if fname.endswith(".json")} \
+                if os.path.isdir(section_dir) else set()
+        for key, chunk in chunks.items():
+            self.dm._save_safe(chunk, os.path.join(section_dir, key + ".json"))
+        for key in touched - set(chunks):
+            self.dm._remove_file(os.path.join(section_dir, key + ".json"))
+
+    def _write_meta(self, profile_dir: str, data: Dict):
+        self.dm._save_safe({
+            "next_order_number": data.get("next_order_number", 1),
+            "stock": list(data["stock"].keys())
+        }, os.path.join(profile_dir, "meta.json"))
+
+    def _write_sections(self, profile_name: str, data: Dict, sections: Optional[set],
+                        split_parts: Optional[Dict[str, Optional[set]]] = None) -> bool:
+        """Запись изменённых разделов (все, если sections is None); у разбитых
+        разделов — частей из split_parts (см. _split_parts), без них — всех.
+        True, если изменились сведения в индексе"""
+        profile_dir = self._profile_dir(profile_name)
+        os.makedirs(os.path.join(profile_dir, "stock"), exist_ok=True)
+        write_meta = sections is None or ("next_order_number",) in sections
+        if sections is None:
+            for fname in os.listdir(profile_dir):
+                if fname.endswith(".json") and fname[:-5] not in data and fname not in ("meta.json", "profile.json") \
+                        and fname[:-5] not in self.SPLIT_SECTIONS:
+                    self.dm._remove_file(os.path.join(profile_dir, fname))
+            sections = {(name,) for name in data} | {(name,) for name in self.SPLIT_SECTIONS}
+            split_parts = None
+        for section in sections:
+            if section[0] == "stock" and len(section) == 2:
+                product = section[1]
+                stock_file = self._stock_file(profile_dir, product)
+                if product in data["stock"]:
+                    write_meta |= not os.path.exists(stock_file)
+                    self.dm._save_safe({"product": product, "data": data["stock"][product]}, stock_file)
+                elif os.path.exists(stock_file):
+                    self.dm._remove_file(stock_file)
+                    write_meta = True
+            elif section[0] == "stock":
+                for fname in os.listdir(os.path.join(profile_dir, "stock")):
+                    self.dm._remove_file(os.path.join(profile_dir, "stock", fname))
+                for product, entry in data["stock"].items():
+                    self.dm._save_safe({"product": product, "data": entry},
+                                       self._stock_file(profile_dir, product))
+                write_meta = True
+            elif section[0] in self.SPLIT_SECTIONS:
+                if section[0] in data:
+                    # Пустой каталог — раздел есть, но пуст
+                    os.makedirs(os.path.join(profile_dir, section[0]), exist_ok=True)
+                    parts = split_parts.get(section[0]) if split_parts is not None else None
+                    self._write_split(profile_dir, section[0], data[section[0]], parts)
+                elif os.path.isdir(os.path.join(profile_dir, section[0])):
+                    self._write_split(profile_dir, section[0], [] if section[0] == "orders" else {}, None)
+                    self.dm._io(shutil.rmtree, os.path.join(profile_dir, section[0]), True)
+            elif section[0] != "next_order_number":
+                section_file = os.path.join(profile_dir, section[0] + ".json")
+                if section[0] in data:
+                    self.dm._save_safe(data[section[0]], section_file)
+                elif os.path.exists(section_file):
+                    self.dm._remove_file(section_file)
+        if write_meta:
+            self._write_meta(profile_dir, data)
+        entry = dict(_profile_meta(data), dir=os.path.basename(profile_dir))
+        if self.index().get(profile_name) == entry:
+            return False
+        self._index[profile_name] = entry
+        return True
+
+    def _remove_profile(self, profile_name: str) -> bool:
+        if profile_name not in self.index():
+            return False
+        profile_dir = self._profile_dir(profile_name)
+        for dirpath, _, fnames in os.walk(profile_dir):
+            for fname in fnames:
+                self.dm._remove_file(os.path.join(dirpath, fname))
+        self.dm._io(shutil.rmtree, profile_dir, True)
+        del self._index[profile_name]
+        return True
+
+    def commit(self, records: List[Dict], dirty: Dict[str, set], profiles: Dict):
+        index_changed = False
+        for name, sections in dirty.items():
+            if name not in profiles:
+                index_changed |= self._remove_profile(name)
+            elif ("*",) in sections:
+                index_changed |= self._write_sections(name, profiles[name], None)
+            else:
+                index_changed |= self._write_sections(name, profiles[name], sections,
+                                                      self._split_parts(name, records))
+        if index_changed:
+            self._save_index()
+
+    def checkpoint(self, profiles: Dict):
+        """Полная перезапись всех загруженных профилей"""
+        for name, data in profiles.items():
+            self._write_sections(name, data, None)
+        for name in set(self.index()) - set(profiles):
+            if self.dm._all_loaded:
+                self._remove_profile(name)
+        self._save_index()
+
+
+class SqliteStorage:
+    """Профили в базе SQLite profiles.db (режим 'sqlite').
+
+    Товары, остатки, история склада, заказы, позиции заказов, дневная
+    статистика и свод продаж лежат в отдельных таблицах; прочие разделы профиля — в
+    таблице sections в виде JSON. Коммит превращает записи изменений в
+    минимальный набор затронутых строк и пишет их одной транзакцией.
+    Столбцы без объявленного типа хранят значения как есть (int остаётся
+    int, float — float), а неизвестные ключи записей уходят в столбец extra.
+    """
+    lazy = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS profiles (
+            id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, next_order_number);
+        CREATE TABLE IF NOT EXISTS sections (
+            profile_id INTEGER, name TEXT, data TEXT,
+            PRIMARY KEY (profile_id, name));
+        CREATE TABLE IF NOT EXISTS products (
+            profile_id INTEGER, position INTEGER, id, name, cost_price, profit,
+            expenses, percent_expenses, percent_profit, extra,
+            PRIMARY KEY (profile_id, position));
+        CREATE TABLE IF NOT EXISTS stock (
+            profile_id INTEGER, product TEXT, position INTEGER,
+            current_quantity, total_value, extra,
+            PRIMARY KEY (profile_id, product));
+        CREATE TABLE IF NOT EXISTS stock_history (
+            profile_id INTEGER, product TEXT, seq INTEGER, date TEXT, quantity,
+            price_per_kg, operation, total_amount, balance_after, extra,
+            PRIMARY KEY (profile_id, product, seq));
+        CREATE INDEX IF NOT EXISTS idx_stock_history_date
+            ON stock_history (profile_id, date);
+        CREATE TABLE IF NOT EXISTS orders (
+            profile_id INTEGER, position INTEGER, number, date TEXT,
+            subtotal, delivery_cost, total, extra,
+            PRIMARY KEY (profile_id, position));
+        CREATE INDEX IF NOT EXISTS idx_orders_date ON orders (profile_id, date);
+        CREATE TABLE IF NOT EXISTS order_items (
+            profile_id INTEGER, order_position INTEGER, position INTEGER,
+            product_id, product TEXT, quantity, cost_price, total, extra,
+            PRIMARY KEY (profile_id, order_position, position));
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            profile_id INTEGER, date TEXT, orders_count, delivery_count,
+            delivery_sum, total_revenue, extra,
+            PRIMARY KEY (profile_id, date));
+        CREATE TABLE IF NOT EXISTS sales_rollup (
+            profile_id INTEGER, date TEXT, product TEXT, position INTEGER,
+            quantity, total, extra,
+            PRIMARY KEY (profile_id, date, product));
+    """
+    PRODUCT_COLS = ("id", "name", "cost_price", "profit", "expenses", "percent_expenses", "percent_profit")
+    STOCK_COLS = ("current_quantity", "total_value")
+    HISTORY_COLS = ("date", "quantity", "price_per_kg", "operation", "total_amount", "balance_after")
+    ORDER_COLS = ("number", "date", "subtotal", "delivery_cost", "total")
+    ITEM_COLS = ("product_id", "product", "quantity", "cost_price", "total")
+    DAILY_COLS = ("orders_count", "delivery_count", "delivery_sum", "total_revenue")
+    ROLLUP_COLS = ("quantity", "total")
+    TABLE_SECTIONS = ("products", "stock", "orders", "daily_stats", "sales_rollup", "next_order_number")
+    # Столбцы, появившиеся после первой версии схемы: в старых базах
+    # добавляются через ALTER TABLE
+    ADDED_COLUMNS = {"products": ("id",), "order_items": ("product_id",)}
+    INDEXES = """
+        DROP INDEX IF EXISTS idx_order_items_product;
+        CREATE INDEX IF NOT EXISTS idx_order_items_product_ref
+            ON order_items (profile_id, product_id, product);
+    """
+
+    def __init__(self, data_manager: 'DataManager'):
+        self.dm = data_manager
+        self.db_file = os.path.join(data_manager.data_dir, "profiles.db")
+        # Чтение (поток интерфейса, под _lock) и запись (сброс, под _write_lock)
+        # идут через разные соединения: в режиме WAL чтение видит последнюю
+        # завершённую транзакцию, а не половину идущей записи
+        self.conn: Optional[sqlite3.Connection] = None
+        self.wconn: Optional[sqlite3.Connection] = None
+
+    def ensure_files(self):
+        is_new = not os.path.exists(self.db_file)
+        self.wconn = sqlite3.connect(self.db_file, isolation_level=None, check_same_thread=False)
+        self.wconn.execute("PRAGMA journal_mode=WAL")
+        self.wconn.execute("PRAGMA synchronous=NORMAL")
+        self.wconn.executescript(self.SCHEMA)
+        self._upgrade_schema()
+        self.conn = sqlite3.connect(self.db_file, isolation_level=None, check_same_thread=False)
+        if is_new:
+            self._migrate_legacy()
+
+    def _upgrade_schema(self):
+        """Добавление новых столбцов в базу, созданную прежней версией"""
+        for table, columns in self.ADDED_COLUMNS.items():
+            existing = {row[1] for row in self.wconn.execute(f"PRAGMA table_info({table})")}
+            for column in columns:
+                if column not in existing:
+                    self.wconn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+        self.wconn.executescript(self.INDEXES)
+
+    def _migrate_legacy(self):
+        """Перенос данных из каталогов профилей или единого profiles.json"""
+        sharded = ShardedStorage(self.dm)
+        if os.path.exists(sharded.index_file):
+            profiles = sharded.load_all()
+            legacy_paths = [sharded.root]
+        else:
+            legacy = JsonFileStorage(self.dm, journal=True)
+            profiles = legacy.load_all()
+            legacy_paths = [legacy.profiles_file, legacy.journal_file]
+        if not profiles:
+            return
+        self.checkpoint(profiles)
+        for path in legacy_paths:
+            if os.path.exists(path):
+                _set_aside(path)
+        print(f"[OK] Профили перенесены в SQLite: {len(profiles)}")
+
+    # --- Преобразование строк ---------------------------------------------
+
+    @staticmethod
+    def _split(record: Dict, cols: Tuple) -> List:
+        """Значения столбцов + JSON с остальными ключами записи"""
+        values = [record.get(col) for col in cols]
+        extra = {k: v for k, v in record.items() if k not in cols}
+        values.append(json.dumps(extra, ensure_ascii=False, default=_records_default) if extra else None)
+        return values
+
+    @staticmethod
+    def _join(row, cols: Tuple) -> Dict:
+        record = {col: value for col, value in zip(cols, row) if value is not None}
+        if row[len(cols)]:
+            record.update(json.loads(row[len(cols)]))
+        return record
+
+    def _profile_id(self, profile_name: str, create: bool = False,
+                    conn: Optional[sqlite3.Connection] = None) -> Optional[int]:
+        conn = conn or self.conn
+        row = conn.execute("SELECT id FROM profiles WHERE name = ?", (profile_name,)).fetchone()
+        if row:
+            return row[0]
+        if not create:
+            return None
+        return conn.execute("INSERT INTO profiles (name) VALUES (?)", (profile_name,)).lastrowid
+
+    # --- Чтение -----------------------------------------------------------
+
+    def list_profiles(self) -> List[str]:
+        return [row[0] for row in self.conn.execute("SELECT name FROM profiles")]
+
+    def profile_summaries(self) -> Dict[str, Dict]:
+        rows = self.conn.execute("""
+            SELECT p.name,
+                   (SELECT COUNT(*) FROM products WHERE profile_id = p.id),
+                   (SELECT COUNT(*) FROM orders WHERE profile_id = p.id),
+                   (SELECT MAX(date) FROM orders WHERE profile_id = p.id),
+                   (SELECT MAX(substr(date, 1, 10)) FROM stock_history WHERE profile_id = p.id)
+            FROM profiles p
+        """)
+        return {
+            name: {"products": products, "orders": orders,
+                   "last_activity": max(last_order or "", last_stock or "")}
+            for name, products, orders, last_order, last_stock in rows
+        }
+
+    def load_profile(self, profile_name: str) -> Optional[Dict]:
+        row = self.conn.execute(
+            "SELECT id, next_order_number FROM profiles WHERE name = ?", (profile_name,)
+        ).fetchone()
+        if row is None:
+            return None
+        pid, next_number = row
+        q = self.conn.execute
+        data = _new_profile_data()
+        if next_number is not None:
+            data["next_order_number"] = next_number
+        cols = ", ".join(self.PRODUCT_COLS)
+        data["products"] = [
+            self._join(r, self.PRODUCT_COLS)
+            for r in q(f"SELECT {cols}, extra FROM products WHERE profile_id = ? ORDER BY position", (pid,))
+        ]
+        histories = defaultdict(list)
+        cols = ", ".join(self.HISTORY_COLS)
+        for r in q(f"SELECT product, {cols}, extra FROM stock_history WHERE profile_id = ? "
+                   f"ORDER BY product, seq", (pid,)):
+            histories[r[0]].append(self._join(r[1:], self.HISTORY_COLS))
+        cols = ", ".join(self.STOCK_COLS)
+        for r in q(f"SELECT product, {cols}, extra FROM stock WHERE profile_id = ? ORDER BY position", (pid,)):
+            entry = self._join(r[1:], self.STOCK_COLS)
+            entry["history"] = histories.get(r[0], [])
+            data["stock"][r[0]] = entry
+        items = defaultdict(list)
+        cols = ", ".join(self.ITEM_COLS)
+        for r in q(f"SELECT order_position, {cols}, extra FROM order_items WHERE profile_id = ? "
+                   f"ORDER BY order_position, position", (pid,)):
+            items[r[0]].append(self._join(r[1:], self.ITEM_COLS))
+        cols = ", ".join(self.ORDER_COLS)
+        for r in q(f"SELECT position, {cols}, extra FROM orders WHERE profile_id = ? ORDER BY position", (pid,)):
+            order = self._join(r[1:], self.ORDER_COLS)
+            order["items"] = items.get(r[0], [])
+            data["orders"].append(order)
+        cols = ", ".join(self.DAILY_COLS)
+        for r in q(f"SELECT date, {cols}, extra FROM daily_stats WHERE profile_id = ? ORDER BY date", (pid,)):
+            data["daily_stats"][r[0]] = self._join(r[1:], self.DAILY_COLS)
+        cols = ", ".join(self.ROLLUP_COLS)
+        for r in q(f"SELECT date, product, {cols}, extra FROM sales_rollup WHERE profile_id = ? "
+                   f"ORDER BY date, position", (pid,)):
+            data.setdefault("sales_rollup", {}).setdefault(r[0], {})[r[1]] = self._join(r[2:], self.ROLLUP_COLS)
+        for name, payload in q("SELECT name, data FROM sections WHERE profile_id = ?", (pid,)):
+            data[name] = json.loads(payload)
+        return data
+
+    def load_all(self, exclude=()) -> Dict:
+        return {
+            name: self.load_profile(name)
+            for name in self.list_profiles() if name not in exclude
+        }
+
+    # --- Запись -----------------------------------------------------------
+
+    @staticmethod
+    def _units(records: List[Dict]) -> List[Tuple]:
+        """Затронутые записями единицы хранения (без повторов, в порядке появления)"""
+        units = []
+        for record in records:
+            op, path = record["op"], record.get("path", [])
+            if op in ("put", "drop"):
+                unit = ("profile",)
+            elif path[0] == "products":
+                unit = ("products",)
+            elif path[0] == "stock":
+                if len(path) == 1:
+                    unit = ("stock_all",)
+                elif len(path) == 2 or (path[2] == "history" and not (op == "append" and len(path) == 3)):
+                    unit = ("stock", path[1])
+                elif path[2] == "history":
+                    unit = ("history", path[1], record["i"])
+                else:
+                    unit = ("stock_row", path[1])
+            elif path[0] == "orders":
+                if len(path) == 1:
+                    unit = ("order", record["i"]) if op == "append" else ("orders",)
+                else:
+                    unit = ("order", path[1])
+            elif path[0] == "daily_stats":
+                unit = ("day", path[1]) if len(path) > 1 else ("daily_stats",)
+            elif path[0] == "sales_rollup":
+                unit = ("rollup_day", path[1]) if len(path) > 1 else ("sales_rollup",)
+            elif path[0] == "next_order_number":
+                unit = ("meta",)
+            else:
+                unit = ("section", path[0])
+            units.append(unit)
+        return list(dict.fromkeys(units))
+
+    def _write_products(self, pid: int, data: Dict):
+        self.wconn.execute("DELETE FROM products WHERE profile_id = ?", (pid,))
+        self.wconn.executemany(
+            f"INSERT INTO products (profile_id, position, {', '.join(self.PRODUCT_COLS)}, extra) "
+            f"VALUES (?, ?, {', '.join('?' * len(self.PRODUCT_COLS))}, ?)",
+            [[pid, pos] + self._split(p, self.PRODUCT_COLS) for pos, p in enumerate(data["products"])]
+        )
+
+    def _write_stock_row(self, pid: int, data: Dict, product: str):
+        entry = data["stock"].get(product)
+        if entry is None:
+            self.wconn.execute("DELETE FROM stock WHERE profile_id = ? AND product = ?", (pid, product))
+            self.wconn.execute("DELETE FROM stock_history WHERE profile_id = ? AND product = ?", (pid, product))
+            return
+        values = self._split({k: v for k, v in entry.items() if k != "history"}, self.STOCK_COLS)
+        cur = self.wconn.execute(
+            "UPDATE stock SET current_quantity = ?, total_value = ?, extra = ? "
+            "WHERE profile_id = ? AND product = ?", values + [pid, product]
+        )
+        if cur.rowcount == 0:
+            position = self.wconn.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM stock WHERE profile_id = ?", (pid,)
+            ).fetchone()[0]
+            self.wconn.execute("INSERT INTO stock VALUES (?, ?, ?, ?, ?, ?)", [pid, product, position] + values)
+
+    def _write_history(self, pid: int, data: Dict, product: str, seq: Optional[int] = None):
+        history = data["stock"].get(product, {}).get("history", [])
+        if seq is None:
+            self.wconn.execute("DELETE FROM stock_history WHERE profile_id = ? AND product = ?", (pid, product))
+            rows = list(enumerate(history))
+        else:
+            rows = [(seq, history[seq])] if seq < len(history) else []
+        self.wconn.executemany(
+            "INSERT OR REPLACE INTO stock_history VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [[pid, product, i] + self._split(op, self.HISTORY_COLS) for i, op in rows]
+        )
+
+    def _write_order(self, pid: int, data: Dict, position: int):
+        self.wconn.execute("DELETE FROM orders WHERE profile_id = ? AND position = ?", (pid, position))
+        self.wconn.execute("DELETE FROM order_items WHERE profile_id = ? AND order_position = ?", (pid, position))
+        if position >= len(data["orders"]):
+            return
+        order = data["orders"][position]
+        self.wconn.execute(
+            "INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [pid, position] + self._split({k: v for k, v in order.items() if k != "items"}, self.ORDER_COLS)
+        )
+        self.wconn.executemany(
+            f"INSERT INTO order_items (profile_id, order_position, position, {', '.join(self.ITEM_COLS)}, extra) "
+            f"VALUES (?, ?, ?, {', '.join('?' * len(self.ITEM_COLS))}, ?)",
+            [[pid, position, i] + self._split(item, self.ITEM_COLS) for i, item in enumerate(order["items"])]
+        )
+
+    def _write_day(self, pid: int, data: Dict, day: str):
+        self.wconn.execute("DELETE FROM daily_stats WHERE profile_id = ? AND date = ?", (pid, day))
+        if day in data["daily_stats"]:
+            self.wconn.execute(
+                "INSERT INTO daily_stats VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [pid, day] + self._split(data["daily_stats"][day], self.DAILY_COLS)
+            )
+
+    def _write_rollup_day(self, pid: int, data: Dict, day: str):
+        self.wconn.execute("DELETE FROM sales_rollup WHERE profile_id = ? AND date = ?", (pid, day))
+        products = data.get("sales_rollup", {}).get(day, {})
+        self.wconn.executemany(
+            "INSERT INTO sales_rollup VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [[pid, day, product, position] + self._split(entry, self.ROLLUP_COLS)
+             for position, (product, entry) in enumerate(products.items())]
+        )
+
+    def _write_section(self, pid: int, data: Dict, name: str):
+        self.wconn.execute("DELETE FROM sections WHERE profile_id = ? AND name = ?", (pid, name))
+        if name in data:
+            self.wconn.execute(
+                "INSERT INTO sections VALUES (?, ?, ?)",
+                (pid, name, json.dumps(data[name], ensure_ascii=False, default=_records_default))
+            )
+
+    def _write_profile(self, profile_name: str, data: Optional[Dict]):
+        """Полная перезапись профиля (или удаление, если data is None)"""
+        pid = self._profile_id(profile_name, conn=self.wconn)
+        if pid is not None:
+            for table in ("sections", "products", "stock", "stock_history",
+                          "orders", "order_items", "daily_stats", "sales_rollup"):
+                self.wconn.execute(f"DELETE FROM {table} WHERE profile_id = ?", (pid,))
+            self.wconn.execute("DELETE FROM profiles WHERE id = ?", (pid,))
+        if data is None:
+            return
+        pid = self._profile_id(profile_name, create=True, conn=self.wconn)
+        self.wconn.execute("UPDATE profiles SET next_order_number = ? WHERE id = ?",
+                          (data.get("next_order_number"), pid))
+        self._write_products(pid, data)
+        for product in data["stock"]:
+            self._write_stock_row(pid, data, product)
+            self._write_history(pid, data, product)
+        for position in range(len(data["orders"])):
+            self._write_order(pid, data, position)
+        for day in data["daily_stats"]:
+            self._write_day(pid, data, day)
+        for day in data.get("sales_rollup", {}):
+            self._write_rollup_day(pid, data, day)
+        for name in data:
+            if name not in self.TABLE_SECTIONS:
+                self._write_section(pid, data, name)
+
+    def _write_units(self, profile_name: str, data: Optional[Dict], units: List[Tuple]):
+        if ("profile",) in units or data is None:
+            self._write_profile(profile_name, data)
+            return
+        pid = self._profile_id(profile_name, create=True, conn=self.wconn)
+        stock_rewritten = {u[1] for u in units if u[0] == "stock"}
+        for unit in units:
+            kind = unit[0]
+            if kind == "products":
+                self._write_products(pid, data)
+            elif kind == "stock_all":
+                self.wconn.execute("DELETE FROM stock WHERE profile_id = ?", (pid,))
+                self.wconn.execute("DELETE FROM stock_history WHERE profile_id = ?", (pid,))
+                for product in data["stock"]:
+                    self._write_stock_row(pid, data, product)
+                    self._write_history(pid, data, product)
+            elif kind == "stock":
+                self._write_stock_row(pid, data, unit[1])
+                if unit[1] in data["stock"]:
+                    self._write_history(pid, data, unit[1])
+            elif kind == "stock_row":
+                self._write_stock_row(pid, data, unit[1])
+            elif kind == "history" and unit[1] not in stock_rewritten:
+                self._write_history(pid, data, unit[1], unit[2])
+            elif kind == "orders":
+                self.wconn.execute("DELETE FROM orders WHERE profile_id = ?", (pid,))
+                self.wconn.execute("DELETE FROM order_items WHERE profile_id = ?", (pid,))
+                for position in range(len(data["orders"])):
+                    self._write_order(pid, data, position)
+            elif kind == "order":
+                self._write_order(pid, data, unit[1])
+            elif kind == "daily_stats":
+                self.wconn.execute("DELETE FROM daily_stats WHERE profile_id = ?", (pid,))
+                for day in data["daily_stats"]:
+                    self._write_day(pid, data, day)
+            elif kind == "day":
+                self._write_day(pid, data, unit[1])
+            elif kind == "sales_rollup":
+                self.wconn.execute("DELETE FROM sales_rollup WHERE profile_id = ?", (pid,))
+                for day in data.get("sales_rollup", {}):
+                    self._write_rollup_day(pid, data, day)
+            elif kind == "rollup_day":
+                self._write_rollup_day(pid, data, unit[1])
+            elif kind == "meta":
+                self.wconn.execute("UPDATE profiles SET next_order_number = ? WHERE id = ?",
+                                  (data.get("next_order_number"), pid))
+            elif kind == "section":
+                self._write_section(pid, data, unit[1])
+
+    @staticmethod
+    def _unit_data(data: Optional[Dict], units: List[Tuple]) -> Optional[Dict]:
+        """Копия частей профиля, которые читает _write_units для этих единиц
+        (снимается под _lock, запись идёт уже без него)"""
+        if data is None or ("profile",) in units:
+            return copy.deepcopy(data)
+        part: Dict[str, Any] = {}
+        stock, history_seqs = {}, {}
+        for unit in units:
+            kind = unit[0]
+            if kind == "products":
+                part["products"] = copy.deepcopy(data["products"])
+            elif kind == "stock_all":
+                stock = copy.deepcopy(data["stock"])
+            elif kind in ("stock", "stock_row", "history"):
+                entry = data["stock"].get(unit[1])
+                if entry is None or kind == "stock":
+                    stock[unit[1]] = copy.deepcopy(entry)
+                    continue
+                stock.setdefault(unit[1], {k: copy.deepcopy(v) for k, v in entry.items() if k != "history"})
+                if kind == "history":
+                    history_seqs.setdefault(unit[1], []).append(unit[2])
+            elif kind == "orders":
+                part["orders"] = copy.deepcopy(data["orders"])
+            elif kind == "order":
+                orders = part.setdefault("orders", list(data["orders"]))
+                if unit[1] < len(orders):
+                    orders[unit[1]] = copy.deepcopy(orders[unit[1]])
+            elif kind in ("daily_stats", "day"):
+                days = data["daily_stats"] if kind == "daily_stats" else {unit[1]: None}
+                target = part.setdefault("daily_stats", {})
+                for day in days:
+                    if day in data["daily_stats"]:
+                        target[day] = copy.deepcopy(data["daily_stats"][day])
+            elif kind in ("sales_rollup", "rollup_day"):
+                rollup = data.get("sales_rollup", {})
+                days = rollup if kind == "sales_rollup" else {unit[1]: None}
+                target = part.setdefault("sales_rollup", {})
+                for day in days:
+                    if day in rollup:
+                        target[day] = copy.deepcopy(rollup[day])
+            elif kind == "meta":
+                part["next_order_number"] = data.get("next_order_number")
+            elif kind == "section" and unit[1] in data:
+                part[unit[1]] = copy.deepcopy(data[unit[1]])
+        # Из истории с дозаписью нужны только добавленные операции
+        for product, seqs in history_seqs.items():
+            entry = stock[product]
+            if "history" in entry:
+                continue
+            history = data["stock"][product].get("history", [])
+            entry["history"] = [None] * len(history)
+            for seq in seqs:
+                if seq < len(history):
+                    entry["history"][seq] = copy.deepcopy(history[seq])
+        if any(u[0] in ("stock_all", "stock", "stock_row", "history") for u in units):
+            part["stock"] = {name: entry for name, entry in stock.items() if entry is not None}
+        return part
+
+    def commit(self, records: List[Dict], dirty: Dict[str, set], profiles: Dict):
+        by_profile: Dict[str, List[Dict]] = {}
+        for record in records:
+            by_profile.setdefault(record["p"], []).append(record)
+        plan = []
+        for name, profile_records in by_profile.items():
+            units = self._units(profile_records)
+            plan.append((name, self._unit_data(profiles.get(name), units), units))
+        self.dm._io(self._write_plan, plan)
+
+    def _write_plan(self, plan: List[Tuple]):
+        try:
+            self.wconn.execute("BEGIN")
+            for name, data, units in plan:
+                self._write_units(name, data, units)
+            self.wconn.execute("COMMIT")
+        except Exception as e:
+            self.wconn.execute("ROLLBACK")
+            print(f"[!] Ошибка сохранения в {self.db_file}: {e}")
+            raise
+
+    def checkpoint(self, profiles: Dict):
+        """Полная перезапись всех загруженных профилей одной транзакцией"""
+        try:
+            self.wconn.execute("BEGIN")
+            for name, data in profiles.items():
+                self._write_profile(name, data)
+            self.wconn.execute("COMMIT")
+        except Exception:
+            self.wconn.execute("ROLLBACK")
+            raise
+
+
+class BackupStore:
+    """Инкрементальные бэкапы: файлы режутся на фрагменты, каждый уникальный
+    фрагмент хранится один раз (objects/<хэш>), а версии файлов описываются
+    списками хэшей в журнале-манифесте manifest.jsonl.
+
+    Границы фрагментов выбираются по содержимому (по хэшу строки или объекта
+    JSON), поэтому вставка заказа в середину файла меняет лишь пару соседних
+    фрагментов. Снимок одного файла делается не чаще раза в interval секунд;
+    удаление файла записывается в манифест отдельной версией. Фрагменты
+    нарезаются из распакованного содержимого (иначе сжатие уничтожило бы
+    совпадения) и хранятся сжатыми, если выбран формат со сжатием.
+    """
+    # Граница фрагмента — после перевода строки или после "}," (объект в массиве)
+    _PIECE_RE = re.compile(rb'(?<=\n)|(?<=},)')
+    CHUNK_MIN = 1024
+    CHUNK_MASK = 0x0F           # после CHUNK_MIN граница в среднем через 16 кусков
+    CHUNK_MAX = 64 * 1024
+
+    def __init__(self, backup_dir: str, data_dir: str, interval: float, keep_days: int,
+                 snapshot_format: str = 'json'):
+        self.backup_dir = backup_dir
+        self.snapshot_format = snapshot_format
+        self.data_dir = data_dir
+        self.interval = interval
+        self.keep_days = keep_days
+        self.objects_dir = os.path.join(backup_dir, "objects")
+        self.manifest_file = os.path.join(backup_dir, "manifest.jsonl")
+        # Версии файлов: путь относительно data_dir -> [(время, [хэши] | None)]
+        self._versions: Dict[str, List[Tuple[str, Optional[List[str]]]]] = {}
+        self._last_snapshot: Dict[str, datetime] = {}
+        # Файлы, изменённые после своего последнего снимка
+        self._stale: Dict[str, str] = {}
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._load_manifest()
+        self._prune()
+
+    def _load_manifest(self):
+        if not os.path.exists(self.manifest_file):
+            return
+        with open(self.manifest_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._versions.setdefault(entry["f"], []).append((entry["t"], entry["c"]))
+
+    def _write_manifest(self):
+        """Полная перезапись манифеста (только при очистке старых версий)"""
+        tmp_file = self.manifest_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            for rel_path, versions in self._versions.items():
+                for moment, chunks in versions:
+                    f.write(json.dumps({"f": rel_path, "t": moment, "c": chunks},
+                                       ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(tmp_file, self.manifest_file)
+
+    def _append_manifest(self, rel_path: str, moment: str, chunks: Optional[List[str]]):
+        self._versions.setdefault(rel_path, []).append((moment, chunks))
+        with open(self.manifest_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"f": rel_path, "t": moment, "c": chunks},
+                               ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _split(self, content: bytes) -> List[bytes]:
+        """Разбиение на фрагменты с границами, зависящими только от содержимого"""
+        chunks, current, size = [], [], 0
+        for piece in self._PIECE_RE.split(content):
+            if not piece:
+                continue
+            current.append(piece)
+            size += len(piece)
+            # Граница — по хэшу одного куска: после изменённого места деление
+            # совпадает с прежним с первой же границы. Одинаковые строки подряд
+            # без границы режет CHUNK_MAX
+            if (size >= self.CHUNK_MIN and (zlib.crc32(piece) & self.CHUNK_MASK) == 0) or size >= self.CHUNK_MAX:
+                chunks.append(b"".join(current))
+                current, size = [], 0
+        if current:
+            chunks.append(b"".join(current))
+        return chunks
+
+    def _store(self, content: bytes) -> List[str]:
+        digests = []
+        for chunk in self._split(content):
+            digest = hashlib.sha1(chunk).hexdigest()
+            path = self._object_path(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(_compress_snapshot(chunk, self.snapshot_format))
+            digests.append(digest)
+        return digests
+
+    def _rel(self, filepath: str) -> str:
+        return os.path.relpath(filepath, self.data_dir).replace(os.sep, "/")
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+
+    def snapshot(self, filepath: str, force: bool = False) -> bool:
+        """Снимок текущего содержимого файла; False, если снимок не нужен"""
+        rel_path = self._rel(filepath)
+        last = self._last_snapshot.get(rel_path)
+        if not force and last and (datetime.now() - last).total_seconds() < self.interval:
+            self._stale[rel_path] = filepath
+            return False
+        self._stale.pop(rel_path, None)
+        if not os.path.exists(filepath):
+            return False
+        with open(filepath, "rb") as f:
+            chunks = self._store(_decode_snapshot(f.read()))
+        self._last_snapshot[rel_path] = datetime.now()
+        versions = self._versions.get(rel_path)
+        if versions and versions[-1][1] == chunks:
+            return False
+        self._append_manifest(rel_path, self._now(), chunks)
+        return True
+
+    def record_removal(self, filepath: str):
+        """Отметка об удалении файла (восстановление на более позднее время его удалит)"""
+        rel_path = self._rel(filepath)
+        versions = self._versions.get(rel_path)
+        if versions and versions[-1][1] is not None:
+            self._append_manifest(rel_path, self._now(), None)
+        self._last_snapshot.pop(rel_path, None)
+        self._stale.pop(rel_path, None)
+
+    def snapshot_stale(self):
+        """Снимки файлов, изменения которых пропущены из-за интервала"""
+        for filepath in list(self._stale.values()):
+            self.snapshot(filepath, force=True)
+
+    def _read(self, chunks: List[str]) -> bytes:
+        parts = []
+        for digest in chunks:
+            with open(self._object_path(digest), "rb") as f:
+                content = f.read()
+            try:
+                parts.append(_decode_snapshot(content))
+            except SNAPSHOT_ERRORS:
+                # Несжатый фрагмент из середины текста, случайно похожий на сигнатуру
+                parts.append(content)
+        return b"".join(parts)
+
+    def latest(self, filepath: str) -> Optional[bytes]:
+        """Содержимое последней сохранённой версии файла"""
+        versions = self._versions.get(self._rel(filepath))
+        if not versions or versions[-1][1] is None:
+            return None
+        return self._read(versions[-1][1])
+
+    def points_in_time(self) -> List[str]:
+        """Моменты всех сохранённых версий, по возрастанию"""
+        return sorted({moment for versions in self._versions.values() for moment, _ in versions})
+
+    def restore(self, moment: datetime) -> List[str]:
+        """Возврат всех отслеживаемых файлов к состоянию на указанный момент.
+
+        Перед восстановлением текущее состояние сохраняется, поэтому само
+        восстановление тоже можно отменить. Возвращает изменённые пути.
+        """
+        until = moment.strftime("%Y-%m-%d %H:%M:%S.%f")
+        for rel_path in list(self._versions):
+            path = os.path.join(self.data_dir, *rel_path.split("/"))
+            if os.path.exists(path):
+                self.snapshot(path, force=True)
+            else:
+                self.record_removal(path)
+        changed = []
+        for rel_path, versions in self._versions.items():
+            path = os.path.join(self.data_dir, *rel_path.split("/"))
+            chunks = None
+            for version_moment, version_chunks in versions:
+                if version_moment > until:
+                    break
+                chunks = version_chunks
+            if chunks == versions[-1][1]:
+                continue
+            if chunks is None:
+                os.remove(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(self._read(chunks))
+            changed.append(path)
+        return changed
+
+    def _prune(self):
+        """Удаление версий старше keep_days (последняя версия файла сохраняется)
+        и фрагментов, на которые больше никто не ссылается"""
+        cutoff = (datetime.now() - timedelta(days=self.keep_days)).strftime("%Y-%m-%d %H:%M:%S.%f")
+        before = {d for versions in self._versions.values() for _, chunks in versions for d in chunks or ()}
+        pruned = False
+        for rel_path in list(self._versions):
+            versions = self._versions[rel_path]
+            kept = [v for v in versions[:-1] if v[0] >= cutoff] + versions[-1:]
+            if kept[-1][1] is None and kept[-1][0] < cutoff:
+                kept = []
+            if len(kept) != len(versions):
+                pruned = True
+                if kept:
+                    self._versions[rel_path] = kept
+                else:
+                    del self._versions[rel_path]
+        if not pruned:
+            return
+        self._write_manifest()
+        after = {d for versions in self._versions.values() for _, chunks in versions for d in chunks or ()}
+        for digest in before - after:
+            try:
+                os.remove(self._object_path(digest))
+            except OSError:
+                pass
+        print(f"[X] Удалено старых фрагментов бэкапа: {len(before - after)}")
+
+
 class DataManager:
     """Управление данными с использованием user_data_dir для совместимости с Android"""
-    def __init__(self):
+    def __init__(self, storage_backend: str = STORAGE_BACKEND,
+                 write_behind_delay: float = WRITE_BEHIND_DELAY,
+                 snapshot_format: str = SNAPSHOT_FORMAT,
+                 data_dir: Optional[str] = None,
+                 max_resident_profiles: int = MAX_RESIDENT_PROFILES):
         self._cache: Dict[str, Any] = {}
         self._last_save = datetime.now()
-        self._profiles: Optional[Dict] = None
-        self._init_directories()
-
-    def _init_directories(self):
+        # Загруженные профили; в режимах 'sharded' и 'sqlite' профили читаются
+        # по одному, а порядок ключей — от давно не использованного к последнему
+        self._profiles: Dict[str, Dict] = {}
+        self.max_resident_profiles = max(1, max_resident_profiles)
+        self._all_loaded = False
+        # Индексы разделов загруженных профилей: профиль -> раздел -> индекс
+        self._indexes: Dict[str, Dict[str, Any]] = {}
+        # Версии данных профилей: новое значение общего счётчика при каждом
+        # изменении (и загрузке) профиля, поэтому версия никогда не повторяется
+        self._versions: Dict[str, int] = {}
+        self._version_clock = 0
+        # Результаты анализа продаж по ключу (профиль, период, товар, версия)
+        self._analysis_cache = LRUCache(ANALYSIS_CACHE_SIZE)
+        self.analytics_engine = 'numpy' if ANALYTICS_ENGINE == 'auto' and numpy else ANALYTICS_ENGINE
+        if self.analytics_engine != 'python' and numpy is None:
+            print("[!] NumPy не установлен, анализ продаж считается по своду")
+            self.analytics_engine = 'python'
+        # Записи изменений и затронутые разделы профилей с последнего сброса
+        self._pending: List[Dict] = []
+        self._dirty: Dict[str, set] = {}
+        # Защищает данные в памяти и очередь изменений от фонового потока записи
+        self._lock = threading.RLock()
+        # Упорядочивает запись в хранилище: файлы и база пишутся под ней,
+        # но без _lock. Порядок захвата — _write_lock, затем _lock
+        self._write_lock = threading.RLock()
+        # Разделы, которые сейчас записываются (уже не в _dirty, ещё не на диске)
+        self._in_flight: Dict[str, set] = {}
+        # Отложенные файловые операции сброса (собираются под _lock)
+        self._staged: Optional[List] = None
+        self.storage_backend = storage_backend
+        self.write_behind_delay = write_behind_delay
+        self.snapshot_format = snapshot_format
+        self.codec = JsonCodec()
+        self._init_directories(data_dir)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_wake = threading.Event()
+        self._writer_stop = threading.Event()
+        if write_behind_delay > 0:
+            self._writer = threading.Thread(target=self._writer_loop, name="profile-writer", daemon=True)
+            self._writer.start()
+
+    def _init_directories(self, data_dir: Optional[str] = None):
         """Создание директорий при старте с использованием user_data_dir"""
-        from kivy.app import App
-        app = App.get_running_app()
-        self.data_dir = app.user_data_dir
+        if data_dir is None:
+            from kivy.app import App
+            data_dir = App.get_running_app().user_data_dir
+        self.data_dir = data_dir
         self.profiles_file = os.path.join(self.data_dir, "profiles.json")
         self.backup_dir = os.path.join(self.data_dir, "backups")
         os.makedirs(self.data_dir, exist_ok=True)
         os.makedirs(self.backup_dir, exist_ok=True)
-        if not os.path.exists(self.profiles_file) or os.path.getsize(self.profiles_file) == 0:
-            self._save_safe({}, self.profiles_file)
-            print(f"[OK] Создан файл профилей: {self.profiles_file}")
- 
-    def _create_backup(self, filepath: str) -> str:
-        """Создание резервной копии перед записью"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"{os.path.basename(filepath)}.{timestamp}.bak"
-        backup_path = os.path.join(self.backup_dir, backup_name)
+        self.backups = BackupStore(self.backup_dir, self.data_dir, BACKUP_INTERVAL, BACKUP_KEEP_DAYS,
+                                   self.snapshot_format)
+        # Бэкапы старого формата (полные копии *.bak) доживают свой срок
+        self._cleanup_old_backups()
+        self._open_storage()
+
+    def _open_storage(self):
+        """Создание хранилища выбранного типа (с переносом старых данных)"""
+        if self.storage_backend == 'sharded':
+            self.storage = ShardedStorage(self)
+        elif self.storage_backend == 'sqlite':
+            self.storage = SqliteStorage(self)
+        else:
+            self.storage = JsonFileStorage(self, journal=self.storage_backend == 'journal')
+        self.storage.ensure_files()
+
+    def _backup_prefix(self, filepath: str) -> str:
+        """Имя файла в каталоге бэкапов (путь относительно data_dir)"""
+        return os.path.relpath(filepath, self.data_dir).replace(os.sep, "__")
+
+    def _create_backup(self, filepath: str, force: bool = False) -> bool:
+        """Снимок файла в хранилище бэкапов (не чаще BACKUP_INTERVAL, если не force)"""
         try:
-            if os.path.exists(filepath):
-                shutil.copy2(filepath, backup_path)
-            # Удаление старых бэков (>7 дней)
-            self._cleanup_old_backups()
-            return backup_path
+            return self.backups.snapshot(filepath, force)
         except Exception as e:
             print(f"[!] Предупреждение: не удалось создать бэкап: {e}")
-            return ""
+            return False
+
+    def _io(self, fn, *args):
+        """Файловая операция хранилища: при подготовке сброса откладывается
+        и выполняется после снятия _lock (см. flush), иначе — сразу"""
+        if self._staged is not None:
+            self._staged.append(lambda: fn(*args))
+        else:
+            fn(*args)
+
+    def _remove_file(self, filepath: str):
+        """Удаление файла данных с сохранением последней версии в бэкапах"""
+        self._io(self._remove_file_now, filepath)
+
+    def _remove_file_now(self, filepath: str):
+        if not os.path.exists(filepath):
+            return
+        self._create_backup(filepath, force=True)
+        os.remove(filepath)
+        try:
+            self.backups.record_removal(filepath)
+        except Exception as e:
+            print(f"[!] Предупреждение: не удалось отметить удаление в бэкапах: {e}")
 
-    def _cleanup_old_backups(self, days: int = 7):
-        """Очистка бэков старше N дней"""
+    def restore_backup(self, moment: datetime) -> int:
+        """Возврат файлов данных к состоянию на указанный момент; число изменённых файлов.
+
+        Для хранилища 'sqlite' бэкапы не ведутся — база защищена своим журналом.
+        """
+        with self._write_lock, self._lock:
+            self.flush()
+            changed = self.backups.restore(moment)
+            self._profiles = {}
+            self._indexes = {}
+            for name in list(self._versions):
+                self._bump_version(name)
+            self._all_loaded = False
+            self._open_storage()
+        print(f"[<-] Восстановлено на {moment:%Y-%m-%d %H:%M:%S}: файлов {len(changed)}")
+        return len(changed)
+
+    def _cleanup_old_backups(self, days: int = BACKUP_KEEP_DAYS):
+        """Очистка бэков старого формата (*.bak) старше N дней"""
         cutoff = datetime.now() - timedelta(days=days)
         for fname in os.listdir(self.backup_dir):
             if fname.endswith('.bak'):
@@ -156,12 +3172,32 @@ class DataManager:
                 except:
                     pass
 
-    def _save_safe(self, data: Dict, filepath: str):
-        """Безопасная запись с резервным копированием"""
+    def _save_safe(self, data: Dict, filepath: str) -> bytes:
+        """Безопасная запись с резервным копированием; возвращает записанное содержимое.
+
+        Данные кодируются сразу (пока вызывающий держит _lock), а запись при
+        сбросе откладывается через _io. Файл пишется во временный и
+        сбрасывается на диск, затем атомарно заменяет прежний: при обрыве
+        записи остаётся старая целая версия. Снимок в бэкапы — только после
+        успешной замены.
+        """
+        try:
+            payload = _encode_snapshot(data, self.snapshot_format, self.codec)
+        except Exception as e:
+            print(f"[!] Ошибка сохранения {filepath}: {e}")
+            raise
+        self._io(self._write_file, payload, filepath)
+        return payload
+
+    def _write_file(self, payload: bytes, filepath: str):
+        tmp_path = filepath + ".tmp"
         try:
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, filepath)
             self._create_backup(filepath)
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
             self._last_save = datetime.now()
         except Exception as e:
             print(f"[!] Ошибка сохранения {filepath}: {e}")
@@ -172,18 +3208,25 @@ class DataManager:
         try:
             if not os.path.exists(filepath):
                 return {}
-            if os.path.getsize(filepath) == 0:
-                return {}
-            with open(filepath, "r", encoding="utf-8") as f:
-                content = f.read().strip()
-                if not content:
-                    return {}
-                return json.loads(content)
-        except json.JSONDecodeError as e:
+            with open(filepath, "rb") as f:
+                content = _decode_snapshot(f.read()).strip()
+            if not content:
+                # Пустыми файлы данных не записываются — это оборванная запись
+                raise EOFError("пустой файл")
+            return self.codec.loads(content)
+        except SNAPSHOT_ERRORS as e:
             print(f"[!] JSON ошибка в {filepath}: {e}")
             # Попытка восстановления из последнего бэкапа
+            try:
+                content = self.backups.latest(filepath)
+                if content is not None:
+                    print(f"[<-] Восстановление из бэкапа: {self.backups._rel(filepath)}")
+                    return self.codec.loads(content)
+            except Exception:
+                pass
+            prefix = self._backup_prefix(filepath) + "."
             backups = sorted(
-                [f for f in os.listdir(self.backup_dir) if f.startswith(os.path.basename(filepath))],
+                [f for f in os.listdir(self.backup_dir) if f.startswith(prefix)],
                 reverse=True
             )
             if backups:
@@ -199,36 +3242,742 @@ class DataManager:
             print(f"[!] Ошибка загрузки {filepath}: {e}")
             return {}
 
+    @staticmethod
+    def _resolve(root: Any, path: List, create: bool = False) -> Any:
+        """Переход по пути ключей; None, если путь не существует"""
+        node = root
+        for key in path:
+            if isinstance(node, list):
+                if not isinstance(key, int) or key >= len(node):
+                    return None
+                node = node[key]
+            else:
+                if key not in node:
+                    if not create:
+                        return None
+                    node[key] = {}
+                node = node[key]
+        return node
+
+    @staticmethod
+    def _apply_record(profiles: Dict, record: Dict):
+        """Применение одной записи изменений к словарю профилей"""
+        op = record["op"]
+        name = record["p"]
+        if op == "put":
+            profiles[name] = record["v"]
+            return
+        if op == "drop":
+            profiles.pop(name, None)
+            return
+        if name not in profiles:
+            return
+        path = record["path"]
+        if op == "set":
+            parent = DataManager._resolve(profiles[name], path[:-1], create=True)
+            if parent is not None:
+                parent[path[-1]] = record["v"]
+        elif op == "append":
+            target = DataManager._resolve(profiles[name], path)
+            if target is not None and len(target) <= record["i"]:
+                target.append(record["v"])
+        elif op == "del":
+            parent = DataManager._resolve(profiles[name], path[:-1])
+            if isinstance(parent, MutableMapping):
+                parent.pop(path[-1], None)
+
+    @staticmethod
+    def _section_of(record: Dict) -> Tuple:
+        """Раздел профиля, который затрагивает запись: ("products",),
+        ("stock", товар), ("orders",)... или ("*",) для профиля целиком"""
+        if record["op"] in ("put", "drop"):
+            return ("*",)
+        path = record["path"]
+        if path[0] == "stock" and len(path) > 1:
+            return ("stock", path[1])
+        return (path[0],)
+
+    def mark_dirty(self, profile_name: str, section: Tuple):
+        """Сохранение раздела профиля, изменённого напрямую в памяти (без транзакции)"""
+        if section[0] == "*":
+            self._indexes.pop(profile_name, None)
+        else:
+            # Все индексы раздела (у заказов их несколько: номера, позиции, столбцы)
+            indexes = self._indexes.get(profile_name, {})
+            for name in [name for name in indexes if self.PROFILE_INDEXES[name][0] == section[0]]:
+                del indexes[name]
+        data = self._profiles.get(profile_name)
+        if data is None or section == ("*",):
+            record = {"op": "put", "p": profile_name, "v": data} if data is not None \
+                else {"op": "drop", "p": profile_name}
+        else:
+            path = list(section)
+            parent = self._resolve(data, path[:-1])
+            if parent is not None and path[-1] in parent:
+                record = {"op": "set", "p": profile_name, "path": path, "v": parent[path[-1]]}
+            else:
+                record = {"op": "del", "p": profile_name, "path": path}
+        self._commit([record])
+
+    def _bump_version(self, profile_name: str):
+        """Новая версия данных профиля (после любого изменения в памяти)"""
+        with self._lock:
+            self._version_clock += 1
+            self._versions[profile_name] = self._version_clock
+
+    def data_version(self, profile_name: str) -> int:
+        """Версия данных профиля: меняется при каждом изменении профиля"""
+        with self._lock:
+            if profile_name not in self._versions:
+                self._bump_version(profile_name)
+            return self._versions[profile_name]
+
+    def _commit(self, records: List[Dict]):
+        """Сохранение изменений, уже применённых к данным в памяти"""
+        with self._lock:
+            self._pending.extend(records)
+            for record in records:
+                self._bump_version(record["p"])
+                self._dirty.setdefault(record["p"], set()).add(self._section_of(record))
+        if self._writer is not None:
+            self._writer_wake.set()
+        else:
+            self.flush()
+
+    def _writer_loop(self):
+        """Фоновый поток: объединяет изменения за окно write_behind_delay"""
+        while not self._writer_stop.is_set():
+            self._writer_wake.wait()
+            self._writer_stop.wait(self.write_behind_delay)
+            self._writer_wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[!] Ошибка фоновой записи: {e}")
+
+    def flush(self):
+        """Запись в хранилище всех изменений с последнего сброса.
+
+        Под _lock только забирается очередь и кодируется то, что нужно
+        записать (файлы — в байты, строки базы — в копии); сама запись идёт
+        после снятия _lock, поэтому интерфейс не ждёт диска. _write_lock
+        держится всё время сброса и сохраняет порядок записей.
+        """
+        with self._write_lock:
+            with self._lock:
+                if not self._pending and not self._dirty:
+                    return
+                records, dirty = self._pending, self._dirty
+                self._pending, self._dirty = [], {}
+                self._in_flight = dirty
+                self._staged = []
+                try:
+                    self.storage.commit(records, dirty, self._profiles)
+                except Exception:
+                    self._requeue(records, dirty)
+                    raise
+                finally:
+                    staged, self._staged = self._staged, None
+            try:
+                for operation in staged:
+                    operation()
+            except Exception:
+                with self._lock:
+                    self._requeue(records, dirty)
+                raise
+            finally:
+                with self._lock:
+                    self._in_flight = {}
+            self._last_save = datetime.now()
+
+    def _requeue(self, records: List[Dict], dirty: Dict[str, set]):
+        """Возврат несохранённых изменений в очередь до следующего сброса"""
+        self._pending = records + self._pending
+        for name, sections in dirty.items():
+            self._dirty.setdefault(name, set()).update(sections)
+
+    def has_pending_changes(self) -> bool:
+        return bool(self._pending or self._dirty)
+
+    def close(self):
+        """Остановка фоновой записи и сохранение оставшихся изменений"""
+        if self._writer is not None:
+            self._writer_stop.set()
+            self._writer_wake.set()
+            self._writer.join(timeout=10)
+            self._writer = None
+        self.flush()
+        with self._write_lock:
+            self.backups.snapshot_stale()
+
+    def checkpoint(self):
+        """Полная запись загруженных данных (и очистка журнала)"""
+        with self._write_lock, self._lock:
+            self._pending, self._dirty = [], {}
+            self.storage.checkpoint(self._profiles)
+
+    def transaction(self, profile_name: str) -> ProfileTransaction:
+        """Транзакция изменений профиля (используется в блоке with)"""
+        return ProfileTransaction(self, profile_name)
+
+    # --- Публичный API ----------------------------------------------------
+
+    def list_profiles(self) -> List[str]:
+        """Имена профилей без загрузки их данных (если хранилище это позволяет)"""
+        if self.storage.lazy:
+            with self._lock:
+                names = set(self.storage.list_profiles())
+                # Ещё не записанные создания и удаления профилей
+                for name, sections in list(self._in_flight.items()) + list(self._dirty.items()):
+                    if name in self._profiles:
+                        names.add(name)
+                    elif ("*",) in sections:
+                        names.discard(name)
+            return sorted(names)
+        return sorted(self.get_profiles().keys())
+
+    def profile_summaries(self) -> Dict[str, Dict]:
+        """Товары, заказы и последняя активность каждого профиля без загрузки их данных"""
+        with self._lock:
+            names = self.list_profiles()
+            summaries = self.storage.profile_summaries() if self.storage.lazy else {}
+            for name in names:
+                # Загруженные профили могут быть новее индекса (отложенная запись)
+                if name in self._profiles:
+                    summaries[name] = _profile_meta(self._profiles[name])
+            return {
+                name: summaries.get(name, {"products": 0, "orders": 0, "last_activity": ""})
+                for name in names
+            }
+
+    def has_profile(self, profile_name: str) -> bool:
+        if profile_name in self._profiles:
+            return True
+        return profile_name in self.list_profiles()
+
     def get_profiles(self) -> Dict:
-        """Получение профилей с кэшированием"""
-        if self._profiles is None:
-            self._profiles = self._load_safe(self.profiles_file)
+        """Получение всех профилей с кэшированием"""
+        with self._lock:
+            if not self._all_loaded:
+                loaded = self.storage.load_all(exclude=self._profiles)
+                migrated = [
+                    name for name, data in loaded.items()
+                    if name not in self._profiles and self._adopt_loaded(name, data)
+                ]
+                self._all_loaded = True
+                for name in migrated:
+                    self.mark_dirty(name, ("*",))
         return self._profiles
 
     def save_profiles(self, profiles: Dict):
         """Сохранение профилей с обновлением кэша"""
-        self._save_safe(profiles, self.profiles_file)
-        self._profiles = profiles.copy()
+        with self._lock:
+            self._profiles = {name: _profile_to_records(data) for name, data in profiles.items()}
+            self._indexes.clear()
+            for name, data in self._profiles.items():
+                _upgrade_profile(data)
+                self._bump_version(name)
+            self._all_loaded = True
+            self.checkpoint()
+
+    def create_profile(self, profile_name: str) -> Dict:
+        """Создание пустого профиля"""
+        data = _new_profile_data()
+        data["next_product_id"] = 1
+        data["format_version"] = PROFILE_FORMAT
+        data["sales_rollup"] = {}
+        data["stock_totals"] = _build_stock_totals({})
+        with self._lock:
+            self._profiles[profile_name] = data
+            self._commit([{"op": "put", "p": profile_name, "v": data}])
+        return data
+
+    def delete_profile(self, profile_name: str):
+        """Удаление профиля со всеми данными"""
+        with self._lock:
+            self._profiles.pop(profile_name, None)
+            self._indexes.pop(profile_name, None)
+            self._commit([{"op": "drop", "p": profile_name}])
 
     def get_profile_data(self, profile_name: str) -> Dict:
         """Получение данных профиля с инициализацией структуры по умолчанию"""
-        profiles = self.get_profiles()
-        if profile_name not in profiles:
-            profiles[profile_name] = {
-                "products": [],
-                "stock": {},
-                "orders": [],
-                "daily_stats": {},
-                "next_order_number": 1
-            }
-            self.save_profiles(profiles)
-        return profiles[profile_name]
+        with self._lock:
+            pending = profile_name in self._dirty or profile_name in self._in_flight
+            if profile_name not in self._profiles and not self._all_loaded and not pending:
+                # Профиль с незаписанными изменениями не в памяти — он удалён
+                if self.storage.lazy:
+                    data = self.storage.load_profile(profile_name)
+                    if data is not None and self._adopt_loaded(profile_name, data):
+                        self.mark_dirty(profile_name, ("*",))
+                else:
+                    self.get_profiles()
+            if profile_name not in self._profiles:
+                return self.create_profile(profile_name)
+            if self.storage.lazy:
+                # Последний использованный профиль переносится в конец очереди
+                self._profiles[profile_name] = self._profiles.pop(profile_name)
+                self._evict_profiles()
+            return self._profiles[profile_name]
+
+    def _adopt_loaded(self, profile_name: str, data: Dict) -> bool:
+        """Загруженный из хранилища профиль: записи модели вместо словарей и
+        однократные переходы формата; True, если профиль нужно записать"""
+        self._profiles[profile_name] = _profile_to_records(data)
+        self._bump_version(profile_name)
+        if not _upgrade_profile(data):
+            return False
+        print(f"[OK] Профиль «{profile_name}» переведён на текущий формат данных")
+        return True
+
+    # Индексы профиля: имя -> (индексируемый раздел, класс индекса)
+    PROFILE_INDEXES = {
+        "products": ("products", ProductCatalog),
+        "orders": ("orders", OrderIndex),
+        "postings": ("orders", ProductPostings),
+        "sales_columns": ("orders", SalesColumns),
+        "daily_stats": ("daily_stats", DailyStatsTotals),
+        "sales_rollup": ("sales_rollup", SalesRollupTotals),
+        "sales_tiers": ("sales_rollup", SalesRollupTiers),
+    }
+
+    def _profile_index(self, profile_name: str, name: str) -> Any:
+        """Индекс профиля (строится при первом обращении)"""
+        with self._lock:
+            section, index_class = self.PROFILE_INDEXES[name]
+            source = self.get_profile_data(profile_name).setdefault(section, index_class.SOURCE_TYPE())
+            indexes = self._indexes.setdefault(profile_name, {})
+            index = indexes.get(name)
+            # Раздел мог быть заменён целиком (put, перезагрузка профиля)
+            if index is None or index.source is not source:
+                index = indexes[name] = index_class(source)
+            return index
+
+    def catalog(self, profile_name: str) -> ProductCatalog:
+        """Индекс каталога товаров профиля"""
+        return self._profile_index(profile_name, "products")
+
+    def order_index(self, profile_name: str) -> OrderIndex:
+        """Индекс заказов профиля по датам и номерам"""
+        return self._profile_index(profile_name, "orders")
+
+    def postings(self, profile_name: str) -> ProductPostings:
+        """Обратный индекс товар -> позиции заказов профиля"""
+        return self._profile_index(profile_name, "postings")
+
+    def orders_page(self, profile_name: str, limit: int, cursor: Optional[Tuple[int, int]] = None
+                    ) -> Tuple[List[Order], Optional[Tuple[int, int]]]:
+        """Страница заказов профиля, новые сверху (см. OrderIndex.latest)"""
+        with self._lock:
+            return self.order_index(profile_name).latest(limit, cursor)
+
+    def daily_totals(self, profile_name: str, date_from: date, date_to: date) -> Dict[str, float]:
+        """Итоги дневной статистики за период (заказы, доставки, суммы)"""
+        return self._profile_index(profile_name, "daily_stats").totals(date_from, date_to)
+
+    def _sales_key(self, profile_name: str, product: str) -> str:
+        """Ключ товара в своде продаж и индексе позиций по названию: str(id)
+        товара каталога или NAME_KEY + название (удалённые товары)"""
+        found = self.catalog(profile_name).find(product)
+        return found.stock_key if found is not None else _name_key(product)
+
+    def sales_totals(self, profile_name: str, date_from: date, date_to: date,
+                     product: Optional[str] = None) -> Dict[str, Tuple[float, float]]:
+        """Итоги продаж за период: ключ товара свода -> (количество, сумма).
+
+        Отвечает по суммам свода продаж за O(log n) на товар, не перебирая
+        дни периода; с фильтром по названию — только этот товар.
+        """
+        totals = self._profile_index(profile_name, "sales_rollup")
+        if product is None:
+            return totals.totals(date_from, date_to)
+        key = self._sales_key(profile_name, product)
+        row = totals.key_totals(key, date_from, date_to)
+        return {key: row} if row[0] or row[1] else {}
+
+    def product_sold(self, profile_name: str, product: str) -> Tuple[float, float, int]:
+        """Продажи товара за всё время по индексу позиций: (количество, сумма, число заказов)"""
+        with self._lock:
+            return self.postings(profile_name).sold(self._sales_key(profile_name, product))
+
+    def _indexes_changed(self, profile_name: str, record: Dict):
+        """Обновление индексов раздела, изменённого записью транзакции"""
+        indexes = self._indexes.get(profile_name)
+        if not indexes:
+            return
+        for name, index in indexes.items():
+            if self.PROFILE_INDEXES[name][0] == record["path"][0]:
+                index.apply(record)
+
+    def _evict_profiles(self):
+        """Выгрузка давно не использованных профилей сверх max_resident_profiles.
+
+        Профили с ещё не записанными изменениями остаются в памяти до сброса.
+        """
+        excess = len(self._profiles) - self.max_resident_profiles
+        for name in list(self._profiles)[:-1]:
+            if excess <= 0:
+                break
+            if name in self._dirty or name in self._in_flight:
+                continue
+            del self._profiles[name]
+            self._indexes.pop(name, None)
+            self._all_loaded = False
+            excess -= 1
 
     def update_profile_data(self, profile_name: str, data: Dict):
-        """Обновление данных профиля"""
-        profiles = self.get_profiles()
-        profiles[profile_name] = data
-        self.save_profiles(profiles)
+        """Обновление данных профиля (полная замена)"""
+        with self._lock:
+            self._profiles[profile_name] = _profile_to_records(data)
+            # Разделы могли измениться на месте (те же объекты) — индексы строятся заново
+            self._indexes.pop(profile_name, None)
+            _upgrade_profile(data)
+            self._commit([{"op": "put", "p": profile_name, "v": data}])
+
+    def query_sales(self, profile_name: str, date_from: date, date_to: date,
+                    product: Optional[str] = None) -> List[Tuple[str, str, float, float]]:
+        """Продажи за период: строки (дата, товар, количество, сумма) по возрастанию даты.
+
+        Читается только свод продаж sales_rollup, поэтому время запроса зависит
+        от числа дней и товаров в периоде, а не от числа позиций заказов.
+        Товар в строках — название из каталога; позиции с одинаковым
+        названием (например, удалённых товаров) за день объединяются.
+        """
+        if product is not None:
+            return self._product_sales(profile_name, self._sales_key(profile_name, product),
+                                       date_from, date_to)
+        rollup = self.get_profile_data(profile_name).get("sales_rollup", {})
+        catalog = self.catalog(profile_name)
+        day_from, day_to = date_from.isoformat(), date_to.isoformat()
+        rows = []
+        for day in sorted(d for d in rollup if day_from <= d <= day_to):
+            merged = {}
+            for key, entry in rollup[day].items():
+                name = catalog.key_name(key)
+                if name in merged:
+                    qty, total = merged[name]
+                    merged[name] = (qty + entry["quantity"], total + entry["total"])
+                else:
+                    merged[name] = (entry["quantity"], entry["total"])
+            rows.extend((day, name, qty, total) for name, (qty, total) in merged.items())
+        return rows
+
+    def stock_totals(self, profile_name: str) -> Dict:
+        """Сводка склада профиля (см. _build_stock_totals), без перебора позиций"""
+        data = self.get_profile_data(profile_name)
+        if "stock_totals" not in data:
+            self.check_stock_totals(profile_name)
+        return data["stock_totals"]
+
+    def check_stock_totals(self, profile_name: str) -> bool:
+        """Сверка сводки склада с пересчётом по всем позициям; расхождение
+        исправляется и записывается. True, если сводка была верна"""
+        with self.transaction(profile_name) as tx:
+            stock_totals = _verified_stock_totals(tx.profile_data)
+            if stock_totals is None:
+                return True
+            tx.set(["stock_totals"], stock_totals)
+        return False
+
+    def _product_sales(self, profile_name: str, key: str, date_from: date,
+                       date_to: date) -> List[Tuple[str, str, float, float]]:
+        """Строки query_sales одного товара: только его позиции заказов
+        из обратного индекса, без перебора остальных товаров и заказов"""
+        with self._lock:
+            postings = self.postings(profile_name)
+            orders = self.order_index(profile_name)
+            first, last = date_from.toordinal(), date_to.toordinal()
+            days: Dict[int, Tuple[float, float]] = {}
+            for position, item in postings.items(key):
+                ordinal = orders.ordinal(position)
+                if ordinal is None or not first <= ordinal <= last:
+                    continue
+                qty, total = days.get(ordinal, (0.0, 0.0))
+                days[ordinal] = (qty + item["quantity"], total + item["total"])
+            name = self.catalog(profile_name).key_name(key)
+        return [(date.fromordinal(ordinal).isoformat(), name, qty, total)
+                for ordinal, (qty, total) in sorted(days.items())]
+
+    def sales_analysis(self, profile_name: str, date_from: date, date_to: date,
+                       product: Optional[str] = None, granularity: str = 'day',
+                       cancelled: Optional[Callable[[], bool]] = None
+                       ) -> Optional[Tuple[List[Tuple], Tuple[float, float, float, float]]]:
+        """Анализ продаж за период: строки (дата, товар, количество, сумма,
+        прибыль, затраты) и итог (количество, сумма, прибыль, затраты).
+
+        granularity — шаг строк (SALES_GRANULARITIES): по дням или по
+        неделям, месяцам, кварталам из уровней свода (SalesRollupTiers);
+        тогда вместо даты в строке подпись периода (2024-W11, 2024-03, 2024-Q1).
+
+        Под _lock только проверяется кэш и берутся входные данные: дни или
+        периоды свода (они заменяются целиком, а не меняются на месте), копия
+        столбцов позиций, итоги и доли каталога (CatalogShares). Строки
+        считаются уже без блокировки; cancelled() проверяется по ходу
+        расчёта, и если он вернул True, возвращается None.
+
+        Результат кэшируется по (профиль, период, товар, шаг, версия данных):
+        повторный запрос с теми же параметрами возвращается из кэша, а любое
+        изменение профиля меняет версию, поэтому устаревший результат не
+        будет возвращён. Результат общий для всех вызовов — не изменять.
+        """
+        with self._lock:
+            key = (profile_name, date_from, date_to, product, granularity, self.data_version(profile_name))
+            result = self._analysis_cache.get(key)
+            if result is not None:
+                return result
+            shares = CatalogShares(self.catalog(profile_name))
+            only = self._sales_key(profile_name, product) if product is not None else None
+            columns = groups = None
+            if granularity == 'day' and self.analytics_engine == 'numpy':
+                columns = self._profile_index(profile_name, "sales_columns").copy()
+            elif granularity == 'day' and only is not None:
+                groups = [(day, [(only, qty, total)]) for day, _, qty, total
+                          in self._product_sales(profile_name, only, date_from, date_to)]
+            elif granularity == 'day':
+                rollup = self.get_profile_data(profile_name).get("sales_rollup", {})
+                day_from, day_to = date_from.isoformat(), date_to.isoformat()
+                groups = [(day, rollup[day]) for day in sorted(d for d in rollup if day_from <= d <= day_to)]
+            else:
+                tiers = self._profile_index(profile_name, "sales_tiers")
+                groups = [(_period_label(start, granularity), sums)
+                          for start, sums in tiers.periods(granularity, date_from, date_to)]
+            totals = self.sales_totals(profile_name, date_from, date_to, product)
+        if columns is not None:
+            rows = self._vector_analysis_rows(columns, shares, date_from, date_to, only, cancelled)
+        else:
+            rows = self._analysis_rows(groups, shares, only, cancelled)
+        if rows is None:
+            return None
+        # Итог — по суммам свода за период, без перебора строк
+        total_qty = total_sum = total_profit = total_expense = 0.0
+        for product_key, (qty, key_sum) in totals.items():
+            percent_profit, percent_expenses = shares.key_percents(product_key)
+            total_qty += qty
+            total_sum += key_sum
+            total_profit += (key_sum * percent_profit) / 100.0
+            total_expense += (key_sum * percent_expenses) / 100.0
+        result = (rows, (total_qty, total_sum, total_profit, total_expense))
+        with self._lock:
+            self._analysis_cache.put(key, result)
+        return result
+
+    @staticmethod
+    def _analysis_rows(groups: List[Tuple[str, Any]], shares: CatalogShares, only: Optional[str],
+                       cancelled: Optional[Callable[[], bool]]) -> Optional[List[Tuple]]:
+        """Строки sales_analysis по дням или периодам свода: groups — (дата или
+        подпись, {ключ товара: {"quantity", "total"} или (количество, сумма)},
+        либо список (ключ, количество, сумма)); None, если расчёт отменён"""
+        rows = []
+        for label, sums in groups:
+            if cancelled is not None and cancelled():
+                return None
+            entries = sums.items() if isinstance(sums, dict) else ((k, (q, t)) for k, q, t in sums)
+            # Товары с одинаковым названием (удалённые товары) объединяются;
+            # доли прибыли и затрат — по ключу товара, как в итоге
+            merged = {}
+            for key, entry in entries:
+                if only is not None and key != only:
+                    continue
+                qty, total = (entry["quantity"], entry["total"]) if isinstance(entry, Mapping) else entry
+                percent_profit, percent_expenses = shares.key_percents(key)
+                sums = (qty, total, (total * percent_profit) / 100.0, (total * percent_expenses) / 100.0)
+                name = shares.key_name(key)
+                if name in merged:
+                    merged[name] = tuple(a + b for a, b in zip(merged[name], sums))
+                else:
+                    merged[name] = sums
+            rows.extend((label, name) + sums for name, sums in merged.items())
+        return rows
+
+    def sales_comparison(self, profile_name: str, date_from: date, date_to: date, mode: str,
+                         product: Optional[str] = None
+                         ) -> Tuple[Tuple[date, date], List[Tuple], Tuple[float, float, float, float]]:
+        """Сравнение продаж за период с прошлым периодом ('previous') или с
+        теми же датами год назад ('year'), см. _comparison_period.
+
+        Возвращает (период сравнения, строки (товар, количество, сумма,
+        количество и сумма в периоде сравнения) по убыванию суммы, итог
+        (количество, сумма, прошлые количество и сумма)). Оба периода
+        считаются за один проход по суммам свода продаж (SalesRollupTotals),
+        без перебора заказов; результат кэшируется как у sales_analysis.
+        """
+        with self._lock:
+            cache_key = (profile_name, date_from, date_to, product, ('compare', mode),
+                         self.data_version(profile_name))
+            result = self._analysis_cache.get(cache_key)
+            if result is not None:
+                return result
+            prev_from, prev_to = _comparison_period(date_from, date_to, mode)
+            catalog = self.catalog(profile_name)
+            key = self._sales_key(profile_name, product) if product is not None else None
+            merged: Dict[str, Tuple[float, float, float, float]] = {}
+            totals = (0.0, 0.0, 0.0, 0.0)
+            for sums_key, row in self._profile_index(profile_name, "sales_rollup").compare(
+                    date_from, date_to, prev_from, prev_to, key).items():
+                # Товары с одинаковым названием (удалённые товары) объединяются
+                name = catalog.key_name(sums_key)
+                if name in merged:
+                    merged[name] = tuple(a + b for a, b in zip(merged[name], row))
+                else:
+                    merged[name] = row
+                totals = tuple(a + b for a, b in zip(totals, row))
+            rows = sorted(((name,) + row for name, row in merged.items()), key=lambda r: (-r[2], -r[4], r[0]))
+            result = ((prev_from, prev_to), rows, totals)
+            self._analysis_cache.put(cache_key, result)
+            return result
+
+    @staticmethod
+    def _vector_analysis_rows(columns: SalesColumns, shares: CatalogShares, date_from: date, date_to: date,
+                              key: Optional[str], cancelled: Optional[Callable[[], bool]]
+                              ) -> Optional[List[Tuple]]:
+        """Строки sales_analysis по копии столбцов позиций заказов (SalesColumns):
+        те же числа, что и расчёт по своду продаж, но группировка и доли
+        прибыли и затрат считаются векторно; None, если расчёт отменён"""
+        groups = columns.group(date_from, date_to, key)
+        if not groups:
+            return []
+        names = [shares.key_name(k) for k in columns.keys]
+        # Доли прибыли и затрат — по ключу товара (коду), как в итоге
+        percents = numpy.array([shares.key_percents(k) for k in columns.keys]).reshape(-1, 2)
+        codes = numpy.array([code for _, code, _, _ in groups], dtype=numpy.int64)
+        group_sums = numpy.array([total for _, _, _, total in groups])
+        profit = ((group_sums * percents[codes, 0]) / 100.0).tolist()
+        expense = ((group_sums * percents[codes, 1]) / 100.0).tolist()
+        rows = []
+        for ordinal, day_groups in groupby(zip(groups, profit, expense), key=lambda g: g[0][0]):
+            if cancelled is not None and cancelled():
+                return None
+            # Строки товаров с одинаковым названием (удалённые товары) за день объединяются
+            merged = {}
+            for (_, code, qty, total), group_profit, group_expense in day_groups:
+                sums = (qty, total, group_profit, group_expense)
+                name = names[code]
+                if name in merged:
+                    merged[name] = tuple(a + b for a, b in zip(merged[name], sums))
+                else:
+                    merged[name] = sums
+            day = date.fromordinal(ordinal).isoformat()
+            rows.extend((day, name) + sums for name, sums in merged.items())
+        return rows
+
+    def consolidated_report(self, date_from: date, date_to: date, profiles: Optional[List[str]] = None,
+                            workers: int = REPORT_WORKERS) -> Dict:
+        """Сводный отчёт по нескольким профилям (по умолчанию — всем) за период.
+
+        Возвращает {"profiles": {профиль: часть}, "total": сумма частей,
+        "failed": {профиль: ошибка}}; часть — заказы и выручка, продажи по
+        названиям товаров, суммы дневной статистики и сводка склада (см.
+        _profile_report). Загруженные профили считаются по данным в памяти
+        (они могут быть новее файлов) под _lock, остальные читаются и
+        считаются без блокировки: в отдельных процессах, по профилю на задачу,
+        — параллельно, по числу ядер, а если процессы недоступны (Android,
+        iOS, workers=1 или ошибка пула) — по одному здесь же, через хранилище
+        только для чтения (StorageReader). Профиль, который не удалось
+        посчитать (например, с повреждёнными данными), в отчёт не входит и
+        попадает в "failed".
+        """
+        with self._lock:
+            names = [name for name in (self.list_profiles() if profiles is None else profiles)
+                     if self.has_profile(name)]
+            stored = [name for name in names if self.storage.lazy and name not in self._profiles]
+        parts: Dict[str, Dict] = {}
+        failed: Dict[str, str] = {}
+
+        def report_failed(name: str, error: Exception):
+            failed[name] = str(error) or type(error).__name__
+            print(f"[!] Профиль «{name}» не вошёл в сводный отчёт: {failed[name]}")
+
+        workers = min(workers or os.cpu_count() or 1, len(stored))
+        if workers > 1 and platform not in ('android', 'ios'):
+            # spawn, а не fork: копия процесса с окном, GL и фоновыми потоками
+            # (и их захваченными блокировками) небезопасна. Новый процесс
+            # импортирует модуль без окна — см. REPORT_WORKER_ENV
+            try:
+                with _report_worker_env(), ProcessPoolExecutor(
+                        max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_report_worker_init,
+                        initargs=(self.storage_backend, self.data_dir)) as pool:
+                    futures = {name: pool.submit(_report_worker, name, date_from, date_to) for name in stored}
+                    for name, future in futures.items():
+                        try:
+                            part = future.result()
+                        except BrokenProcessPool:
+                            raise
+                        except Exception as e:
+                            report_failed(name, e)
+                            continue
+                        if part is not None:
+                            parts[name] = part
+                print(f"[OK] Сводный отчёт: профилей прочитано в {workers} процессах: {len(parts)}")
+            except (OSError, BrokenProcessPool) as e:
+                print(f"[!] Процессы сводного отчёта недоступны, расчёт в приложении: {e}")
+
+        with self._lock:
+            resident = [name for name in names if name not in parts and name not in failed
+                        and (name in self._profiles or not self.storage.lazy)]
+            for name in resident:
+                try:
+                    parts[name] = _profile_report(self.get_profile_data(name), self.catalog(name),
+                                                  date_from, date_to)
+                except Exception as e:
+                    report_failed(name, e)
+        reader = None
+        try:
+            for name in names:
+                if name in parts or name in failed or name in resident:
+                    continue
+                try:
+                    try:
+                        if reader is None:
+                            reader = StorageReader(self.storage_backend, self.data_dir)
+                        part = _stored_profile_report(reader.storage, name, date_from, date_to)
+                    except SNAPSHOT_ERRORS + (OSError, sqlite3.Error):
+                        # Повреждённый файл — чтение с восстановлением из бэкапа
+                        with self._write_lock, self._lock:
+                            part = _stored_profile_report(self.storage, name, date_from, date_to)
+                except Exception as e:
+                    report_failed(name, e)
+                    continue
+                if part is not None:
+                    parts[name] = part
+        finally:
+            if reader is not None:
+                reader.close()
+        ordered = {name: parts[name] for name in names if name in parts}
+        return {"profiles": ordered, "total": _merge_reports(list(ordered.values())), "failed": failed}
+
+    def rebuild_sales_rollup(self, profile_name: str) -> int:
+        """Пересчёт свода продаж профиля по заказам; число дней в своде"""
+        with self.transaction(profile_name) as tx:
+            rollup = _build_sales_rollup(tx.profile_data.get("orders", []))
+            tx.set(["sales_rollup"], rollup)
+        print(f"[OK] Свод продаж профиля «{profile_name}» пересчитан: дней {len(rollup)}")
+        return len(rollup)
+
+    def stock_operations_page(self, profile_name: str, limit: int,
+                              cursor: Optional[Tuple[str, int, int]] = None
+                              ) -> Tuple[List[Dict], Optional[Tuple[str, int, int]]]:
+        """Страница операций склада по всем товарам (новые сверху).
+
+        Возвращает операции (копии с названием товара в "product") и курсор
+        для следующей, более старой страницы; None, если операций больше нет.
+        """
+        # Профиль уже в памяти при любом хранилище, и в ней же изменения,
+        # ещё не записанные фоновым потоком, — хранилище не читается
+        with self._lock:
+            data = self.get_profile_data(profile_name)
+            catalog = self.catalog(profile_name)
+            page = _stock_history_page(data.get("stock", {}), limit, cursor)
+        operations = []
+        for _, stock_key, op in page:
+            op_dict = dict(op)
+            op_dict["product"] = catalog.stock_name(stock_key)
+            operations.append(op_dict)
+        next_cursor = page[-1][0] if len(page) == limit else None
+        return operations, next_cursor
+
+    def query_stock_operations(self, profile_name: str, limit: int) -> List[Dict]:
+        """Последние операции склада по всем товарам (новые сверху)"""
+        return self.stock_operations_page(profile_name, limit)[0]
 
 # ============================================================================
 # МОДУЛЬ: ВАЛИДАЦИЯ И УТИЛИТЫ
@@ -537,6 +4286,12 @@ class BaseScreen(Screen):
         if profile_name:
             self.data_manager.update_profile_data(profile_name, data)
 
+    def profile_transaction(self) -> ProfileTransaction:
+        return self.data_manager.transaction(self.get_current_profile())
+
+    def get_catalog(self) -> ProductCatalog:
+        return self.data_manager.catalog(self.get_current_profile())
+
 # ============================================================================
 # ЭКРАН: ВЫБОР ПРОФИЛЯ
 # ============================================================================
@@ -579,6 +4334,10 @@ class HomeScreen(BaseScreen):
         btn_create.bind(on_press=self.show_create_profile)
         layout.add_widget(btn_create)
 
+        btn_report = UIComponents.create_secondary_button('Сводный отчёт по профилям')
+        btn_report.bind(on_press=lambda x: setattr(self.manager, 'current', 'consolidated_report'))
+        layout.add_widget(btn_report)
+
         btn_exit = Button(
             text='Выйти из приложения',
             size_hint_y=None,
@@ -596,9 +4355,9 @@ class HomeScreen(BaseScreen):
 
     def load_profiles(self):
         self.profiles_list.clear_widgets()
-        profiles = self.data_manager.get_profiles()
+        profile_names = self.data_manager.list_profiles()
         
-        if not profiles:
+        if not profile_names:
             empty_label = Label(
                 text='Нет профилей',
                 size_hint_y=None,
@@ -624,7 +4383,12 @@ class HomeScreen(BaseScreen):
             self.profiles_list.add_widget(hint_label)
             return
 
-        for profile_name in sorted(profiles.keys()):
+        summaries = self.data_manager.profile_summaries()
+        for profile_name in profile_names:
+            summary = summaries.get(profile_name, {})
+            details = f"Товаров: {summary.get('products', 0)} | Заказов: {summary.get('orders', 0)}"
+            if summary.get('last_activity'):
+                details += f" | {summary['last_activity']}"
             profile_container = BoxLayout(
                 orientation='horizontal',
                 size_hint_y=None,
@@ -632,12 +4396,13 @@ class HomeScreen(BaseScreen):
                 spacing=10
             )
             btn = Button(
-                text=profile_name,
+                text=f"[b]{escape_markup(profile_name)}[/b]\n[size=13sp]{details}[/size]",
+                markup=True,
+                halign='center',
                 size_hint_x=0.82,
                 background_color=COLORS['WHITE'],
                 color=COLORS['DARK_BLUE'],
                 font_size='18sp',
-                bold=True,
             )
             btn.bind(on_press=lambda instance, name=profile_name: self.select_profile(name))
             del_btn = Button(
@@ -670,13 +4435,11 @@ class HomeScreen(BaseScreen):
         )
 
     def delete_profile(self, profile_name):
-        profiles = self.data_manager.get_profiles()
-        if profile_name not in profiles:
+        if not self.data_manager.has_profile(profile_name):
             self.show_popup('Ошибка', 'Профиль не найден')
             return
         
-        del profiles[profile_name]
-        self.data_manager.save_profiles(profiles)
+        self.data_manager.delete_profile(profile_name)
         
         app = App.get_running_app()
         if app.current_profile == profile_name:
@@ -766,20 +4529,12 @@ class HomeScreen(BaseScreen):
                 self.show_popup('Ошибка', 'Имя профиля не может быть пустым')
                 return
             
-            profiles = self.data_manager.get_profiles()
-            if name in profiles:
+            if self.data_manager.has_profile(name):
                 popup.dismiss()
                 self.show_popup('Ошибка', f'Профиль «{name}» уже существует')
                 return
             
-            profiles[name] = {
-                "products": [],
-                "stock": {},
-                "orders": [],
-                "daily_stats": {},
-                "next_order_number": 1
-            }
-            self.data_manager.save_profiles(profiles)
+            self.data_manager.create_profile(name)
             popup.dismiss()
             self.load_profiles()
             self.show_popup('Успех', f'Профиль «{name}» успешно создан!')
@@ -918,7 +4673,7 @@ class ProductsScreen(BaseScreen):
             self.products_list.add_widget(hint_label)
             return
 
-        for product in sorted(products, key=lambda x: x["name"]):
+        for product in self.get_catalog().by_name():
             card = BoxLayout(
                 orientation='horizontal',
                 size_hint_y=None,
@@ -1158,8 +4913,7 @@ class AddProductScreen(BaseScreen):
             self.show_popup('Ошибка', 'Прибыль не может превышать стоимость')
             return
         
-        existing = [p["name"].lower() for p in profile_data.get("products", [])]
-        if name.lower() in existing:
+        if self.get_catalog().find(name) is not None:
             self.show_popup('Ошибка', f'Товар «{name}» уже существует')
             return
         
@@ -1167,25 +4921,26 @@ class AddProductScreen(BaseScreen):
         percent_exp = self.business_logic.calculate_percent_expenses(cost, profit)
         percent_profit = self.business_logic.calculate_percent_profit(cost, profit)
         
-        product = {
-            "name": name,
-            "cost_price": cost,
-            "profit": profit,
-            "expenses": expenses,
-            "percent_expenses": percent_exp,
-            "percent_profit": percent_profit
-        }
-        
-        profile_data["products"].append(product)
+        product_id = profile_data.get("next_product_id", 1)
+        product = Product(
+            id=product_id,
+            name=name,
+            cost_price=cost,
+            profit=profit,
+            expenses=expenses,
+            percent_expenses=percent_exp,
+            percent_profit=percent_profit
+        )
         
-        if name not in profile_data["stock"]:
-            profile_data["stock"][name] = {
+        with self.profile_transaction() as tx:
+            tx.set(["next_product_id"], product_id + 1)
+            tx.append(["products"], product)
+            tx.set(["stock", product.stock_key], {
                 "current_quantity": 0.0,
                 "total_value": 0.0,
                 "history": []
-            }
-        
-        self.save_profile_data(profile_data)
+            })
+            _update_stock_totals(tx, None, (0.0, 0.0))
         
         # Сброс формы
         self.name_input.text = ''
@@ -1289,7 +5044,7 @@ class EditProductScreen(BaseScreen):
         self.profit_input.bind(text=self.update_calculations)
         form_layout.add_widget(self.profit_input)
 
-        calc_layout = BoxLayout(orientation='vertical', size_hint_y=None, height=125, padding=[14, 12])
+        calc_layout = BoxLayout(orientation='vertical', size_hint_y=None, height=161, padding=[14, 12])
         
         self.expenses_label = Label(
             text='Затраты: 0.00 ₽',
@@ -1318,9 +5073,18 @@ class EditProductScreen(BaseScreen):
             height=36
         )
         
-        calc_layout.add_widget(self.expenses_label)
-        calc_layout.add_widget(self.percent_label)
-        calc_layout.add_widget(formula_label)
+        self.sales_label = Label(
+            text='',
+            color=COLORS['GREEN'],
+            font_size='15sp',
+            size_hint_y=None,
+            height=36
+        )
+        
+        calc_layout.add_widget(self.expenses_label)
+        calc_layout.add_widget(self.percent_label)
+        calc_layout.add_widget(formula_label)
+        calc_layout.add_widget(self.sales_label)
         
         form_layout.add_widget(calc_layout)
         layout.add_widget(form_layout)
@@ -1362,6 +5126,8 @@ class EditProductScreen(BaseScreen):
         self.cost_input.text = f'{product["cost_price"]:.2f}'
         self.profit_input.text = f'{product["profit"]:.2f}'
         self.update_calculations(None, self.cost_input.text)
+        qty, total, orders = self.data_manager.product_sold(self.get_current_profile(), product["name"])
+        self.sales_label.text = f'Продано: {qty:.1f} кг на {total:.2f} ₽, заказов: {orders}'
 
     def update_calculations(self, instance, value):
         try:
@@ -1378,10 +5144,13 @@ class EditProductScreen(BaseScreen):
 
     def confirm_delete(self, instance):
         product_name = self.name_input.text.strip()
+        _, _, orders = self.data_manager.product_sold(self.get_current_profile(), product_name)
+        in_orders = (f'\nВ заказах ({orders}) товар останется как «{DELETED_PRODUCT}».'
+                     if orders else '')
         self.show_confirmation(
             title='Удаление товара',
             message=f'Вы уверены, что хотите удалить товар «{product_name}»?\n'
-                    f'Все данные о товаре (включая остатки на складе) будут удалены!',
+                    f'Все данные о товаре (включая остатки на складе) будут удалены!{in_orders}',
             yes_callback=self.delete_product
         )
 
@@ -1390,19 +5159,19 @@ class EditProductScreen(BaseScreen):
         profile_data = self.get_profile_data()
         product_name = self.name_input.text.strip()
         
-        profile_data["products"] = [
-            p for p in profile_data["products"] if p["name"] != product_name
-        ]
-        
-        if product_name in profile_data["stock"]:
-            del profile_data["stock"][product_name]
-        
-        for order in profile_data.get("orders", []):
-            for item in order["items"]:
-                if item["product"] == product_name:
-                    item["product"] = "УДАЛЕННЫЙ ТОВАР"
+        product = self.get_catalog().find(product_name)
+        if product is None:
+            self.show_popup('Ошибка', 'Товар не найден')
+            return
         
-        self.save_profile_data(profile_data)
+        # Позиции заказов ссылаются на id и после удаления показываются
+        # как «УДАЛЕННЫЙ ТОВАР» — историю заказов переписывать не нужно
+        with self.profile_transaction() as tx:
+            tx.set(["products"], [p for p in profile_data["products"] if p is not product])
+            stock_data = profile_data["stock"].get(product.stock_key)
+            if stock_data is not None:
+                tx.delete(["stock", product.stock_key])
+                _update_stock_totals(tx, (stock_data["current_quantity"], stock_data["total_value"]), None)
         
         self.show_popup(
             'Успех',
@@ -1412,7 +5181,6 @@ class EditProductScreen(BaseScreen):
 
     def save_product(self, instance):
         app = App.get_running_app()
-        profile_data = self.get_profile_data()
         old_name = app.product_to_edit["name"]
         
         new_name, error = Validators.validate_non_empty(self.name_input.text, "Название товара")
@@ -1434,9 +5202,14 @@ class EditProductScreen(BaseScreen):
             self.show_popup('Ошибка', 'Прибыль не может превышать стоимость')
             return
         
-        existing = [p["name"].lower() for p in profile_data.get("products", [])
-                    if p["name"].lower() != old_name.lower()]
-        if new_name.lower() in existing:
+        catalog = self.get_catalog()
+        product = catalog.find(old_name)
+        if product is None:
+            self.show_popup('Ошибка', 'Товар не найден')
+            return
+        
+        duplicate = catalog.find(new_name)
+        if duplicate is not None and duplicate is not product:
             self.show_popup('Ошибка', f'Товар «{new_name}» уже существует')
             return
         
@@ -1444,26 +5217,14 @@ class EditProductScreen(BaseScreen):
         percent_exp = self.business_logic.calculate_percent_expenses(cost, profit)
         percent_profit = self.business_logic.calculate_percent_profit(cost, profit)
         
-        for product in profile_data["products"]:
-            if product["name"] == old_name:
-                product["name"] = new_name
-                product["cost_price"] = cost
-                product["profit"] = profit
-                product["expenses"] = expenses
-                product["percent_expenses"] = percent_exp
-                product["percent_profit"] = percent_profit
-                break
-        
-        if old_name != new_name:
-            if old_name in profile_data["stock"]:
-                profile_data["stock"][new_name] = profile_data["stock"].pop(old_name)
-            
-            for order in profile_data.get("orders", []):
-                for item in order["items"]:
-                    if item["product"] == old_name:
-                        item["product"] = new_name
-        
-        self.save_profile_data(profile_data)
+        # Склад и заказы ссылаются на id товара, поэтому при переименовании
+        # меняется только запись каталога — на месте, с её прочими ключами
+        with self.profile_transaction() as tx:
+            position = catalog.position(product.id)
+            for field, value in (("name", new_name), ("cost_price", cost), ("profit", profit),
+                                 ("expenses", expenses), ("percent_expenses", percent_exp),
+                                 ("percent_profit", percent_profit)):
+                tx.set(["products", position, field], value)
         
         self.show_popup(
             'Успех',
@@ -1542,16 +5303,14 @@ class WarehouseScreen(BaseScreen):
     def load_warehouse(self):
         profile_data = self.get_profile_data()
         
-        total_value = sum(data["total_value"] for data in profile_data["stock"].values())
-        total_qty = sum(data["current_quantity"] for data in profile_data["stock"].values())
+        totals = self.data_manager.stock_totals(self.get_current_profile())
         total_products = len(profile_data.get("products", []))
-        products_with_stock = sum(1 for data in profile_data["stock"].values() if data["current_quantity"] > 0)
         
         self.stats_label.text = (
             f'Всего товаров: {total_products}\n'
-            f'С остатком: {products_with_stock}\n'
-            f'Общий остаток: {total_qty:.2f} кг\n'
-            f'Общая стоимость: {total_value:.2f} ₽'
+            f'С остатком: {totals["in_stock_count"]}\n'
+            f'Общий остаток: {totals["total_quantity"]:.2f} кг\n'
+            f'Общая стоимость: {totals["total_value"]:.2f} ₽'
         )
         
         self.warehouse_list.clear_widgets()
@@ -1571,9 +5330,9 @@ class WarehouseScreen(BaseScreen):
             self.warehouse_list.add_widget(empty_label)
             return
 
-        for product in sorted(products, key=lambda x: x["name"]):
+        for product in self.get_catalog().by_name():
             product_name = product["name"]
-            stock_data = profile_data["stock"].get(product_name, {
+            stock_data = profile_data["stock"].get(product.stock_key, {
                 "current_quantity": 0.0,
                 "total_value": 0.0,
                 "history": []
@@ -1676,7 +5435,7 @@ class WarehouseScreen(BaseScreen):
             products_list = GridLayout(cols=1, spacing=8, size_hint_y=None)
             products_list.bind(minimum_height=products_list.setter('height'))
             
-            for product in sorted(profile_data["products"], key=lambda x: x["name"]):
+            for product in self.get_catalog().by_name():
                 btn = Button(
                     text=product["name"],
                     size_hint_y=None,
@@ -1702,15 +5461,21 @@ class WarehouseScreen(BaseScreen):
             return
         
         # Корректировка конкретного товара
-        if product_name not in profile_data["stock"]:
-            profile_data["stock"][product_name] = {
-                "current_quantity": 0.0,
-                "total_value": 0.0,
-                "history": []
-            }
-            self.save_profile_data(profile_data)
+        product_info = self.get_catalog().find(product_name)
+        if product_info is None:
+            self.show_popup('Ошибка', 'Товар не найден')
+            return
+        stock_key = product_info.stock_key
+        if stock_key not in profile_data["stock"]:
+            with self.profile_transaction() as tx:
+                tx.set(["stock", stock_key], {
+                    "current_quantity": 0.0,
+                    "total_value": 0.0,
+                    "history": []
+                })
+                _update_stock_totals(tx, None, (0.0, 0.0))
         
-        stock_data = profile_data["stock"][product_name]
+        stock_data = profile_data["stock"][stock_key]
         current_qty = stock_data["current_quantity"]
         current_value = stock_data["total_value"]
         avg_price = current_value / current_qty if current_qty > 0 else 0.0
@@ -1727,7 +5492,6 @@ class WarehouseScreen(BaseScreen):
         )
         content.add_widget(title_label)
         
-        product_info = next((p for p in profile_data["products"] if p["name"] == product_name), None)
         if product_info:
             percent_exp = self.business_logic.calculate_percent_expenses(
                 product_info['cost_price'], product_info['profit']
@@ -1848,20 +5612,20 @@ class WarehouseScreen(BaseScreen):
                 old_quantity = stock_data["current_quantity"]
                 old_total_value = stock_data["total_value"]
                 
-                stock_data["current_quantity"] = new_quantity
-                stock_data["total_value"] = new_quantity * new_avg_price
-                
                 operation_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                stock_data["history"].append({
-                    "date": operation_time,
-                    "quantity": new_quantity - old_quantity,
-                    "price_per_kg": new_avg_price,
-                    "operation": "корректировка",
-                    "total_amount": new_quantity * new_avg_price,
-                    "balance_after": new_quantity
-                })
-                
-                self.save_profile_data(profile_data)
+                with self.profile_transaction() as tx:
+                    tx.set(["stock", stock_key, "current_quantity"], new_quantity)
+                    tx.set(["stock", stock_key, "total_value"], new_quantity * new_avg_price)
+                    _update_stock_totals(tx, (old_quantity, old_total_value),
+                                         (new_quantity, new_quantity * new_avg_price))
+                    tx.append(["stock", stock_key, "history"], StockEntry(
+                        date=operation_time,
+                        quantity=new_quantity - old_quantity,
+                        price_per_kg=new_avg_price,
+                        operation="корректировка",
+                        total_amount=new_quantity * new_avg_price,
+                        balance_after=new_quantity
+                    ))
                 popup.dismiss()
                 self.load_warehouse()
                 self.show_popup('Успех', f'Товар «{product_name}» успешно скорректирован!')
@@ -2044,32 +5808,39 @@ class AddStockScreen(BaseScreen):
             return
         
         profile_data = self.get_profile_data()
-        
-        if product_name not in profile_data["stock"]:
-            profile_data["stock"][product_name] = {
-                "current_quantity": 0.0,
-                "total_value": 0.0,
-                "history": []
-            }
-        
-        stock_data = profile_data["stock"][product_name]
-        previous_quantity = stock_data["current_quantity"]
-        previous_value = stock_data["total_value"]
-        
-        stock_data["current_quantity"] += qty
-        stock_data["total_value"] += qty * price
-        
-        operation_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        stock_data["history"].append({
-            "date": operation_time,
-            "quantity": qty,
-            "price_per_kg": price,
-            "operation": "пополнение",
-            "total_amount": qty * price,
-            "balance_after": stock_data["current_quantity"]
-        })
-        
-        self.save_profile_data(profile_data)
+        product = self.get_catalog().find(product_name)
+        if product is None:
+            self.show_popup('Ошибка', 'Товар не найден')
+            return
+        stock_key = product.stock_key
+        
+        with self.profile_transaction() as tx:
+            created = stock_key not in profile_data["stock"]
+            if created:
+                tx.set(["stock", stock_key], {
+                    "current_quantity": 0.0,
+                    "total_value": 0.0,
+                    "history": []
+                })
+            
+            stock_data = profile_data["stock"][stock_key]
+            previous_quantity = stock_data["current_quantity"]
+            previous_value = stock_data["total_value"]
+            
+            tx.set(["stock", stock_key, "current_quantity"], previous_quantity + qty)
+            tx.set(["stock", stock_key, "total_value"], previous_value + qty * price)
+            _update_stock_totals(tx, None if created else (previous_quantity, previous_value),
+                                 (previous_quantity + qty, previous_value + qty * price))
+            
+            operation_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            tx.append(["stock", stock_key, "history"], StockEntry(
+                date=operation_time,
+                quantity=qty,
+                price_per_kg=price,
+                operation="пополнение",
+                total_amount=qty * price,
+                balance_after=stock_data["current_quantity"]
+            ))
         
         self.show_popup(
             'Успех',
@@ -2237,7 +6008,7 @@ class CreateOrderScreen(BaseScreen):
         profile_data = self.get_profile_data()
         products = [
             p["name"] for p in profile_data.get("products", [])
-            if profile_data["stock"].get(p["name"], {"current_quantity": 0})["current_quantity"] > 0
+            if profile_data["stock"].get(p.stock_key, {"current_quantity": 0})["current_quantity"] > 0
         ]
         
         if not products:
@@ -2264,10 +6035,10 @@ class CreateOrderScreen(BaseScreen):
         dropdown.dismiss()
         
         profile_data = self.get_profile_data()
-        product = next((p for p in profile_data["products"] if p["name"] == product_name), None)
-        stock_data = profile_data["stock"].get(product_name, {"current_quantity": 0.0})
+        product = self.get_catalog().find(product_name)
         
         if product:
+            stock_data = profile_data["stock"].get(product.stock_key, {"current_quantity": 0.0})
             percent_exp = self.business_logic.calculate_percent_expenses(
                 product['cost_price'], product['profit']
             )
@@ -2300,8 +6071,12 @@ class CreateOrderScreen(BaseScreen):
             return
         
         profile_data = self.get_profile_data()
-        stock_data = profile_data["stock"].get(product_name, {"current_quantity": 0.0})
+        product = self.get_catalog().find(product_name)
+        if not product:
+            self.show_popup('Ошибка', 'Товар не найден')
+            return
         
+        stock_data = profile_data["stock"].get(product.stock_key, {"current_quantity": 0.0})
         if qty > stock_data["current_quantity"]:
             self.show_popup(
                 'Ошибка',
@@ -2309,17 +6084,12 @@ class CreateOrderScreen(BaseScreen):
             )
             return
         
-        product = next((p for p in profile_data["products"] if p["name"] == product_name), None)
-        if not product:
-            self.show_popup('Ошибка', 'Товар не найден')
-            return
-        
-        item = {
-            "product": product_name,
-            "quantity": qty,
-            "cost_price": product["cost_price"],
-            "total": qty * product["cost_price"]
-        }
+        item = OrderItem(
+            product_id=product.id,
+            quantity=qty,
+            cost_price=product.cost_price,
+            total=qty * product.cost_price
+        )
         
         self.order_items.append(item)
         
@@ -2346,15 +6116,17 @@ class CreateOrderScreen(BaseScreen):
             return
         
         profile_data = self.get_profile_data()
+        catalog = self.get_catalog()
         
         # Проверка остатков
         stock_check = defaultdict(float)
         for item in self.order_items:
-            stock_check[item["product"]] += item["quantity"]
+            stock_check[str(item.product_id)] += item["quantity"]
         
-        for product, required in stock_check.items():
-            available = profile_data["stock"].get(product, {"current_quantity": 0.0})["current_quantity"]
+        for stock_key, required in stock_check.items():
+            available = profile_data["stock"].get(stock_key, {"current_quantity": 0.0})["current_quantity"]
             if required > available:
+                product = catalog.stock_name(stock_key)
                 self.show_popup(
                     'Ошибка',
                     f'Недостаточно {product}. Требуется: {required:.2f} кг, доступно: {available:.2f} кг'
@@ -2370,53 +6142,57 @@ class CreateOrderScreen(BaseScreen):
         operation_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         order_number = self.current_order_number
         
-        # Списание со склада
-        for item in self.order_items:
-            product_name = item["product"]
-            qty = item["quantity"]
-            stock_data = profile_data["stock"][product_name]
-            prev_qty = stock_data["current_quantity"]
-            prev_value = stock_data["total_value"]
-            stock_data["current_quantity"] -= qty
-            avg_price = prev_value / prev_qty if prev_qty > 0 else 0
-            stock_data["total_value"] = stock_data["current_quantity"] * avg_price if prev_qty > 0 else 0
-            stock_data["history"].append({
-                "date": operation_time,
-                "quantity": -qty,
-                "price_per_kg": avg_price,
-                "operation": "списание",
-                "total_amount": qty * avg_price if prev_qty > 0 else 0,
-                "balance_after": stock_data["current_quantity"]
-            })
-        
-        # Сохранение заказа
-        profile_data["orders"].append({
-            "number": order_number,
-            "date": order_date,
-            "items": self.order_items,
-            "subtotal": subtotal,
-            "delivery_cost": delivery,
-            "total": total
-        })
-        
-        # Обновление статистики
-        if order_date not in profile_data["daily_stats"]:
-            profile_data["daily_stats"][order_date] = {
+        with self.profile_transaction() as tx:
+            # Списание со склада
+            for item in self.order_items:
+                stock_key = str(item.product_id)
+                qty = item["quantity"]
+                stock_data = profile_data["stock"][stock_key]
+                prev_qty = stock_data["current_quantity"]
+                prev_value = stock_data["total_value"]
+                new_qty = prev_qty - qty
+                avg_price = prev_value / prev_qty if prev_qty > 0 else 0
+                tx.set(["stock", stock_key, "current_quantity"], new_qty)
+                tx.set(["stock", stock_key, "total_value"], new_qty * avg_price if prev_qty > 0 else 0)
+                _update_stock_totals(tx, (prev_qty, prev_value),
+                                     (new_qty, stock_data["total_value"]))
+                tx.append(["stock", stock_key, "history"], StockEntry(
+                    date=operation_time,
+                    quantity=-qty,
+                    price_per_kg=avg_price,
+                    operation="списание",
+                    total_amount=qty * avg_price if prev_qty > 0 else 0,
+                    balance_after=new_qty
+                ))
+            
+            # Сохранение заказа
+            tx.append(["orders"], Order(
+                number=order_number,
+                date=order_date,
+                items=self.order_items,
+                subtotal=subtotal,
+                delivery_cost=delivery,
+                total=total
+            ))
+            
+            # Обновление статистики
+            stats = dict(profile_data["daily_stats"].get(order_date, {
                 "orders_count": 0,
                 "delivery_count": 0,
                 "delivery_sum": 0.0,
                 "total_revenue": 0.0
-            }
-        
-        stats = profile_data["daily_stats"][order_date]
-        stats["orders_count"] += 1
-        if self.delivery_enabled:
-            stats["delivery_count"] += 1
-            stats["delivery_sum"] += delivery
-        stats["total_revenue"] += total
-        
-        profile_data["next_order_number"] = order_number + 1
-        self.save_profile_data(profile_data)
+            }))
+            stats["orders_count"] += 1
+            if self.delivery_enabled:
+                stats["delivery_count"] += 1
+                stats["delivery_sum"] += delivery
+            stats["total_revenue"] += total
+            tx.set(["daily_stats", order_date], stats)
+            tx.set(["sales_rollup", order_date], _rollup_add(
+                profile_data.get("sales_rollup", {}).get(order_date, {}), self.order_items
+            ))
+            
+            tx.set(["next_order_number"], order_number + 1)
         
         # Сброс формы
         self.order_items = []
@@ -2438,6 +6214,12 @@ class SalesAnalysisScreen(BaseScreen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._table_w = get_table_width()
+        # Номер текущего анализа: результаты прежних (отменённых) не выводятся
+        self._job = 0
+        self._busy = False
+        self._render_event = None
+        self.granularity = 'day'
+        self.comparison = 'none'
         self.build_ui()
 
     def build_ui(self):
@@ -2467,7 +6249,7 @@ class SalesAnalysisScreen(BaseScreen):
         hint_label.bind(size=hint_label.setter('text_size'))
         layout.add_widget(hint_label)
 
-        filters_layout = BoxLayout(orientation='vertical', size_hint_y=0.24, spacing=12)
+        filters_layout = BoxLayout(orientation='vertical', size_hint_y=0.31, spacing=12)
         
         # Дата от
         date_from_layout = BoxLayout(orientation='vertical', size_hint_y=None, height=70)
@@ -2519,9 +6301,12 @@ class SalesAnalysisScreen(BaseScreen):
             cursor_color=COLORS['DARK_BLUE']
         )
         date_to_layout.add_widget(self.date_to_input)
+        self.date_from_input.bind(text=self.on_filters_changed)
+        self.date_to_input.bind(text=self.on_filters_changed)
         filters_layout.add_widget(date_to_layout)
         
-        # Выбор товара
+        # Выбор товара и шага строк
+        choice_layout = BoxLayout(orientation='horizontal', size_hint_y=None, height=70, spacing=12)
         product_filter_layout = BoxLayout(orientation='vertical', size_hint_y=None, height=70)
         product_filter_layout.add_widget(Label(
             text='Фильтр по товару:',
@@ -2543,7 +6328,55 @@ class SalesAnalysisScreen(BaseScreen):
         )
         self.product_dropdown_btn.bind(on_press=self.show_product_dropdown)
         product_filter_layout.add_widget(self.product_dropdown_btn)
-        filters_layout.add_widget(product_filter_layout)
+        choice_layout.add_widget(product_filter_layout)
+
+        granularity_layout = BoxLayout(orientation='vertical', size_hint_y=None, height=70)
+        granularity_layout.add_widget(Label(
+            text='Группировка:',
+            color=COLORS['DARK_BLUE'],
+            font_size='17sp',
+            bold=True,
+            size_hint_y=None,
+            height=32
+        ))
+        
+        self.granularity_btn = Button(
+            text=SALES_GRANULARITIES['day'],
+            size_hint_y=None,
+            height=36,
+            background_color=COLORS['LIGHT_BG'],
+            color=COLORS['DARK_TEXT'],
+            font_size='17sp',
+            bold=True
+        )
+        self.granularity_btn.bind(on_press=self.show_granularity_dropdown)
+        granularity_layout.add_widget(self.granularity_btn)
+        choice_layout.add_widget(granularity_layout)
+        filters_layout.add_widget(choice_layout)
+
+        # Сравнение с другим периодом
+        comparison_layout = BoxLayout(orientation='vertical', size_hint_y=None, height=70)
+        comparison_layout.add_widget(Label(
+            text='Сравнение:',
+            color=COLORS['DARK_BLUE'],
+            font_size='17sp',
+            bold=True,
+            size_hint_y=None,
+            height=32
+        ))
+        
+        self.comparison_btn = Button(
+            text=SALES_COMPARISONS['none'],
+            size_hint_y=None,
+            height=36,
+            background_color=COLORS['LIGHT_BG'],
+            color=COLORS['DARK_TEXT'],
+            font_size='17sp',
+            bold=True
+        )
+        self.comparison_btn.bind(on_press=self.show_comparison_dropdown)
+        comparison_layout.add_widget(self.comparison_btn)
+        filters_layout.add_widget(comparison_layout)
         
         layout.add_widget(filters_layout)
 
@@ -2554,12 +6387,35 @@ class SalesAnalysisScreen(BaseScreen):
         clear_btn = UIComponents.create_secondary_button('Сбросить')
         clear_btn.background_color = COLORS['AMBER']
         clear_btn.color = (1, 1, 1, 1)
+        rebuild_btn = UIComponents.create_secondary_button('Пересчитать')
         apply_btn.bind(on_press=self.load_analysis)
         clear_btn.bind(on_press=self.clear_filters)
+        rebuild_btn.bind(on_press=self.rebuild_rollup)
         btn_layout.add_widget(apply_btn)
         btn_layout.add_widget(clear_btn)
+        btn_layout.add_widget(rebuild_btn)
         layout.add_widget(btn_layout)
 
+        # Ход анализа и отмена
+        progress_layout = BoxLayout(orientation='horizontal', size_hint_y=None, height=40, spacing=12)
+        self.progress_label = Label(
+            text='',
+            font_size='16sp',
+            color=COLORS['MEDIUM_GREY'],
+            italic=True,
+            halign='center',
+            valign='middle'
+        )
+        self.progress_label.bind(size=self.progress_label.setter('text_size'))
+        self.cancel_btn = UIComponents.create_secondary_button('Отмена', height=40)
+        self.cancel_btn.size_hint_x = 0.3
+        self.cancel_btn.disabled = True
+        self.cancel_btn.opacity = 0
+        self.cancel_btn.bind(on_press=self.cancel_analysis)
+        progress_layout.add_widget(self.progress_label)
+        progress_layout.add_widget(self.cancel_btn)
+        layout.add_widget(progress_layout)
+
         # Результаты анализа (таблица приподнята, горизонтальный скролл)
         results_title = Label(
             text='Результаты анализа (свайп влево/вправо — все столбцы)',
@@ -2573,7 +6429,7 @@ class SalesAnalysisScreen(BaseScreen):
         layout.add_widget(results_title)
 
         scroll = ScrollView(
-            size_hint_y=0.54,
+            size_hint_y=0.47,
             do_scroll_x=True,
             do_scroll_y=True,
             bar_width=10,
@@ -2597,9 +6453,7 @@ class SalesAnalysisScreen(BaseScreen):
         self.load_analysis(None)
 
     def load_products_for_dropdown(self):
-        profile_data = self.get_profile_data()
-        products = [p["name"] for p in profile_data.get("products", [])]
-        self.product_list = ["Все товары"] + sorted(products)
+        self.product_list = ["Все товары"] + self.get_catalog().names()
 
     def show_product_dropdown(self, instance):
         dropdown = DropDown()
@@ -2620,14 +6474,78 @@ class SalesAnalysisScreen(BaseScreen):
     def select_product(self, product_name, dropdown):
         self.product_dropdown_btn.text = product_name
         dropdown.dismiss()
+        self.on_filters_changed()
+
+    def show_granularity_dropdown(self, instance):
+        dropdown = DropDown()
+        for granularity, text in SALES_GRANULARITIES.items():
+            btn = Button(
+                text=text,
+                size_hint_y=None,
+                height=50,
+                background_color=COLORS['WHITE'],
+                color=COLORS['DARK_TEXT'],
+                font_size='17sp'
+            )
+            btn.bind(on_release=lambda btn, g=granularity: self.select_granularity(g, dropdown))
+            dropdown.add_widget(btn)
+        
+        dropdown.open(self.granularity_btn)
+
+    def select_granularity(self, granularity, dropdown):
+        self.granularity = granularity
+        self.granularity_btn.text = SALES_GRANULARITIES[granularity]
+        dropdown.dismiss()
+        self.on_filters_changed()
+
+    def show_comparison_dropdown(self, instance):
+        dropdown = DropDown()
+        for comparison, text in SALES_COMPARISONS.items():
+            btn = Button(
+                text=text,
+                size_hint_y=None,
+                height=50,
+                background_color=COLORS['WHITE'],
+                color=COLORS['DARK_TEXT'],
+                font_size='17sp'
+            )
+            btn.bind(on_release=lambda btn, c=comparison: self.select_comparison(c, dropdown))
+            dropdown.add_widget(btn)
+        
+        dropdown.open(self.comparison_btn)
+
+    def select_comparison(self, comparison, dropdown):
+        self.comparison = comparison
+        self.comparison_btn.text = SALES_COMPARISONS[comparison]
+        dropdown.dismiss()
+        self.on_filters_changed()
 
     def clear_filters(self, instance):
         self.date_from_input.text = (date.today() - timedelta(days=30)).isoformat()
         self.date_to_input.text = date.today().isoformat()
         self.product_dropdown_btn.text = 'Все товары'
+        self.granularity = 'day'
+        self.granularity_btn.text = SALES_GRANULARITIES['day']
+        self.comparison = 'none'
+        self.comparison_btn.text = SALES_COMPARISONS['none']
         self.load_analysis(None)
 
+    def rebuild_rollup(self, instance):
+        """Пересчёт свода продаж по всем заказам профиля"""
+        days = self.data_manager.rebuild_sales_rollup(self.get_current_profile())
+        self.load_analysis(None)
+        self.show_popup('Успех', f'Свод продаж пересчитан по заказам.\nДней с продажами: {days}')
+
     def load_analysis(self, instance):
+        """Запуск анализа за выбранный период в фоновом потоке.
+
+        Расчёт (DataManager.sales_analysis) идёт вне потока Kivy, результат
+        передаётся обратно через Clock, а строки таблицы добавляются частями
+        в пределах ANALYSIS_FRAME_BUDGET на кадр, поэтому интерфейс не
+        замирает на больших периодах. Предыдущий незавершённый анализ
+        отменяется.
+        """
+        self.cancel_analysis(None)
         self.analysis_list.clear_widgets()
         self._table_w = get_table_width()
         self.analysis_container.width = self._table_w
@@ -2649,38 +6567,67 @@ class SalesAnalysisScreen(BaseScreen):
         selected_product = self.product_dropdown_btn.text
         filter_by_product = selected_product != "Все товары"
         
-        profile_data = self.get_profile_data()
-        orders = profile_data.get("orders", [])
-        products = {p["name"]: p for p in profile_data.get("products", [])}
-        
-        sales_data = defaultdict(lambda: defaultdict(lambda: {'qty': 0.0, 'sum': 0.0}))
-        
-        for order in orders:
-            try:
-                order_date = datetime.strptime(order["date"], "%Y-%m-%d").date()
-                if not (date_from <= order_date <= date_to):
-                    continue
-                
-                for item in order["items"]:
-                    if filter_by_product and item["product"] != selected_product:
-                        continue
-                    
-                    product_name = item["product"]
-                    qty = item["quantity"]
-                    total = item["total"]
-                    
-                    sales_data[order["date"]][product_name]['qty'] += qty
-                    sales_data[order["date"]][product_name]['sum'] += total
-            except Exception as e:
-                print(f"[!] Ошибка обработки заказа: {e}")
-                continue
+        self._busy = True
+        self._show_progress('Расчёт...')
+        threading.Thread(
+            target=self._analysis_worker,
+            args=(self._job, self.get_current_profile(), date_from, date_to,
+                  selected_product if filter_by_product else None, self.granularity, self.comparison),
+            name="sales-analysis",
+            daemon=True
+        ).start()
+
+    def _analysis_worker(self, job, profile_name, date_from, date_to, product, granularity, comparison):
+        """Фоновый поток: расчёт анализа (и сравнения) и передача результата в поток Kivy"""
+        try:
+            # Повторный запрос с теми же параметрами и без изменений данных — из кэша;
+            # после отмены (новый запуск или кнопка отмены) расчёт прерывается
+            result = self.data_manager.sales_analysis(profile_name, date_from, date_to, product, granularity,
+                                                      cancelled=lambda: job != self._job)
+            if result is None:
+                return
+            if comparison != 'none':
+                compared = self.data_manager.sales_comparison(profile_name, date_from, date_to,
+                                                              comparison, product)
+            else:
+                compared = None
+        except Exception as e:
+            print(f"[X] Ошибка анализа продаж: {e}")
+            Clock.schedule_once(lambda dt, e=e: self._analysis_failed(job, e))
+            return
+        Clock.schedule_once(lambda dt: self._analysis_ready(job, result, granularity, compared))
+
+    def _analysis_failed(self, job, error):
+        if job != self._job:
+            return
+        self._busy = False
+        self._show_progress(None)
+        self.show_popup('Ошибка', f'Не удалось выполнить анализ: {error}')
+
+    def _analysis_ready(self, job, result, granularity, compared):
+        """Результат анализа в потоке Kivy; устаревший (отменённый) отбрасывается"""
+        if job != self._job:
+            return
+        rows, totals = result
+        # Очередь отрисовки: строки анализа, итог, затем таблица сравнения
+        self._queue = [lambda i=i, row=row: self._add_analysis_row(i, row) for i, row in enumerate(rows)]
+        if rows:
+            self._queue.append(lambda: self._add_analysis_total(totals))
+        if compared is not None:
+            period, compare_rows, compare_totals = compared
+            self._queue.append(lambda: self._add_comparison_header(period))
+            self._queue.extend(lambda i=i, row=row: self._add_comparison_row(i, row)
+                               for i, row in enumerate(compare_rows))
+            self._queue.append(lambda: self._add_comparison_row(0, ("ИТОГО",) + compare_totals, total=True))
+        self._queue_done = 0
         
         # Заголовок таблицы
+        by_day = granularity == 'day'
         header_labels = [
-            ("Дата", 0.14),
+            ("Дата" if by_day else "Период", 0.14),
             ("Товар", 0.24),
             ("Количество", 0.14),
-            ("Сумма в день", 0.16),
+            ("Сумма в день" if by_day else "Сумма", 0.16),
             ("Выручка", 0.16),
             ("Затраты", 0.16)
         ]
@@ -2689,7 +6636,7 @@ class SalesAnalysisScreen(BaseScreen):
         self.analysis_list.add_widget(header_card)
         
         # Проверка на отсутствие данных
-        if not sales_data:
+        if not rows:
             empty_label = Label(
                 text='Нет данных для выбранного периода',
                 size_hint_y=None,
@@ -2713,79 +6660,105 @@ class SalesAnalysisScreen(BaseScreen):
             )
             hint_label.bind(size=hint_label.setter('text_size'))
             self.analysis_list.add_widget(hint_label)
+        
+        if not self._queue:
+            self._busy = False
+            self._show_progress(None)
             return
+        self._render_event = Clock.schedule_interval(self._render_rows, 0)
+
+    def _render_rows(self, dt):
+        """Добавление очередной порции строк; не дольше ANALYSIS_FRAME_BUDGET за кадр"""
+        deadline = time.perf_counter() + ANALYSIS_FRAME_BUDGET
+        queue = self._queue
+        while self._queue_done < len(queue):
+            queue[self._queue_done]()
+            self._queue_done += 1
+            if time.perf_counter() >= deadline:
+                break
+        if self._queue_done < len(queue):
+            self._show_progress(f'Отрисовано строк: {self._queue_done} из {len(queue)}')
+            return True
+        self._render_event = None
+        self._busy = False
+        self._show_progress(None)
+        return False
+
+    def cancel_analysis(self, instance):
+        """Отмена текущего анализа: расчёт прерывается, оставшиеся строки не выводятся"""
+        self._job += 1
+        if self._render_event is not None:
+            self._render_event.cancel()
+            self._render_event = None
+        if self._busy:
+            self._busy = False
+            self._show_progress('Анализ отменён' if instance is not None else None)
+
+    def on_filters_changed(self, *args):
+        """Смена фильтров во время расчёта отменяет его"""
+        if self._busy:
+            self.cancel_analysis(None)
+
+    def on_leave(self):
+        self.cancel_analysis(None)
+
+    def _show_progress(self, text):
+        """Строка состояния анализа; кнопка «Отмена» — только пока идёт расчёт"""
+        self.progress_label.text = text or ''
+        self.cancel_btn.disabled = not self._busy
+        self.cancel_btn.opacity = 1 if self._busy else 0
+
+    def _add_analysis_row(self, row_index, row):
+        day_date_str, product_name, qty, daily_sum, profit_calc, expense_calc = row
+        bg_color = COLORS['WHITE'] if row_index % 2 == 0 else (0.97, 0.985, 1.0, 1)
+        
+        card = BoxLayout(
+            orientation='horizontal',
+            size_hint_y=None,
+            height=66,
+            padding=[13, 10],
+            spacing=8,
+            size_hint_x=None,
+            width=self._table_w
+        )
         
-        # Заполнение таблицы
-        row_index = 0
-        for day_date_str, products_data in sorted(sales_data.items()):
-            for product_name, values in products_data.items():
-                qty = values['qty']
-                daily_sum = values['sum']
-                product = products.get(product_name, {})
-                profit_pct = product.get("percent_profit", 0.0)
-                expense_pct = product.get("percent_expenses", 0.0)
-                profit_calc = (daily_sum * profit_pct) / 100.0
-                expense_calc = (daily_sum * expense_pct) / 100.0
-                
-                bg_color = COLORS['WHITE'] if row_index % 2 == 0 else (0.97, 0.985, 1.0, 1)
-                
-                card = BoxLayout(
-                    orientation='horizontal',
-                    size_hint_y=None,
-                    height=66,
-                    padding=[13, 10],
-                    spacing=8,
-                    size_hint_x=None,
-                    width=self._table_w
-                )
-                
-                with card.canvas.before:
-                    Color(*bg_color)
-                    card.rect = Rectangle(pos=card.pos, size=card.size)
-                    Color(0.90, 0.90, 0.90, 1)
-                    card.line = Line(points=[card.x, card.y, card.right, card.y], width=1)
-                
-                def update_line(instance, value):
-                    instance.rect.pos = instance.pos
-                    instance.rect.size = instance.size
-                    instance.line.points = [instance.x, instance.y, instance.right, instance.y]
-                
-                card.bind(pos=update_line, size=update_line)
-                
-                for text, width_ratio, color in [
-                    (day_date_str, 0.14, COLORS['DARK_TEXT']),
-                    (product_name, 0.24, COLORS['DARK_BLUE']),
-                    (f"{qty:.1f} кг", 0.14, COLORS['AMBER']),
-                    (f"{daily_sum:,.0f} ₽".replace(",", " "), 0.16, COLORS['GREEN']),
-                    (f"{profit_calc:,.0f} ₽".replace(",", " "), 0.16, COLORS['PURPLE']),
-                    (f"{expense_calc:,.0f} ₽".replace(",", " "), 0.16, COLORS['ORANGE'])
-                ]:
-                    label = Label(
-                        text=text,
-                        font_size='17sp',
-                        bold=(width_ratio > 0.15),
-                        color=color,
-                        size_hint_x=width_ratio,
-                        halign='center',
-                        valign='middle'
-                    )
-                    label.bind(size=label.setter('text_size'))
-                    card.add_widget(label)
-                
-                self.analysis_list.add_widget(card)
-                row_index += 1
+        with card.canvas.before:
+            Color(*bg_color)
+            card.rect = Rectangle(pos=card.pos, size=card.size)
+            Color(0.90, 0.90, 0.90, 1)
+            card.line = Line(points=[card.x, card.y, card.right, card.y], width=1)
         
-        # Итоговая строка
-        total_qty = sum(v['qty'] for pd in sales_data.values() for v in pd.values())
-        total_sum = sum(v['sum'] for pd in sales_data.values() for v in pd.values())
-        total_profit = sum(
-            (v['sum'] * products.get(p, {}).get("percent_profit", 0.0)) / 100.0
-            for pd in sales_data.values() for p, v in pd.items()
-        )
-        total_expense = sum(
-            (v['sum'] * products.get(p, {}).get("percent_expenses", 0.0)) / 100.0
-            for pd in sales_data.values() for p, v in pd.items()
-        )
+        def update_line(instance, value):
+            instance.rect.pos = instance.pos
+            instance.rect.size = instance.size
+            instance.line.points = [instance.x, instance.y, instance.right, instance.y]
+        
+        card.bind(pos=update_line, size=update_line)
+        
+        for text, width_ratio, color in [
+            (day_date_str, 0.14, COLORS['DARK_TEXT']),
+            (product_name, 0.24, COLORS['DARK_BLUE']),
+            (f"{qty:.1f} кг", 0.14, COLORS['AMBER']),
+            (f"{daily_sum:,.0f} ₽".replace(",", " "), 0.16, COLORS['GREEN']),
+            (f"{profit_calc:,.0f} ₽".replace(",", " "), 0.16, COLORS['PURPLE']),
+            (f"{expense_calc:,.0f} ₽".replace(",", " "), 0.16, COLORS['ORANGE'])
+        ]:
+            label = Label(
+                text=text,
+                font_size='17sp',
+                bold=(width_ratio > 0.15),
+                color=color,
+                size_hint_x=width_ratio,
+                halign='center',
+                valign='middle'
+            )
+            label.bind(size=label.setter('text_size'))
+            card.add_widget(label)
+        
+        self.analysis_list.add_widget(card)
+
+    def _add_analysis_total(self, totals):
+        total_qty, total_sum, total_profit, total_expense = totals
         
         total_card = BoxLayout(
             orientation='horizontal',
@@ -2833,6 +6806,88 @@ class SalesAnalysisScreen(BaseScreen):
         
         self.analysis_list.add_widget(total_card)
 
+    def _add_comparison_header(self, period):
+        prev_from, prev_to = period
+        caption = Label(
+            text=f'Сравнение с периодом {prev_from.isoformat()} — {prev_to.isoformat()}',
+            size_hint_y=None,
+            height=48,
+            size_hint_x=None,
+            width=self._table_w,
+            font_size='18sp',
+            bold=True,
+            color=COLORS['DARK_BLUE'],
+            halign='center',
+            valign='middle'
+        )
+        caption.bind(size=caption.setter('text_size'))
+        self.analysis_list.add_widget(caption)
+        self.analysis_list.add_widget(UIComponents.create_table_header([
+            ("Товар", 0.24),
+            ("Количество", 0.14),
+            ("Сумма", 0.16),
+            ("Было", 0.16),
+            ("Изменение", 0.16),
+            ("%", 0.14)
+        ], width=self._table_w))
+
+    def _add_comparison_row(self, row_index, row, total=False):
+        """Строка сравнения: товар, количество и сумма сейчас, сумма в периоде
+        сравнения и её изменение в рублях и процентах"""
+        product_name, qty, row_sum, prev_qty, prev_sum = row
+        delta = row_sum - prev_sum
+        money = lambda value: f"{value:,.0f} ₽".replace(",", " ")
+        if prev_sum:
+            percent = f"{delta / prev_sum * 100:+.1f}%"
+        else:
+            percent = "новый" if row_sum else "—"
+        delta_color = COLORS['GREEN'] if delta >= 0 else COLORS['RED']
+        
+        card = BoxLayout(
+            orientation='horizontal',
+            size_hint_y=None,
+            height=70 if total else 66,
+            padding=[13, 10],
+            spacing=8,
+            size_hint_x=None,
+            width=self._table_w
+        )
+        
+        with card.canvas.before:
+            if total:
+                Color(0.94, 1.0, 0.94, 1)
+            else:
+                Color(*(COLORS['WHITE'] if row_index % 2 == 0 else (0.97, 0.985, 1.0, 1)))
+            card.rect = Rectangle(pos=card.pos, size=card.size)
+        
+        def update_rect(instance, value):
+            instance.rect.pos = instance.pos
+            instance.rect.size = instance.size
+        
+        card.bind(pos=update_rect, size=update_rect)
+        
+        for text, width_ratio, color in [
+            (product_name, 0.24, COLORS['DARK_BLUE']),
+            (f"{qty:.1f} кг", 0.14, COLORS['AMBER']),
+            (money(row_sum), 0.16, COLORS['GREEN']),
+            (money(prev_sum), 0.16, COLORS['MEDIUM_GREY']),
+            (f"{'+' if delta > 0 else ''}{money(delta)}", 0.16, delta_color),
+            (percent, 0.14, delta_color)
+        ]:
+            label = Label(
+                text=text,
+                font_size='18sp' if total else '17sp',
+                bold=total or width_ratio > 0.15,
+                color=color,
+                size_hint_x=width_ratio,
+                halign='center',
+                valign='middle'
+            )
+            label.bind(size=label.setter('text_size'))
+            card.add_widget(label)
+        
+        self.analysis_list.add_widget(card)
+
 # ============================================================================
 # ЭКРАН: ИСТОРИЯ ЗАКАЗОВ
 # ============================================================================
@@ -2899,8 +6954,13 @@ class OrderHistoryScreen(BaseScreen):
         self.load_history()
         self.load_daily_stats()
 
+    # Заказов на странице истории
+    PAGE_SIZE = 15
+
     def load_history(self):
         self.history_list.clear_widgets()
+        self._cursor = None
+        self._more_btn = None
         profile_data = self.get_profile_data()
         orders = profile_data.get("orders", [])
         
@@ -2918,7 +6978,19 @@ class OrderHistoryScreen(BaseScreen):
             self.history_list.add_widget(empty_label)
             return
         
-        for order in sorted(orders, key=lambda x: x["number"], reverse=True)[:15]:
+        self.load_more_history(None)
+
+    def load_more_history(self, instance):
+        """Следующая (более старая) страница заказов по индексу номеров"""
+        if self._more_btn is not None:
+            self.history_list.remove_widget(self._more_btn)
+            self._more_btn = None
+        
+        orders, self._cursor = self.data_manager.orders_page(
+            self.get_current_profile(), self.PAGE_SIZE, self._cursor
+        )
+        
+        for order in orders:
             card = BoxLayout(
                 orientation='vertical',
                 size_hint_y=None,
@@ -2956,6 +7028,11 @@ class OrderHistoryScreen(BaseScreen):
             card.add_widget(items_label)
             card.add_widget(total_label)
             self.history_list.add_widget(card)
+        
+        if self._cursor is not None:
+            self._more_btn = UIComponents.create_secondary_button('Показать ещё')
+            self._more_btn.bind(on_press=self.load_more_history)
+            self.history_list.add_widget(self._more_btn)
 
     def load_daily_stats(self):
         """Загружает дневную статистику из профиля с КОРРЕКТНЫМ расчётом суммы доставки"""
@@ -3010,6 +7087,49 @@ class OrderHistoryScreen(BaseScreen):
         
         self.stats_list.add_widget(header_card)
         
+        # Итоговая строка за всё время — по суммам индекса, без перебора дней
+        if daily_stats:
+            totals = self.data_manager.daily_totals(self.get_current_profile(), date.min, date.max)
+            # Суммы дерева отличаются от точных на погрешность округления
+            totals = {field: round(value, 2) for field, value in totals.items()}
+            total_card = BoxLayout(
+                orientation='horizontal',
+                size_hint_y=None,
+                height=60,
+                padding=[9, 0],
+                spacing=6,
+                size_hint_x=None,
+                width=self._table_w
+            )
+            
+            with total_card.canvas.before:
+                Color(0.94, 1.0, 0.94, 1)
+                total_card.rect = Rectangle(pos=total_card.pos, size=total_card.size)
+            
+            total_card.bind(pos=update_header_rect, size=update_header_rect)
+            
+            for text, color in [
+                ("ИТОГО", COLORS['DARK_TEXT']),
+                (f"{int(totals['orders_count'])}", COLORS['DARK_BLUE']),
+                (f"{int(totals['delivery_count'])}", COLORS['AMBER']),
+                (f"{int(totals['total_revenue']):,}".replace(",", " "), COLORS['GREEN']),
+                (f"{int(totals['delivery_sum']):,}".replace(",", " "), COLORS['ORANGE']),
+                (f"{int(totals['total_revenue'] - totals['delivery_sum']):,}".replace(",", " "), COLORS['PURPLE'])
+            ]:
+                lbl = Label(
+                    text=text,
+                    font_size='17sp',
+                    bold=True,
+                    color=color,
+                    size_hint_x=0.18,
+                    halign='center',
+                    valign='middle'
+                )
+                lbl.bind(size=lbl.setter('text_size'))
+                total_card.add_widget(lbl)
+            
+            self.stats_list.add_widget(total_card)
+        
         for date_key, data in sorted(daily_stats.items(), reverse=True):
             card = BoxLayout(
                 orientation='horizontal',
@@ -3153,9 +7273,14 @@ class StockHistoryScreen(BaseScreen):
     def on_enter(self):
         self.load_history()
 
+    # Операций на странице истории
+    PAGE_SIZE = 50
+
     def load_history(self):
         self.history_list.clear_widgets()
         self.history_container.width = 1100
+        self._cursor = None
+        self._more_btn = None
         
         profile_data = self.get_profile_data()
         stock_data = profile_data.get("stock", {})
@@ -3174,23 +7299,6 @@ class StockHistoryScreen(BaseScreen):
             self.history_list.add_widget(empty_label)
             return
         
-        all_operations = []
-        for product_name, data in stock_data.items():
-            history = data.get("history", [])
-            for op in history:
-                op_dict = {
-                    "date": op.get("date", ""),
-                    "product": product_name,
-                    "operation": op.get("operation", "Неизвестно"),
-                    "quantity": op.get("quantity", 0.0),
-                    "price_per_kg": op.get("price_per_kg", 0.0),
-                    "total_amount": op.get("total_amount", 0.0),
-                    "balance_after": op.get("balance_after", 0.0)
-                }
-                all_operations.append(op_dict)
-        
-        all_operations.sort(key=lambda x: x["date"], reverse=True)
-        
         header_labels = [
             ("Дата", 0.17),
             ("Товар", 0.25),
@@ -3203,8 +7311,19 @@ class StockHistoryScreen(BaseScreen):
         
         header_card = UIComponents.create_table_header(header_labels, width=1100)
         self.history_list.add_widget(header_card)
+        self.load_more_history(None)
+
+    def load_more_history(self, instance):
+        """Следующая (более старая) страница операций — по курсору, без повторного чтения новых"""
+        if self._more_btn is not None:
+            self.history_list.remove_widget(self._more_btn)
+            self._more_btn = None
         
-        for op in all_operations[:50]:
+        operations, self._cursor = self.data_manager.stock_operations_page(
+            self.get_current_profile(), self.PAGE_SIZE, self._cursor
+        )
+        
+        for op in operations:
             card = BoxLayout(
                 orientation='horizontal',
                 size_hint_y=None,
@@ -3216,13 +7335,13 @@ class StockHistoryScreen(BaseScreen):
             )
             
             for text, width_ratio in [
-                (op["date"], 0.17),
+                (op.get("date", ""), 0.17),
                 (op["product"], 0.25),
-                (op["operation"].capitalize(), 0.17),
-                (f"{op['quantity']:.2f}", 0.12),
-                (f"{op['price_per_kg']:.2f}", 0.12),
-                (f"{op['total_amount']:.2f}", 0.12),
-                (f"{op['balance_after']:.2f}", 0.12)
+                (op.get("operation", "Неизвестно").capitalize(), 0.17),
+                (f"{op.get('quantity', 0.0):.2f}", 0.12),
+                (f"{op.get('price_per_kg', 0.0):.2f}", 0.12),
+                (f"{op.get('total_amount', 0.0):.2f}", 0.12),
+                (f"{op.get('balance_after', 0.0):.2f}", 0.12)
             ]:
                 label = Label(
                     text=text,
@@ -3235,6 +7354,291 @@ class StockHistoryScreen(BaseScreen):
                 card.add_widget(label)
             
             self.history_list.add_widget(card)
+        
+        if self._cursor is not None:
+            self._more_btn = UIComponents.create_secondary_button('Показать ещё')
+            self._more_btn.bind(on_press=self.load_more_history)
+            self.history_list.add_widget(self._more_btn)
+
+# ============================================================================
+# ЭКРАН: СВОДНЫЙ ОТЧЁТ ПО ПРОФИЛЯМ
+# ============================================================================
+class ConsolidatedReportScreen(BaseScreen):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._table_w = get_table_width()
+        # Номер текущего отчёта: результаты прежних не выводятся
+        self._job = 0
+        self.selected_profiles: set = set()
+        self.build_ui()
+
+    def build_ui(self):
+        layout = BoxLayout(orientation='vertical', padding=[12, 12, 12, 16], spacing=8)
+        layout.add_widget(UIComponents.create_back_button('home'))
+
+        title = Label(
+            text='Сводный отчёт',
+            size_hint_y=0.07,
+            font_size='26sp',
+            bold=True,
+            color=COLORS['DARK_BLUE'],
+            halign='center'
+        )
+        title.bind(size=title.setter('text_size'))
+        layout.add_widget(title)
+
+        dates_layout = BoxLayout(orientation='horizontal', size_hint_y=None, height=70, spacing=12)
+        self.date_from_input = self._date_field(dates_layout, 'Начало периода:',
+                                                (date.today() - timedelta(days=30)).isoformat())
+        self.date_to_input = self._date_field(dates_layout, 'Конец периода:', date.today().isoformat())
+        layout.add_widget(dates_layout)
+
+        hint_label = Label(
+            text='Профили в отчёте (нажмите, чтобы исключить)',
+            size_hint_y=None,
+            height=30,
+            font_size='16sp',
+            color=COLORS['MEDIUM_GREY'],
+            italic=True,
+            halign='center'
+        )
+        hint_label.bind(size=hint_label.setter('text_size'))
+        layout.add_widget(hint_label)
+
+        profiles_scroll = ScrollView(size_hint_y=0.16)
+        self.profiles_grid = GridLayout(cols=2, spacing=8, size_hint_y=None)
+        self.profiles_grid.bind(minimum_height=self.profiles_grid.setter('height'))
+        profiles_scroll.add_widget(self.profiles_grid)
+        layout.add_widget(profiles_scroll)
+
+        build_btn = UIComponents.create_primary_button('Сформировать')
+        build_btn.background_color = COLORS['GREEN']
+        build_btn.bind(on_press=self.load_report)
+        layout.add_widget(build_btn)
+
+        self.progress_label = Label(
+            text='',
+            size_hint_y=None,
+            height=30,
+            font_size='16sp',
+            color=COLORS['MEDIUM_GREY'],
+            italic=True,
+            halign='center'
+        )
+        self.progress_label.bind(size=self.progress_label.setter('text_size'))
+        layout.add_widget(self.progress_label)
+
+        scroll = ScrollView(
+            size_hint_y=0.6,
+            do_scroll_x=True,
+            do_scroll_y=True,
+            bar_width=10,
+            scroll_type=['bars', 'content'],
+            bar_color=COLORS['DARK_BLUE'][:3] + (0.85,),
+            bar_inactive_color=COLORS['LIGHT_GREY'][:3] + (0.65,),
+        )
+        self.report_list = GridLayout(cols=1, spacing=10, size_hint_y=None, size_hint_x=None,
+                                      width=self._table_w)
+        self.report_list.bind(minimum_height=self.report_list.setter('height'))
+        scroll.add_widget(self.report_list)
+        layout.add_widget(scroll)
+
+        self.add_widget(layout)
+
+    @staticmethod
+    def _date_field(parent, caption, text):
+        field_layout = BoxLayout(orientation='vertical', size_hint_y=None, height=70)
+        field_layout.add_widget(Label(
+            text=caption,
+            color=COLORS['DARK_BLUE'],
+            font_size='17sp',
+            bold=True,
+            size_hint_y=None,
+            height=32
+        ))
+        date_input = TextInput(
+            text=text,
+            multiline=False,
+            font_size='13sp',
+            height=36,
+            size_hint_y=None,
+            background_color=COLORS['WHITE'],
+            foreground_color=COLORS['DARK_TEXT'],
+            padding=[15, 11],
+            hint_text='ГГГГ-ММ-ДД',
+            cursor_color=COLORS['DARK_BLUE']
+        )
+        field_layout.add_widget(date_input)
+        parent.add_widget(field_layout)
+        return date_input
+
+    def on_enter(self):
+        self.selected_profiles = set(self.data_manager.list_profiles())
+        self.load_profiles()
+        self.load_report(None)
+
+    def on_leave(self):
+        self._job += 1
+
+    def load_profiles(self):
+        self.profiles_grid.clear_widgets()
+        for profile_name in self.data_manager.list_profiles():
+            btn = Button(
+                text=profile_name,
+                size_hint_y=None,
+                height=44,
+                font_size='16sp',
+                bold=True
+            )
+            self._paint_profile_button(btn, profile_name in self.selected_profiles)
+            btn.bind(on_press=lambda instance, name=profile_name: self.toggle_profile(instance, name))
+            self.profiles_grid.add_widget(btn)
+
+    @staticmethod
+    def _paint_profile_button(btn, selected):
+        btn.background_color = COLORS['DARK_BLUE'] if selected else COLORS['LIGHT_GREY']
+        btn.color = (1, 1, 1, 1) if selected else COLORS['DARK_TEXT']
+
+    def toggle_profile(self, btn, profile_name):
+        if profile_name in self.selected_profiles:
+            self.selected_profiles.discard(profile_name)
+        else:
+            self.selected_profiles.add(profile_name)
+        self._paint_profile_button(btn, profile_name in self.selected_profiles)
+
+    def load_report(self, instance):
+        """Сводный отчёт в фоновом потоке: профили читаются и считаются в
+        отдельных процессах (DataManager.consolidated_report), результат
+        выводится через Clock"""
+        self._job += 1
+        self.report_list.clear_widgets()
+        self._table_w = get_table_width()
+        self.report_list.width = self._table_w
+
+        date_from, error = Validators.validate_date(self.date_from_input.text)
+        if error:
+            self.show_popup('Ошибка', f'Неверный формат даты "от": {error}')
+            return
+        date_to, error = Validators.validate_date(self.date_to_input.text)
+        if error:
+            self.show_popup('Ошибка', f'Неверный формат даты "до": {error}')
+            return
+        if date_from > date_to:
+            self.show_popup('Ошибка', 'Дата "от" не может быть больше даты "до"')
+            return
+
+        profiles = [name for name in self.data_manager.list_profiles() if name in self.selected_profiles]
+        if not profiles:
+            self.progress_label.text = 'Выберите хотя бы один профиль'
+            return
+        self.progress_label.text = f'Расчёт по профилям: {len(profiles)}...'
+        job = self._job
+
+        def work():
+            try:
+                report = self.data_manager.consolidated_report(date_from, date_to, profiles)
+            except Exception as e:
+                print(f"[X] Ошибка сводного отчёта: {e}")
+                Clock.schedule_once(lambda dt, e=e: self._report_failed(job, e))
+                return
+            Clock.schedule_once(lambda dt: self._report_ready(job, report))
+
+        threading.Thread(target=work, name="consolidated-report", daemon=True).start()
+
+    def _report_failed(self, job, error):
+        if job != self._job:
+            return
+        self.progress_label.text = ''
+        self.show_popup('Ошибка', f'Не удалось сформировать отчёт: {error}')
+
+    def _report_ready(self, job, report):
+        if job != self._job:
+            return
+        self.progress_label.text = ''
+        if report["failed"]:
+            self.progress_label.text = 'Не вошли в отчёт (ошибка данных): ' + ', '.join(report["failed"])
+        money = lambda value: f"{value:,.0f} ₽".replace(",", " ")
+
+        self.report_list.add_widget(UIComponents.create_table_header([
+            ("Профиль", 0.24),
+            ("Заказов", 0.12),
+            ("Выручка", 0.16),
+            ("Доставок", 0.12),
+            ("Доставка", 0.16),
+            ("Склад", 0.20)
+        ], width=self._table_w))
+        rows = list(report["profiles"].items()) + [("ИТОГО", report["total"])]
+        for row_index, (name, part) in enumerate(rows):
+            stats = part["daily_stats"]
+            self._add_row([
+                (name, 0.24, COLORS['DARK_BLUE']),
+                (str(part["orders_count"]), 0.12, COLORS['DARK_TEXT']),
+                (money(part["revenue"]), 0.16, COLORS['GREEN']),
+                (str(stats["delivery_count"]), 0.12, COLORS['DARK_TEXT']),
+                (money(stats["delivery_sum"]), 0.16, COLORS['PURPLE']),
+                (money(part["stock"]["total_value"]), 0.20, COLORS['TEAL'])
+            ], row_index, total=part is report["total"])
+
+        self.report_list.add_widget(UIComponents.create_table_header([
+            ("Товар (все профили)", 0.46),
+            ("Количество", 0.24),
+            ("Сумма", 0.30)
+        ], width=self._table_w))
+        products = sorted(report["total"]["products"].items(), key=lambda p: (-p[1][1], p[0]))
+        if not products:
+            empty_label = Label(
+                text='Нет продаж за выбранный период',
+                size_hint_y=None,
+                height=60,
+                color=COLORS['MEDIUM_GREY'],
+                font_size='19sp',
+                bold=True,
+                halign='center'
+            )
+            empty_label.bind(size=empty_label.setter('text_size'))
+            self.report_list.add_widget(empty_label)
+        for row_index, (name, (qty, total)) in enumerate(products):
+            self._add_row([
+                (name, 0.46, COLORS['DARK_BLUE']),
+                (f"{qty:.1f} кг", 0.24, COLORS['AMBER']),
+                (money(total), 0.30, COLORS['GREEN'])
+            ], row_index)
+
+    def _add_row(self, cells, row_index, total=False):
+        card = BoxLayout(
+            orientation='horizontal',
+            size_hint_y=None,
+            height=60,
+            padding=[13, 8],
+            spacing=8,
+            size_hint_x=None,
+            width=self._table_w
+        )
+        with card.canvas.before:
+            if total:
+                Color(0.94, 1.0, 0.94, 1)
+            else:
+                Color(*(COLORS['WHITE'] if row_index % 2 == 0 else (0.97, 0.985, 1.0, 1)))
+            card.rect = Rectangle(pos=card.pos, size=card.size)
+
+        def update_rect(instance, value):
+            instance.rect.pos = instance.pos
+            instance.rect.size = instance.size
+
+        card.bind(pos=update_rect, size=update_rect)
+        for text, width_ratio, color in cells:
+            label = Label(
+                text=text,
+                font_size='17sp',
+                bold=total,
+                color=color,
+                size_hint_x=width_ratio,
+                halign='center',
+                valign='middle'
+            )
+            label.bind(size=label.setter('text_size'))
+            card.add_widget(label)
+        self.report_list.add_widget(card)
 
 # ============================================================================
 # ГЛАВНОЕ ПРИЛОЖЕНИЕ
@@ -3263,9 +7667,18 @@ class OrderApp(App):
         sm.add_widget(SalesAnalysisScreen(name='sales_analysis'))
         sm.add_widget(OrderHistoryScreen(name='order_history'))
         sm.add_widget(StockHistoryScreen(name='stock_history'))
+        sm.add_widget(ConsolidatedReportScreen(name='consolidated_report'))
         Window.clearcolor = COLORS['LIGHT_BG']
         return sm
 
+    def on_pause(self):
+        # Android может завершить приложение в фоне — сохраняем всё сразу
+        self.data_manager.flush()
+        return True
+
+    def on_stop(self):
+        self.data_manager.close()
+
     try:
         from kivy.app import App
         app = App.get_running_app()
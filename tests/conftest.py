@@ -0,0 +1,70 @@
+"""
+Общие настройки тестов: модуль приложения импортируется без разбора
+аргументов командной строки Kivy, данные — во временном каталоге
+"""
+import os
+import sys
+
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+os.environ.setdefault("KIVY_NO_FILELOG", "1")
+os.environ.setdefault("KIVY_NO_CONSOLELOG", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import date, timedelta  # noqa: E402
+
+import pytest  # noqa: E402
+
+import main  # noqa: E402
+
+START = date(2024, 1, 1)
+
+
+def make_profile(days: int = 120) -> dict:
+    """Небольшой профиль с фиксированными датами: 3 товара, по заказу в день"""
+    data = {"products": [], "stock": {}, "orders": [], "daily_stats": {}, "next_order_number": 1,
+            "next_product_id": 4}
+    for i in range(3):
+        cost = 100.0 * (i + 1)
+        data["products"].append({
+            "id": i + 1, "name": f"Товар {i + 1}", "cost_price": cost, "profit": cost * 0.2,
+            "expenses": cost * 0.05, "percent_expenses": 5.0, "percent_profit": 20.0
+        })
+        data["stock"][str(i + 1)] = {"current_quantity": 50.0, "total_value": 50.0 * cost, "history": [
+            {"date": f"{START.isoformat()} 09:00:00", "quantity": 50.0, "price_per_kg": cost,
+             "operation": "приход", "total_amount": 50.0 * cost, "balance_after": 50.0}
+        ]}
+    for n in range(days):
+        day = (START + timedelta(days=n)).isoformat()
+        product = data["products"][n % 3]
+        qty = float(n % 5 + 1)
+        total = qty * product["cost_price"] * 1.25
+        data["orders"].append({
+            "number": n + 1, "date": day, "subtotal": total, "delivery_cost": 0.0,
+            "total": total, "items": [{"product_id": product["id"], "quantity": qty,
+                                       "cost_price": product["cost_price"], "total": total}]
+        })
+        data["daily_stats"][day] = {"orders_count": 1, "delivery_count": 0,
+                                    "delivery_sum": 0.0, "total_revenue": total}
+    data["next_order_number"] = days + 1
+    return data
+
+
+@pytest.fixture(params=('json', 'journal', 'sharded', 'sqlite'))
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def make_dm(tmp_path):
+    """Фабрика DataManager без фоновой записи; все закрываются после теста"""
+    managers = []
+
+    def factory(storage_backend: str = 'sharded', **kwargs):
+        kwargs.setdefault("write_behind_delay", 0)
+        dm = main.DataManager(storage_backend=storage_backend, data_dir=str(tmp_path), **kwargs)
+        managers.append(dm)
+        return dm
+
+    yield factory
+    for dm in managers:
+        dm.close()
@@ -0,0 +1,123 @@
+import threading
+from collections import defaultdict
+from datetime import date
+
+import pytest
+
+import main
+from conftest import make_profile
+
+
+def analysis(dm, engine, *args, **kwargs):
+    """Анализ выбранным способом без кэша результатов"""
+    dm.analytics_engine = engine
+    dm._analysis_cache = main.LRUCache(main.ANALYSIS_CACHE_SIZE)
+    return dm.sales_analysis("p", *args, **kwargs)
+
+
+@pytest.mark.parametrize("period", [
+    (date(2024, 1, 1), date(2024, 1, 7)),
+    (date(2024, 1, 15), date(2024, 3, 31)),
+    (date(2023, 6, 1), date(2025, 1, 1)),
+])
+def test_numpy_engine_matches_rollup(make_dm, period):
+    pytest.importorskip("numpy")
+    dm = make_dm()
+    dm.update_profile_data("p", make_profile())
+    assert analysis(dm, 'numpy', *period) == analysis(dm, 'python', *period)
+    assert analysis(dm, 'numpy', *period, product="Товар 2") == \
+        analysis(dm, 'python', *period, product="Товар 2")
+
+
+@pytest.mark.parametrize("granularity", ['day', 'month'])
+def test_analysis_cancel_and_lock(make_dm, granularity):
+    dm = make_dm()
+    dm.update_profile_data("p", make_profile())
+    period = (date(2024, 1, 1), date(2024, 4, 30))
+    assert dm.sales_analysis("p", *period, granularity=granularity, cancelled=lambda: True) is None
+    assert len(dm._analysis_cache) == 0
+
+    # Строки считаются без блокировки данных: другой поток может её взять
+    free = []
+
+    def try_lock():
+        if dm._lock.acquire(blocking=False):
+            dm._lock.release()
+            free.append(True)
+        else:
+            free.append(False)
+
+    def cancelled():
+        if not free:
+            probe = threading.Thread(target=try_lock)
+            probe.start()
+            probe.join()
+        return False
+
+    result = dm.sales_analysis("p", *period, granularity=granularity, cancelled=cancelled)
+    assert free == [True]
+    assert result[0] and result == dm.sales_analysis("p", *period, granularity=granularity)
+
+
+def baseline_analysis(data, date_from, date_to, product=None):
+    """Анализ продаж так, как его считал AnalysisScreen.load_analysis до свода
+    продаж: перебор заказов, группировка по (дата, название товара), доли
+    прибыли и затрат — из каталога по названию"""
+    names = {p["id"]: p["name"] for p in data["products"]}
+    products = {p["name"]: p for p in data["products"]}
+    sales = defaultdict(lambda: defaultdict(lambda: [0.0, 0.0]))
+    for order in data["orders"]:
+        if not date_from <= date.fromisoformat(order["date"]) <= date_to:
+            continue
+        for item in order["items"]:
+            name = names[item["product_id"]]
+            if product is None or name == product:
+                sales[order["date"]][name][0] += item["quantity"]
+                sales[order["date"]][name][1] += item["total"]
+    rows = []
+    for day, by_name in sorted(sales.items()):
+        for name, (qty, total) in by_name.items():
+            product_data = products.get(name, {})
+            rows.append((day, name, qty, total, total * product_data.get("percent_profit", 0.0) / 100.0,
+                         total * product_data.get("percent_expenses", 0.0) / 100.0))
+    totals = tuple(sum(row[i] for row in rows) for i in range(2, 6))
+    return rows, totals
+
+
+@pytest.mark.parametrize("engine", [
+    'python',
+    pytest.param('numpy', marks=pytest.mark.skipif(main.numpy is None, reason="NumPy не установлен")),
+])
+@pytest.mark.parametrize("product", [None, "Товар 3"])
+def test_analysis_matches_baseline(make_dm, engine, product):
+    dm = make_dm()
+    data = make_profile()
+    for i, item in enumerate(data["products"]):
+        item["percent_profit"], item["percent_expenses"] = 10.0 + 7 * i, 3.0 + i
+    # Несколько позиций одного товара в заказе и несколько заказов в день
+    for order in data["orders"][::4]:
+        order["items"].append(dict(order["items"][0], quantity=0.5, total=62.5))
+    data["orders"].extend(dict(order, number=order["number"] + 1000) for order in data["orders"][::9])
+    dm.update_profile_data("p", data)
+    period = (date(2024, 1, 10), date(2024, 3, 20))
+
+    rows, totals = analysis(dm, engine, *period, product=product)
+    expected_rows, expected_totals = baseline_analysis(data, *period, product)
+    assert sorted(rows) == pytest.approx(sorted(expected_rows))
+    assert totals == pytest.approx(expected_totals)
+
+
+def test_analysis_rows_and_total_share_percents(make_dm):
+    dm = make_dm()
+    data = make_profile(20)
+    # Продажи удалённого товара «Товар 2»: ключ свода — название, не id
+    data["orders"][1]["items"] = [{"product": "Товар 2", "quantity": 2.0, "cost_price": 200.0, "total": 500.0}]
+    data["products"] = [p for p in data["products"] if p["name"] != "Товар 2"]
+    dm.update_profile_data("p", data)
+    # Новый товар с тем же названием
+    with dm.transaction("p") as tx:
+        tx.append(["products"], dict(make_profile(1)["products"][1], id=4, percent_profit=40.0))
+
+    rows, totals = dm.sales_analysis("p", date(2024, 1, 1), date(2024, 1, 31))
+    assert sum(row[4] for row in rows) == pytest.approx(totals[2])
+    assert sum(row[5] for row in rows) == pytest.approx(totals[3])
@@ -0,0 +1,86 @@
+import json
+import os
+from datetime import datetime
+
+import main
+
+
+def price_list(changed_line=None):
+    """Прайс-лист строками JSON: ~12 КБ, одна строка может быть изменена"""
+    lines = [json.dumps({"sku": f"A-{n:03d}", "name": f"Позиция {n}", "price": 10 + n % 7}, ensure_ascii=False)
+             for n in range(200)]
+    if changed_line is not None:
+        lines[changed_line] = '{"sku": "A-NEW", "name": "Новая позиция", "price": 99}'
+    return ("[\n" + ",\n".join(lines) + "\n]\n").encode("utf-8")
+
+
+def objects(store):
+    return {name for _, _, names in os.walk(store.objects_dir) for name in names}
+
+
+def test_changed_file_stores_only_new_chunks(tmp_path):
+    store = main.BackupStore(str(tmp_path / "backups"), str(tmp_path), interval=0, keep_days=30)
+    path = tmp_path / "prices.json"
+    path.write_bytes(price_list())
+    assert store.snapshot(str(path))
+    first = objects(store)
+
+    path.write_bytes(price_list(changed_line=120))
+    assert store.snapshot(str(path))
+    added = objects(store) - first
+    assert 0 < len(added) <= 2
+    assert store.latest(str(path)) == price_list(changed_line=120)
+    # Без изменений новая версия не пишется
+    assert not store.snapshot(str(path))
+
+
+def test_restore_to_moment_and_back(tmp_path):
+    store = main.BackupStore(str(tmp_path / "backups"), str(tmp_path), interval=0, keep_days=30)
+    prices, notes = tmp_path / "prices.json", tmp_path / "notes.json"
+    prices.write_bytes(price_list())
+    store.snapshot(str(prices))
+    moment = datetime.now()
+
+    prices.write_bytes(price_list(changed_line=5))
+    store.snapshot(str(prices))
+    notes.write_bytes(b'{"text": "\xd0\xbf\xd0\xbe\xd0\xb7\xd0\xb6\xd0\xb5"}')
+    store.snapshot(str(notes))
+    changed = store.restore(moment)
+    assert sorted(changed) == sorted([str(prices), str(notes)])
+    assert prices.read_bytes() == price_list()
+    assert not notes.exists()
+
+    # Состояние до восстановления сохранено: восстановление отменяется
+    store.restore(datetime.now())
+    assert prices.read_bytes() == price_list(changed_line=5)
+    assert notes.exists()
+
+
+def test_compressed_chunks_read_back(tmp_path):
+    store = main.BackupStore(str(tmp_path / "backups"), str(tmp_path), interval=0, keep_days=30,
+                             snapshot_format='gzip')
+    path = tmp_path / "prices.json"
+    path.write_bytes(main._compress_snapshot(price_list(), 'gzip'))
+    store.snapshot(str(path))
+    stored = sum(os.path.getsize(os.path.join(root, name))
+                 for root, _, names in os.walk(store.objects_dir) for name in names)
+    assert stored < len(price_list()) // 2
+    # Фрагменты — из распакованного содержимого
+    assert store.latest(str(path)) == price_list()
+    reopened = main.BackupStore(str(tmp_path / "backups"), str(tmp_path), interval=0, keep_days=30)
+    assert reopened.latest(str(path)) == price_list()
+
+
+def test_data_manager_restores_profiles(make_dm, monkeypatch):
+    monkeypatch.setattr(main, "BACKUP_INTERVAL", 0)
+    dm = make_dm('json')
+    dm.update_profile_data("ларёк", {"products": [], "stock": {}, "orders": [], "daily_stats": {},
+                                     "next_order_number": 5, "next_product_id": 1})
+    dm.flush()
+    moment = datetime.now()
+    with dm.transaction("ларёк") as tx:
+        tx.set(["next_order_number"], 40)
+    dm.flush()
+
+    assert dm.restore_backup(moment) == 1
+    assert dm.get_profile_data("ларёк")["next_order_number"] == 5
@@ -0,0 +1,51 @@
+from datetime import date
+
+import main
+
+MARCH = (date(2024, 3, 1), date(2024, 3, 31))
+
+
+def orchard():
+    """Сад: яблоки с 30% прибыли, груши с 10%"""
+    return {
+        "products": [{"id": 1, "name": "Яблоки", "cost_price": 80.0, "percent_profit": 30.0, "percent_expenses": 70.0},
+                     {"id": 2, "name": "Груши", "cost_price": 150.0, "percent_profit": 10.0, "percent_expenses": 90.0}],
+        "stock": {}, "daily_stats": {}, "next_order_number": 3, "next_product_id": 3,
+        "orders": [
+            {"number": 1, "date": "2024-03-04", "total": 400.0, "items": [
+                {"product_id": 1, "quantity": 4.0, "total": 400.0}]},
+            {"number": 2, "date": "2024-03-09", "total": 300.0, "items": [
+                {"product_id": 2, "quantity": 1.5, "total": 300.0}]}],
+    }
+
+
+def test_lru_cache_evicts_least_recent():
+    cache = main.LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and len(cache) == 2
+
+
+def test_analysis_cached_until_profile_changes(make_dm):
+    dm = make_dm()
+    dm.update_profile_data("сад", orchard())
+    dm.update_profile_data("огород", orchard())
+    first = dm.sales_analysis("сад", *MARCH)
+    assert first[1] == (5.5, 700.0, 150.0, 550.0)
+    assert dm.sales_analysis("сад", *MARCH) is first
+    assert dm.sales_analysis("сад", *MARCH, granularity='month') is not first
+
+    # Изменения другого профиля кэш не сбрасывают
+    with dm.transaction("огород") as tx:
+        tx.set(["products", 0, "percent_profit"], 50.0)
+    assert dm.sales_analysis("сад", *MARCH) is first
+
+    version = dm.data_version("сад")
+    with dm.transaction("сад") as tx:
+        tx.set(["products", 0, "percent_profit"], 50.0)
+    assert dm.data_version("сад") > version
+    changed = dm.sales_analysis("сад", *MARCH)
+    assert changed is not first
+    assert changed[1] == (5.5, 700.0, 230.0, 550.0)
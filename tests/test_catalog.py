@@ -0,0 +1,44 @@
+import main
+
+SPICES = [
+    {"id": 1, "name": "Паприка", "cost_price": 90.0},
+    {"id": 2, "name": "Куркума", "cost_price": 70.0},
+    {"id": 3, "name": "Ваниль", "cost_price": 900.0},
+]
+
+
+def spice_profile():
+    return {"products": [dict(p) for p in SPICES], "stock": {}, "orders": [], "daily_stats": {},
+            "next_order_number": 1, "next_product_id": 4, "format_version": main.PROFILE_FORMAT}
+
+
+def test_lookups():
+    catalog = main.ProductCatalog([main.Product.from_dict(p) for p in SPICES])
+    assert catalog.find("куркума").id == 2
+    assert catalog.find("ВАНИЛЬ ").id == 3
+    assert catalog.find("Кориандр") is None
+    assert catalog.get("3").name == "Ваниль" and catalog.get(3) is catalog.get("3")
+    assert catalog.get("n:3") is None
+    assert catalog.position(1) == 0 and catalog.position(9) is None
+    assert [p.id for p in catalog.by_name()] == [3, 2, 1]
+    assert catalog.product_name(None, "Гвоздика") == "Гвоздика"
+    assert catalog.product_name(8) == main.DELETED_PRODUCT
+
+
+def test_catalog_follows_transactions(make_dm):
+    dm = make_dm()
+    dm.update_profile_data("специи", spice_profile())
+    catalog = dm.catalog("специи")
+    with dm.transaction("специи") as tx:
+        tx.append(["products"], {"id": 4, "name": "Анис", "cost_price": 300.0})
+        tx.set(["products", 0, "name"], "Чили")
+    assert dm.catalog("специи") is catalog
+    assert catalog.names() == ["Анис", "Ваниль", "Куркума", "Чили"]
+    assert catalog.find("паприка") is None and catalog.find("чили").id == 1
+    assert catalog.position(4) == 3
+
+    products = dm.get_profile_data("специи")["products"]
+    with dm.transaction("специи") as tx:
+        tx.set(["products"], [p for p in products if p.id != 3])
+    assert catalog.find("ваниль") is None and catalog.get(3) is None
+    assert len(catalog) == 3 and catalog.position(4) == 2
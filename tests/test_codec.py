@@ -0,0 +1,40 @@
+import json
+import math
+
+import pytest
+
+import main
+
+CASES = [
+    {"вес": 0.25, "цена": 129.9, "штук": 3, "флаг": True, "нет": None},
+    {"малое": 1e-05, "доля": 0.0000123, "большое": 1e16, "отриц": -2.5e-7},
+    {"nan": float("nan"), "inf": float("inf"), "длинное": 2 ** 70},
+    {"текст": "null и 1e5 в строке", "кавычки": "\"\\\n\t", "эмодзи": "🍞"},
+    {1: "нестроковый ключ"},
+    [0.1, 0.00001, 10.0001, 3],
+]
+
+
+@pytest.fixture(params=('json', 'orjson', 'msgspec'))
+def codec(request):
+    if request.param != 'json':
+        pytest.importorskip(request.param)
+    return main.JsonCodec(request.param)
+
+
+@pytest.mark.parametrize("data", CASES)
+def test_dumps_matches_stdlib(codec, data):
+    assert codec.dumps(data) == json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+    assert codec.dumps(data, indent=True) == json.dumps(data, ensure_ascii=False, indent=2).encode()
+
+
+def test_records_encoded_as_dicts(codec):
+    product = main.Product.from_dict({"id": 4, "name": "Мёд", "cost_price": 450.0})
+    assert json.loads(codec.dumps([product])) == [main._records_default(product)]
+
+
+def test_loads_nan_and_long_ints(codec):
+    data = codec.loads(b'{"a": NaN, "b": 1180591620717411303424, "c": "\\u0416"}')
+    assert math.isnan(data["a"])
+    assert data["b"] == 2 ** 70
+    assert data["c"] == "Ж"
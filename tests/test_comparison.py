@@ -0,0 +1,54 @@
+from datetime import date
+
+import pytest
+
+import main
+from conftest import make_profile
+
+
+@pytest.mark.parametrize("period, mode, expected", [
+    ((date(2024, 3, 1), date(2024, 3, 10)), 'previous', (date(2024, 2, 20), date(2024, 2, 29))),
+    ((date(2024, 3, 1), date(2024, 3, 1)), 'previous', (date(2024, 2, 29), date(2024, 2, 29))),
+    ((date(2024, 3, 1), date(2024, 3, 31)), 'year', (date(2023, 3, 1), date(2023, 3, 31))),
+    ((date(2024, 2, 1), date(2024, 2, 29)), 'year', (date(2023, 2, 1), date(2023, 2, 28))),
+])
+def test_comparison_period(period, mode, expected):
+    assert main._comparison_period(*period, mode) == expected
+
+
+def names_totals(dm, date_from, date_to):
+    """Итоги продаж за период по названиям товаров"""
+    catalog = dm.catalog("p")
+    return {catalog.key_name(key): row for key, row in dm.sales_totals("p", date_from, date_to).items()}
+
+
+@pytest.mark.parametrize("period, mode", [
+    ((date(2024, 2, 1), date(2024, 2, 20)), 'previous'),
+    ((date(2024, 1, 1), date(2024, 1, 31)), 'previous'),
+    ((date(2025, 1, 10), date(2025, 3, 31)), 'year'),
+])
+def test_sales_comparison_matches_totals(make_dm, period, mode):
+    dm = make_dm()
+    data = make_profile(120)
+    # Второй год: те же заказы на год позже, чтобы сравнению с прошлым годом было с чем сравнивать
+    for order in list(data["orders"]):
+        data["orders"].append(dict(order, number=order["number"] + 120,
+                                   date=str(int(order["date"][:4]) + 1) + order["date"][4:]))
+    dm.update_profile_data("p", data)
+    dm.rebuild_sales_rollup("p")
+
+    (prev_from, prev_to), rows, totals = dm.sales_comparison("p", *period, mode)
+    assert (prev_from, prev_to) == main._comparison_period(*period, mode)
+    assert rows
+    current, previous = names_totals(dm, *period), names_totals(dm, prev_from, prev_to)
+    assert {row[0] for row in rows} == set(current) | set(previous)
+    for name, qty, total, prev_qty, prev_total in rows:
+        assert (qty, total) == pytest.approx(current.get(name, (0.0, 0.0)))
+        assert (prev_qty, prev_total) == pytest.approx(previous.get(name, (0.0, 0.0)))
+    assert [row[2] for row in rows] == sorted((row[2] for row in rows), reverse=True)
+    assert totals == pytest.approx((sum(r[0] for r in current.values()), sum(r[1] for r in current.values()),
+                                    sum(r[0] for r in previous.values()), sum(r[1] for r in previous.values())))
+
+    # Фильтр по товару оставляет одну строку того же товара
+    _, rows_one, _ = dm.sales_comparison("p", *period, mode, product="Товар 2")
+    assert rows_one == [row for row in rows if row[0] == "Товар 2"]
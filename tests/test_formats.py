@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+import main
+
+RECEIPT = {"магазин": "У дома", "позиции": [{"товар": "Гречка", "кг": 2.5, "цена": 89.9},
+                                          {"товар": "Соль", "кг": 1, "цена": 19}], "итого": 243.75}
+
+
+@pytest.mark.parametrize("fmt", ('json', 'compact', 'gzip', 'zlib', 'lzma'))
+def test_snapshot_round_trip(fmt):
+    payload = main._encode_snapshot(RECEIPT, fmt, main.JsonCodec('json'))
+    raw = main._decode_snapshot(payload)
+    assert json.loads(raw) == RECEIPT
+    assert (payload == raw) == (fmt in ('json', 'compact'))
+    if fmt == 'json':
+        assert raw == json.dumps(RECEIPT, ensure_ascii=False, indent=2).encode()
+    else:
+        assert raw == json.dumps(RECEIPT, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def test_truncated_compressed_snapshot_is_an_error():
+    payload = main._encode_snapshot(RECEIPT, 'gzip', main.JsonCodec('json'))
+    with pytest.raises(main.SNAPSHOT_ERRORS):
+        main._decode_snapshot(payload[:len(payload) // 2])
+
+
+def test_format_can_change_between_runs(make_dm, tmp_path):
+    profile = {"products": [], "stock": {}, "orders": [], "daily_stats": {},
+               "next_order_number": 3, "next_product_id": 1}
+    dm = make_dm('json', snapshot_format='lzma')
+    dm.update_profile_data("киоск", profile)
+    dm.close()
+    assert (tmp_path / "profiles.json").read_bytes().startswith(b"\xfd7zXZ\x00")
+
+    # Другой формат читает прежний файл и перезаписывает его по-своему
+    dm = make_dm('json', snapshot_format='json')
+    assert dm.get_profile_data("киоск")["next_order_number"] == 3
+    with dm.transaction("киоск") as tx:
+        tx.set(["next_order_number"], 4)
+    dm.close()
+    content = (tmp_path / "profiles.json").read_bytes()
+    assert json.loads(content)["киоск"]["next_order_number"] == 4
@@ -0,0 +1,150 @@
+import random
+from datetime import date
+
+import pytest
+
+import main
+from conftest import make_profile
+
+
+def naive_total(values, first, last):
+    return sum(v for day, v in values.items() if first <= day <= last)
+
+
+def test_day_sums_matches_naive_sums():
+    rng = random.Random(15)
+    values = {738000 + rng.randrange(200): float(rng.randrange(1, 100)) for _ in range(80)}
+    sums = main.DaySums(values)
+    for _ in range(200):
+        # Изменения внутри диапазона, за его пределами (раньше и позже) и обнуления
+        day = 738000 + rng.randrange(-150, 400)
+        value = float(rng.choice([0, rng.randrange(1, 100)]))
+        sums.set(day, value)
+        if value:
+            values[day] = value
+        else:
+            values.pop(day, None)
+        first = 738000 + rng.randrange(-200, 450)
+        last = first + rng.randrange(0, 300)
+        assert sums.total(first, last) == pytest.approx(naive_total(values, first, last))
+    assert sums.total(min(values), max(values)) == pytest.approx(sum(values.values()))
+
+
+def test_day_sums_edges():
+    sums = main.DaySums()
+    assert sums.total(1, 10) == 0.0
+    sums.set(100, 0.0)
+    assert len(sums.values) == 0
+    sums.set(100, 5.0)
+    sums.set(50, 2.0)
+    sums.set(400, 3.0)
+    assert sums.total(100, 100) == 5.0
+    assert sums.total(51, 399) == 5.0
+    assert sums.total(0, 1000) == 10.0
+    assert sums.total(400, 50) == 0.0
+
+
+def naive_sales(data, first, last):
+    sales = {}
+    for order in data["orders"]:
+        if first <= order["date"] <= last:
+            for item in order["items"]:
+                qty, total = sales.get(str(item["product_id"]), (0.0, 0.0))
+                sales[str(item["product_id"])] = (qty + item["quantity"], total + item["total"])
+    return sales
+
+
+def add_order(dm, day, product_id, qty):
+    """Заказ, сохранённый так же, как в OrderScreen.save_order"""
+    data = dm.get_profile_data("p")
+    item = {"product_id": product_id, "quantity": qty, "cost_price": 100.0, "total": qty * 125.0}
+    stats = dict(data["daily_stats"].get(day, {"orders_count": 0, "delivery_count": 0,
+                                               "delivery_sum": 0.0, "total_revenue": 0.0}))
+    stats["orders_count"] += 1
+    stats["total_revenue"] += item["total"]
+    with dm.transaction("p") as tx:
+        tx.append(["orders"], {"number": data["next_order_number"], "date": day, "subtotal": item["total"],
+                               "delivery_cost": 0.0, "total": item["total"], "items": [item]})
+        tx.set(["daily_stats", day], stats)
+        tx.set(["sales_rollup", day], main._rollup_add(data["sales_rollup"].get(day, {}), [item]))
+        tx.set(["next_order_number"], data["next_order_number"] + 1)
+
+
+@pytest.mark.parametrize("period", [
+    (date(2024, 1, 1), date(2024, 1, 1)),
+    (date(2024, 1, 10), date(2024, 2, 20)),
+    (date(2023, 12, 1), date(2024, 12, 31)),
+    (date(2025, 1, 1), date(2025, 2, 1)),
+])
+def test_period_totals_follow_new_orders(make_dm, period):
+    dm = make_dm()
+    dm.update_profile_data("p", make_profile())
+    first, last = (d.isoformat() for d in period)
+    assert dm.daily_totals("p", *period)["total_revenue"] == pytest.approx(
+        sum(s["total_revenue"] for day, s in dm.get_profile_data("p")["daily_stats"].items()
+            if first <= day <= last))
+
+    # Новые заказы раньше и позже уже известных дней и в существующий день
+    for day, product_id in (("2023-12-15", 1), ("2024-01-10", 2), ("2024-12-31", 3), ("2025-01-20", 1)):
+        add_order(dm, day, product_id, 2.0)
+    data = dm.get_profile_data("p")
+    totals = dm.daily_totals("p", *period)
+    assert totals["orders_count"] == sum(first <= o["date"] <= last for o in data["orders"])
+    assert totals["total_revenue"] == pytest.approx(
+        sum(o["total"] for o in data["orders"] if first <= o["date"] <= last))
+    expected = naive_sales(data, first, last)
+    assert dm.sales_totals("p", *period) == pytest.approx(expected)
+    assert dm.sales_totals("p", *period, product="Товар 2") == pytest.approx(
+        {k: v for k, v in expected.items() if k == "2"})
+
+
+def test_update_profile_data_rebuilds_indexes(make_dm):
+    dm = make_dm()
+    dm.update_profile_data("p", make_profile(10))
+    period = (date(2024, 1, 1), date(2024, 1, 31))
+    before = dm.daily_totals("p", *period)["total_revenue"]
+
+    # Тот же словарь статистики, изменённый на месте и переданный обратно
+    data = dm.get_profile_data("p")
+    data["daily_stats"]["2024-01-03"]["total_revenue"] += 1005.0
+    dm.update_profile_data("p", data)
+    assert dm.daily_totals("p", *period)["total_revenue"] == pytest.approx(before + 1005.0)
+
+
+def test_day_sums_error_does_not_accumulate():
+    # Разности вида 0.1 -> 0.7 -> 0.1 без пересчёта оставляли бы хвосты в узлах
+    sums = main.DaySums({day: 0.1 for day in range(1000, 1064)})
+    for n in range(5000):
+        sums.set(1000 + n % 64, 0.7 if n % 2 else 0.1)
+    exact = sum(sums.values)
+    assert abs(sums.total(1000, 1063) - exact) < 1e-9
+
+
+def test_order_index_range_by_date():
+    orders = [main.Order.from_dict(o) for o in (
+        {"number": 1, "date": "2024-03-10", "total": 10.0},
+        {"number": 2, "date": "2024-03-02", "total": 20.0},
+        {"number": 3, "date": "10.03.2024", "total": 30.0},
+        {"number": 4, "date": "2024-03-10", "total": 40.0},
+        {"number": 5, "date": "2024-03-31", "total": 50.0},
+    )]
+    index = main.OrderIndex(orders)
+    # Внутри дня — в порядке списка; дата в другом формате в индекс не попадает
+    assert [o.number for o in index.range(date(2024, 3, 1), date(2024, 3, 31))] == [2, 1, 4, 5]
+    assert [o.number for o in index.range(date(2024, 3, 10), date(2024, 3, 10))] == [1, 4]
+    assert index.range(date(2024, 4, 1), date(2024, 4, 30)) == []
+    assert len(index) == 4 and index.ordinal(2) is None
+
+
+def test_order_index_follows_date_changes(make_dm):
+    dm = make_dm()
+    dm.update_profile_data("p", {"products": [], "stock": {}, "daily_stats": {}, "next_order_number": 3,
+                                 "next_product_id": 1, "orders": [
+                                     {"number": 1, "date": "2024-07-01", "total": 5.0, "items": []},
+                                     {"number": 2, "date": "2024-07-03", "total": 7.0, "items": []}]})
+    index = dm.order_index("p")
+    with dm.transaction("p") as tx:
+        tx.set(["orders", 0, "date"], "2024-07-05")
+        tx.append(["orders"], {"number": 3, "date": "2024-07-04", "total": 9.0, "items": []})
+    assert [o.number for o in index.range(date(2024, 7, 1), date(2024, 7, 31))] == [2, 3, 1]
+    assert index.range(date(2024, 7, 1), date(2024, 7, 2)) == []
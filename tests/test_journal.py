@@ -0,0 +1,85 @@
+import json
+import os
+
+import main
+
+
+def bakery():
+    """Пекарня: два товара, один заказ"""
+    data = {
+        "products": [{"id": 1, "name": "Батон", "cost_price": 35.0}, {"id": 2, "name": "Сушки", "cost_price": 120.0}],
+        "stock": {}, "daily_stats": {"2024-06-03": {"orders_count": 1, "delivery_count": 0,
+                                                     "delivery_sum": 0.0, "total_revenue": 88.0}},
+        "orders": [{"number": 1, "date": "2024-06-03", "subtotal": 88.0, "delivery_cost": 0.0, "total": 88.0,
+                    "items": [{"product_id": 1, "quantity": 2.0, "cost_price": 35.0, "total": 88.0}]}],
+        "next_order_number": 2, "next_product_id": 3, "format_version": main.PROFILE_FORMAT,
+        "stock_totals": main._build_stock_totals({}),
+    }
+    data["sales_rollup"] = main._build_sales_rollup(data["orders"])
+    return data
+
+
+def journal_lines(tmp_path):
+    with open(tmp_path / "profiles.journal", "rb") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_journal_replayed_over_snapshot(make_dm, tmp_path):
+    dm = make_dm('journal')
+    dm.update_profile_data("пекарня", bakery())
+    with dm.transaction("пекарня") as tx:
+        tx.set(["products", 0, "cost_price"], 38.5)
+        tx.delete(["daily_stats", "2024-06-03"])
+    dm.close()
+
+    lines = journal_lines(tmp_path)
+    assert "generation" in lines[0] and len(lines) == 4
+    assert json.loads(main._decode_snapshot((tmp_path / "profiles.json").read_bytes())) == {}
+
+    data = make_dm('journal').get_profile_data("пекарня")
+    assert data["products"][0]["cost_price"] == 38.5
+    assert data["daily_stats"] == {}
+
+
+def test_checkpoint_starts_new_generation(make_dm, tmp_path):
+    dm = make_dm('journal')
+    dm.update_profile_data("пекарня", bakery())
+    dm.checkpoint()
+    dm.flush()
+
+    lines = journal_lines(tmp_path)
+    snapshot = main._decode_snapshot((tmp_path / "profiles.json").read_bytes())
+    assert lines == [{"generation": main.hashlib.sha1(snapshot).hexdigest()}]
+    assert json.loads(snapshot)["пекарня"]["orders"][0]["total"] == 88.0
+    dm.close()
+    assert make_dm('journal').get_profile_data("пекарня")["next_order_number"] == 2
+
+
+def test_journal_of_other_snapshot_ignored(make_dm, tmp_path, capsys):
+    dm = make_dm('journal')
+    dm.update_profile_data("пекарня", bakery())
+    dm.checkpoint()
+    with dm.transaction("пекарня") as tx:
+        tx.set(["next_order_number"], 50)
+    dm.close()
+    # Снимок заменён (например, восстановлен из бэкапа), журнал остался прежним
+    other = dict(bakery(), next_order_number=7)
+    (tmp_path / "profiles.json").write_text(json.dumps({"пекарня": other}), encoding="utf-8")
+
+    loaded = make_dm('journal')
+    assert loaded.get_profile_data("пекарня")["next_order_number"] == 7
+    assert "Журнал относится к другому снимку" in capsys.readouterr().out
+
+
+def test_legacy_journal_applied_and_folded_into_snapshot(make_dm, tmp_path):
+    (tmp_path / "profiles.json").write_text(json.dumps({"пекарня": bakery()}), encoding="utf-8")
+    record = {"op": "set", "p": "пекарня", "path": ["next_order_number"], "v": 12}
+    (tmp_path / "profiles.journal").write_text(json.dumps(record) + "\n", encoding="utf-8")
+
+    dm = make_dm('journal')
+    assert dm.get_profile_data("пекарня")["next_order_number"] == 12
+    dm.flush()
+    assert len(journal_lines(tmp_path)) == 1
+    snapshot = json.loads(main._decode_snapshot((tmp_path / "profiles.json").read_bytes()))
+    assert snapshot["пекарня"]["next_order_number"] == 12
+    assert os.path.exists(tmp_path / "backups")
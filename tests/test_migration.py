@@ -0,0 +1,90 @@
+from datetime import date
+
+import main
+
+
+def coffee_profile():
+    """Профиль до перехода на id: в каталоге «Кофе» с id 7, а удалённый
+    товар с названием «7» остался на складе и в заказах"""
+    entry = {"current_quantity": 3.0, "total_value": 90.0, "history": []}
+    return {
+        "products": [{"id": 7, "name": "Кофе", "cost_price": 240.0, "profit": 60.0,
+                      "expenses": 12.0, "percent_expenses": 5.0, "percent_profit": 25.0}],
+        "stock": {"Кофе": dict(entry, current_quantity=10.0, total_value=2400.0), "7": entry},
+        "orders": [
+            {"number": 1, "date": "2024-02-01", "subtotal": 600.0, "delivery_cost": 0.0, "total": 600.0,
+             "items": [{"product": "Кофе", "quantity": 2.0, "cost_price": 240.0, "total": 600.0}]},
+            {"number": 2, "date": "2024-02-02", "subtotal": 90.0, "delivery_cost": 0.0, "total": 90.0,
+             "items": [{"product": "7", "quantity": 1.0, "cost_price": 30.0, "total": 90.0}]},
+        ],
+        "daily_stats": {},
+        "next_order_number": 3,
+    }
+
+
+def test_deleted_product_named_as_id_keeps_own_key(make_dm):
+    dm = make_dm()
+    dm.update_profile_data("p", coffee_profile())
+    data = dm.get_profile_data("p")
+    catalog = dm.catalog("p")
+
+    assert set(data["stock"]) == {"7", "n:7"}
+    assert catalog.stock_name("7") == "Кофе"
+    assert catalog.stock_name("n:7") == "7"
+    assert dm.sales_totals("p", date(2024, 2, 1), date(2024, 2, 2)) == {
+        "7": (2.0, 600.0), "n:7": (1.0, 90.0)}
+    assert dm.product_sold("p", "Кофе") == (2.0, 600.0, 1)
+    assert dm.product_sold("p", "7") == (1.0, 90.0, 1)
+    assert [row[1:] for row in dm.query_sales("p", date(2024, 2, 1), date(2024, 2, 2))] == [
+        ("Кофе", 2.0, 600.0), ("7", 1.0, 90.0)]
+
+
+def test_name_keys_of_id_profile_get_prefix():
+    # Профиль, переведённый на id до format_version: ключи-названия без приставки
+    data = coffee_profile()
+    main._migrate_product_ids(data)
+    data["stock"] = {"7": data["stock"]["7"], "Чай": data["stock"].pop("n:7")}
+    data["sales_rollup"] = {"2024-02-02": {"Чай": {"quantity": 1.0, "total": 90.0}}}
+    del data["format_version"]
+
+    assert main._upgrade_profile(data)
+    assert set(data["stock"]) == {"7", "n:Чай"}
+    assert set(data["sales_rollup"]["2024-02-02"]) == {"n:Чай"}
+    assert data["format_version"] == main.PROFILE_FORMAT
+
+
+def test_product_ids_assigned_once():
+    data = {
+        "products": [{"name": "Мята", "cost_price": 20.0}, {"id": 4, "name": "Базилик", "cost_price": 35.0},
+                     {"name": "Укроп", "cost_price": 15.0}],
+        "stock": {"Укроп": {"current_quantity": 1.0, "total_value": 15.0, "history": []}},
+        "orders": [{"number": 1, "date": "2024-05-20", "total": 70.0,
+                    "items": [{"product": "Базилик", "quantity": 2.0, "total": 70.0},
+                              {"product": "Щавель", "quantity": 1.0, "total": 25.0}]}],
+    }
+    assert main._migrate_product_ids(data)
+    assert [(p["id"], p["name"]) for p in data["products"]] == [(5, "Мята"), (4, "Базилик"), (6, "Укроп")]
+    assert data["next_product_id"] == 7
+    assert list(data["stock"]) == ["6"]
+    assert data["orders"][0]["items"] == [{"quantity": 2.0, "total": 70.0, "product_id": 4},
+                                          {"product": "Щавель", "quantity": 1.0, "total": 25.0}]
+    assert not main._migrate_product_ids(data)
+
+
+def test_rename_keeps_order_history(make_dm):
+    dm = make_dm()
+    dm.update_profile_data("p", coffee_profile())
+    with dm.transaction("p") as tx:
+        tx.set(["products", 0, "name"], "Кофе в зёрнах")
+    data = dm.get_profile_data("p")
+    assert data["orders"][0]["items"][0]["product_id"] == 7
+    assert [row[1] for row in dm.query_sales("p", date(2024, 2, 1), date(2024, 2, 1))] == ["Кофе в зёрнах"]
+    assert dm.product_sold("p", "Кофе в зёрнах") == (2.0, 600.0, 1)
+
+
+def test_prefixed_keys_not_prefixed_again():
+    data = coffee_profile()
+    main._migrate_product_ids(data)
+    del data["format_version"]
+    main._upgrade_profile(data)
+    assert set(data["stock"]) == {"7", "n:7"}
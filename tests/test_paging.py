@@ -0,0 +1,89 @@
+import pytest
+
+from conftest import make_profile
+
+
+def stock_profile():
+    """Профиль с историями склада разной длины и совпадающими датами операций"""
+    data = make_profile(10)
+    for i, (stock_key, entry) in enumerate(data["stock"].items()):
+        for n in range(7 * (i + 1)):
+            entry["history"].append({
+                "date": f"2024-02-{n // 3 + 1:02d} 10:00:00", "quantity": -1.0, "price_per_kg": 100.0,
+                "operation": f"расход {stock_key}-{n}", "total_amount": 100.0, "balance_after": 49.0 - n
+            })
+    return data
+
+
+def expected_operations(data):
+    """Все операции склада новыми сверху: дата, затем порядок позиций, затем поздние операции"""
+    ops = [(op["date"], position, seq, op["operation"])
+           for position, entry in enumerate(data["stock"].values())
+           for seq, op in enumerate(entry["history"])]
+    ops.sort(key=lambda op: (op[0], -op[1], op[2]), reverse=True)
+    return [op[3] for op in ops]
+
+
+@pytest.mark.parametrize("limit", [1, 4, 100])
+def test_stock_operations_pages(make_dm, backend, limit):
+    dm = make_dm(backend)
+    data = stock_profile()
+    dm.update_profile_data("p", data)
+    expected = expected_operations(data)
+
+    seen, cursor = [], None
+    while True:
+        operations, cursor = dm.stock_operations_page("p", limit, cursor)
+        assert len(operations) <= limit
+        seen.extend(op["operation"] for op in operations)
+        if cursor is None:
+            break
+    assert seen == expected
+    assert dm.query_stock_operations("p", 5) == dm.stock_operations_page("p", 5)[0]
+    assert {op["product"] for op in dm.stock_operations_page("p", 100)[0]} == {"Товар 1", "Товар 2", "Товар 3"}
+
+    # Новая операция видна сразу, в том числе из таблиц SQLite
+    with dm.transaction("p") as tx:
+        tx.append(["stock", "2", "history"], {
+            "date": "2024-03-01 08:00:00", "quantity": 5.0, "price_per_kg": 200.0,
+            "operation": "приход новый", "total_amount": 1000.0, "balance_after": 20.0})
+    operations, cursor = dm.stock_operations_page("p", 2)
+    assert [op["operation"] for op in operations] == ["приход новый", expected[0]]
+    assert operations[0]["product"] == "Товар 2"
+
+
+@pytest.mark.parametrize("limit", [1, 7, 50])
+def test_orders_pages(make_dm, backend, limit):
+    dm = make_dm(backend)
+    data = make_profile(30)
+    # Номера не по порядку позиций и повтор номера (импорт старых данных)
+    data["orders"][3]["number"], data["orders"][20]["number"] = 21, 4
+    data["orders"][10]["number"] = 12
+    dm.update_profile_data("p", data)
+    expected = sorted(((o["number"], i) for i, o in enumerate(data["orders"])), reverse=True)
+
+    seen, cursor = [], None
+    while True:
+        orders, cursor = dm.orders_page("p", limit, cursor)
+        assert len(orders) <= limit
+        seen.extend((o["number"], o["date"]) for o in orders)
+        if cursor is None:
+            break
+    assert seen == [(number, data["orders"][i]["date"]) for number, i in expected]
+
+    with dm.transaction("p") as tx:
+        tx.append(["orders"], dict(data["orders"][0], number=31, date="2024-03-01"))
+    assert [o["number"] for o in dm.orders_page("p", 2)[0]] == [31, 30]
+
+
+def test_stock_operations_page_does_not_flush(make_dm, backend):
+    dm = make_dm(backend, write_behind_delay=3600)
+    dm.update_profile_data("p", stock_profile())
+    dm.flush()
+    with dm.transaction("p") as tx:
+        tx.append(["stock", "1", "history"], {
+            "date": "2024-03-01 08:00:00", "quantity": 1.0, "price_per_kg": 100.0,
+            "operation": "приход отложенный", "total_amount": 100.0, "balance_after": 51.0})
+    # Страница читается из памяти: отложенная запись остаётся фоновому потоку
+    assert dm.stock_operations_page("p", 1)[0][0]["operation"] == "приход отложенный"
+    assert dm._pending
@@ -0,0 +1,45 @@
+import main
+
+HONEY = [
+    {"number": 1, "date": "2024-08-01", "items": [
+        {"product_id": 3, "quantity": 1.0, "total": 500.0},
+        {"product_id": 8, "quantity": 2.0, "total": 240.0},
+        {"product_id": 3, "quantity": 0.5, "total": 250.0}]},
+    {"number": 2, "date": "2024-08-02", "items": [
+        {"product": "Прополис", "quantity": 1.0, "total": 900.0}]},
+    {"number": 3, "date": "2024-08-02", "items": [
+        {"product_id": 8, "quantity": 1.0, "total": 120.0}]},
+]
+
+
+def test_postings_and_sold():
+    postings = main.ProductPostings([main.Order.from_dict(o) for o in HONEY])
+    assert postings.postings("3") == [(0, 0), (0, 2)]
+    assert postings.postings("8") == [(0, 1), (2, 0)]
+    assert postings.postings("n:Прополис") == [(1, 0)]
+    assert postings.postings("5") == []
+    # Две позиции одного заказа — один заказ
+    assert postings.sold("3") == (1.5, 750.0, 1)
+    assert postings.sold("8") == (3.0, 360.0, 2)
+
+
+def test_postings_follow_transactions(make_dm):
+    dm = make_dm()
+    dm.update_profile_data("пасека", {
+        "products": [{"id": 3, "name": "Липовый мёд", "cost_price": 400.0},
+                     {"id": 8, "name": "Соты", "cost_price": 100.0}],
+        "stock": {}, "daily_stats": {}, "orders": [dict(o) for o in HONEY],
+        "next_order_number": 4, "next_product_id": 9})
+    postings = dm.postings("пасека")
+    with dm.transaction("пасека") as tx:
+        tx.append(["orders"], {"number": 4, "date": "2024-08-03", "items": [
+            {"product_id": 3, "quantity": 2.0, "total": 1000.0}]})
+    assert dm.postings("пасека") is postings
+    assert dm.product_sold("пасека", "липовый мёд") == (3.5, 1750.0, 2)
+
+    # Изменение позиции внутри заказа перестраивает индекс
+    with dm.transaction("пасека") as tx:
+        tx.set(["orders", 2, "items", 0, "product_id"], 3)
+    assert dm.product_sold("пасека", "Соты") == (2.0, 240.0, 1)
+    assert dm.product_sold("пасека", "Липовый мёд") == (4.5, 1870.0, 3)
+    assert dm.product_sold("пасека", "Прополис") == (1.0, 900.0, 1)
@@ -0,0 +1,64 @@
+import pytest
+
+import main
+
+SHOPS = {
+    "Цветы": (2, ["2024-02-14", "2024-03-08"]),
+    "Овощи": (5, ["2023-11-30"]),
+    "Книги": (1, []),
+}
+
+
+def shop(products, days):
+    return {
+        "products": [{"id": n + 1, "name": f"Товар {n + 1}", "cost_price": 10.0 * (n + 1)} for n in range(products)],
+        "stock": {}, "daily_stats": {},
+        "orders": [{"number": n + 1, "date": day, "subtotal": 50.0, "delivery_cost": 0.0, "total": 50.0,
+                    "items": [{"product_id": 1, "quantity": 1.0, "cost_price": 10.0, "total": 50.0}]}
+                   for n, day in enumerate(days)],
+        "next_order_number": len(days) + 1, "next_product_id": products + 1, "format_version": main.PROFILE_FORMAT,
+    }
+
+
+@pytest.fixture(params=('sharded', 'sqlite'))
+def lazy_backend(request):
+    return request.param
+
+
+def test_summaries_without_loading_profiles(make_dm, lazy_backend, monkeypatch):
+    dm = make_dm(lazy_backend)
+    for name, (products, days) in SHOPS.items():
+        dm.update_profile_data(name, shop(products, days))
+    dm.close()
+
+    dm = make_dm(lazy_backend)
+    monkeypatch.setattr(dm.storage, "load_profile", lambda name: pytest.fail(f"загружен профиль {name}"))
+    assert dm.list_profiles() == sorted(SHOPS)
+    assert dm.profile_summaries() == {
+        "Цветы": {"products": 2, "orders": 2, "last_activity": "2024-03-08"},
+        "Овощи": {"products": 5, "orders": 1, "last_activity": "2023-11-30"},
+        "Книги": {"products": 1, "orders": 0, "last_activity": ""},
+    }
+    assert dm._profiles == {}
+
+
+def test_least_recent_profiles_evicted(make_dm, lazy_backend):
+    dm = make_dm(lazy_backend)
+    for name, (products, days) in SHOPS.items():
+        dm.update_profile_data(name, shop(products, days))
+    dm.close()
+
+    dm = make_dm(lazy_backend, max_resident_profiles=2, write_behind_delay=60)
+    dm.get_profile_data("Цветы")
+    with dm.transaction("Цветы") as tx:
+        tx.set(["next_order_number"], 30)
+    dm.get_profile_data("Овощи")
+    dm.get_profile_data("Книги")
+    # Незаписанные изменения держат профиль в памяти, выгружен следующий
+    assert list(dm._profiles) == ["Цветы", "Книги"]
+
+    dm.flush()
+    dm.get_profile_data("Овощи")
+    assert list(dm._profiles) == ["Книги", "Овощи"]
+    assert dm.get_profile_data("Цветы")["next_order_number"] == 30
+    assert list(dm._profiles) == ["Овощи", "Цветы"]
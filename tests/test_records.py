@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import main
+
+ORDER = {"number": 17, "date": "2024-09-01", "note": "к двери",
+         "items": [{"product_id": 3, "quantity": 0.5, "cost_price": 400.0, "total": 260.0},
+                   {"product": "Снятый с продажи сыр", "quantity": 1.0, "cost_price": 300.0, "total": 390.0}],
+         "subtotal": 650.0, "delivery_cost": 150.0, "total": 800.0}
+
+
+def test_order_round_trip_keeps_order_and_unknown_keys():
+    order = main.Order.from_dict(json.loads(json.dumps(ORDER)))
+    assert order.positions[1].product == "Снятый с продажи сыр"
+    assert "product" not in order["items"][0] and "product_id" in order["items"][0]
+    assert order["note"] == "к двери"
+    assert list(order) == ["number", "date", "items", "subtotal", "delivery_cost", "total", "note"]
+    assert json.dumps(order.to_dict(), ensure_ascii=False) == json.dumps(
+        {k: ORDER[k] for k in order}, ensure_ascii=False)
+    assert not hasattr(order, "__dict__")
+
+
+def test_record_behaves_as_mapping():
+    product = main.Product(id=2, name="Чеснок", cost_price=180.0)
+    assert product.get("profit") is None and "profit" not in product
+    product["profit"] = 36.0
+    product["season"] = "осень"
+    del product["cost_price"]
+    assert dict(product) == {"id": 2, "name": "Чеснок", "profit": 36.0, "season": "осень"}
+    with pytest.raises(KeyError):
+        product["cost_price"]
+    with pytest.raises(KeyError):
+        del product["weight"]
+    assert product.stock_key == "2"
+
+
+def test_interned_strings_shared():
+    a = main.StockEntry.from_dict({"operation": "".join(["при", "ход"]), "quantity": 1.0})
+    b = main.StockEntry.from_dict({"operation": "".join(["прих", "од"]), "quantity": 2.0})
+    assert a.operation is b.operation
+
+
+@pytest.mark.parametrize("path, value, expected", [
+    (["products"], [{"id": 1, "name": "Лук"}], main.Product),
+    (["products", 0], {"id": 1, "name": "Лук"}, main.Product),
+    (["orders", 4], ORDER, main.Order),
+    (["orders", 4, "items", 0], ORDER["items"][0], main.OrderItem),
+    (["stock", "1", "history", 2], {"date": "2024-09-01 10:00:00", "quantity": 3.0}, main.StockEntry),
+])
+def test_values_written_by_path_become_records(path, value, expected):
+    converted = main._value_to_records(path, value)
+    record = converted[0] if isinstance(converted, list) else converted
+    assert type(record) is expected
+    assert json.loads(json.dumps(converted, default=main._records_default)) == json.loads(json.dumps(value))
+
+
+def test_other_values_left_as_is():
+    settings = {"delivery_enabled": True}
+    assert main._value_to_records(["settings"], settings) is settings
+    assert main._value_to_records(["stock", "1", "current_quantity"], 4.0) == 4.0
+    with pytest.raises(TypeError):
+        main._records_default(object())
@@ -0,0 +1,109 @@
+import threading
+from datetime import date
+
+import pytest
+
+import main
+from conftest import make_profile
+
+PERIOD = (date(2024, 1, 1), date(2024, 3, 31))
+
+
+@pytest.fixture
+def stored_dm(make_dm, backend):
+    """Три профиля в хранилище, в памяти — только последний открытый"""
+    if backend in ('json', 'journal'):
+        pytest.skip("в памяти все профили")
+    dm = make_dm(backend, max_resident_profiles=1)
+    for name in ("a", "b", "c"):
+        dm.update_profile_data(name, make_profile(30 + len(name)))
+    dm.get_profile_data("c")
+    return dm
+
+
+def test_report_fallback_reads_outside_lock(stored_dm, monkeypatch):
+    original = main._stored_profile_report
+    free = []
+
+    def probe(storage, name, *args):
+        # Профили из хранилища читаются без блокировки данных
+        probe_thread = threading.Thread(target=lambda: free.append(stored_dm._lock.acquire(timeout=1)
+                                                                   and stored_dm._lock.release() is None))
+        probe_thread.start()
+        probe_thread.join()
+        return original(storage, name, *args)
+
+    monkeypatch.setattr(main, "_stored_profile_report", probe)
+    report = stored_dm.consolidated_report(*PERIOD, workers=1)
+    assert list(report["profiles"]) == ["a", "b", "c"]
+    assert free == [True, True]
+    assert report["failed"] == {}
+    orders = make_profile(31)["orders"]
+    assert report["profiles"]["a"]["orders_count"] == len(orders)
+    assert report["profiles"]["a"]["revenue"] == pytest.approx(sum(order["total"] for order in orders))
+
+
+def test_report_skips_broken_profile(stored_dm, monkeypatch):
+    original = main._stored_profile_report
+
+    def broken(storage, name, *args):
+        if name == "b":
+            raise KeyError("total")
+        return original(storage, name, *args)
+
+    monkeypatch.setattr(main, "_stored_profile_report", broken)
+    report = stored_dm.consolidated_report(*PERIOD, workers=1)
+    assert list(report["profiles"]) == ["a", "c"]
+    assert list(report["failed"]) == ["b"]
+    assert report["total"]["orders_count"] == 31 + 31
+
+
+def dairy(shift=0.0):
+    """Молочный прилавок: заказы в периоде и вне его, удалённый товар в позиции"""
+    return {
+        "products": [{"id": 1, "name": "Творог", "cost_price": 200.0}, {"id": 2, "name": "Сметана", "cost_price": 90.0}],
+        "stock": {"1": {"current_quantity": 3.0, "total_value": 600.0, "history": []},
+                  "2": {"current_quantity": 0.0, "total_value": 0.0, "history": []}},
+        "orders": [
+            {"number": 1, "date": "2023-12-31", "total": 999.0, "items": [
+                {"product_id": 1, "quantity": 5.0, "total": 999.0}]},
+            {"number": 2, "date": "2024-01-15", "total": 350.0 + shift, "items": [
+                {"product_id": 1, "quantity": 1.0, "total": 250.0 + shift},
+                {"product": "Ряженка", "quantity": 1.0, "total": 100.0}]},
+            {"number": 3, "date": "2024-02-01", "total": 120.0, "items": [
+                {"product_id": 2, "quantity": 1.0, "total": 120.0}]},
+        ],
+        "daily_stats": {"2023-12-31": {"orders_count": 1, "total_revenue": 999.0},
+                        "2024-01-15": {"orders_count": 1, "delivery_count": 1, "delivery_sum": 50.0,
+                                       "total_revenue": 350.0 + shift},
+                        "2024-02-01": {"orders_count": 1, "total_revenue": 120.0}},
+        "next_order_number": 4, "next_product_id": 3, "format_version": main.PROFILE_FORMAT,
+    }
+
+
+def test_profile_report_counts_only_period():
+    data = main._profile_to_records(dairy())
+    part = main._profile_report(data, main.ProductCatalog(data["products"]), *PERIOD)
+    assert part["orders_count"] == 2 and part["revenue"] == 470.0
+    assert part["products"] == {"Творог": (1.0, 250.0), "Ряженка": (1.0, 100.0), "Сметана": (1.0, 120.0)}
+    assert part["daily_stats"] == {"orders_count": 2, "delivery_count": 1, "delivery_sum": 50.0,
+                                   "total_revenue": 470.0}
+    assert part["stock"] == {"total_value": 600.0, "total_quantity": 3.0, "sku_count": 2, "in_stock_count": 1}
+
+
+def test_report_same_in_processes_and_in_app(make_dm):
+    dm = make_dm('sharded', max_resident_profiles=1)
+    dm.update_profile_data("север", dairy())
+    dm.update_profile_data("юг", dairy(shift=30.0))
+    # В памяти — только пустой профиль, оба прилавка читаются из хранилища
+    dm.create_profile("запад")
+    dm.get_profile_data("запад")
+    assert list(dm._profiles) == ["запад"]
+    in_app = dm.consolidated_report(*PERIOD, workers=1)
+    in_processes = dm.consolidated_report(*PERIOD, workers=2)
+    assert in_processes == in_app
+    assert list(in_app["profiles"]) == ["запад", "север", "юг"]
+    assert in_app["failed"] == {}
+    assert in_app["total"]["revenue"] == 470.0 + 500.0
+    assert in_app["total"]["products"]["Творог"] == (2.0, 530.0)
+    assert in_app["total"]["stock"]["sku_count"] == 4
@@ -0,0 +1,50 @@
+from datetime import date
+
+import main
+
+ORDERS = [
+    {"number": 1, "date": "2024-3-5", "items": [
+        {"product_id": 1, "quantity": 1.5, "total": 300.0},
+        {"product_id": 1, "quantity": 0.5, "total": 100.0}]},
+    {"number": 2, "date": "2024-03-05", "items": [
+        {"product": "Старый чай", "quantity": 2.0, "total": 80.0}]},
+    {"number": 3, "date": "вчера", "items": [{"product_id": 1, "quantity": 9.0, "total": 900.0}]},
+    {"number": 4, "date": "2024-03-01", "items": [{"product_id": 2, "quantity": 3.0, "total": 45.0}]},
+]
+
+
+def test_rollup_built_from_orders():
+    rollup = main._build_sales_rollup(ORDERS)
+    assert rollup == {
+        "2024-03-01": {"2": {"quantity": 3.0, "total": 45.0}},
+        "2024-03-05": {"1": {"quantity": 2.0, "total": 400.0},
+                       "n:Старый чай": {"quantity": 2.0, "total": 80.0}},
+    }
+    assert list(rollup) == sorted(rollup)
+
+
+def test_rollup_add_returns_new_day():
+    day = {"1": {"quantity": 1.0, "total": 10.0}}
+    added = main._rollup_add(day, [{"product_id": 1, "quantity": 2.0, "total": 20.0},
+                                   {"product_id": 5, "quantity": 1.0, "total": 7.0}])
+    assert day == {"1": {"quantity": 1.0, "total": 10.0}}
+    assert added == {"1": {"quantity": 3.0, "total": 30.0}, "5": {"quantity": 1.0, "total": 7.0}}
+
+
+def test_query_sales_reads_rollup_like_orders(make_dm):
+    dm = make_dm()
+    dm.update_profile_data("p", {
+        "products": [{"id": 1, "name": "Пуэр", "cost_price": 150.0}, {"id": 2, "name": "Мате", "cost_price": 12.0}],
+        "stock": {}, "daily_stats": {}, "orders": [dict(o) for o in ORDERS],
+        "next_order_number": 5, "next_product_id": 3})
+    expected = [("2024-03-01", "Мате", 3.0, 45.0), ("2024-03-05", "Пуэр", 2.0, 400.0),
+                ("2024-03-05", "Старый чай", 2.0, 80.0)]
+    assert dm.query_sales("p", date(2024, 3, 1), date(2024, 3, 31)) == expected
+    assert dm.query_sales("p", date(2024, 3, 1), date(2024, 3, 31), "пуэр") == [expected[1]]
+
+    # Испорченный свод восстанавливается пересчётом по заказам
+    with dm.transaction("p") as tx:
+        tx.delete(["sales_rollup", "2024-03-05"])
+    assert dm.query_sales("p", date(2024, 3, 1), date(2024, 3, 31)) == expected[:1]
+    assert dm.rebuild_sales_rollup("p") == 2
+    assert dm.query_sales("p", date(2024, 3, 1), date(2024, 3, 31)) == expected
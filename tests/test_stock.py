@@ -0,0 +1,72 @@
+import main
+
+
+def flour_profile(stock_totals=None):
+    """Профиль текущего формата: мука и сахар на складе"""
+    data = {
+        "products": [{"id": 1, "name": "Мука", "cost_price": 40.0}, {"id": 2, "name": "Сахар", "cost_price": 70.0}],
+        "stock": {"1": {"current_quantity": 25.0, "total_value": 1000.0, "history": []},
+                  "2": {"current_quantity": 0.0, "total_value": 0.0, "history": []}},
+        "orders": [], "daily_stats": {}, "sales_rollup": {},
+        "next_order_number": 1, "next_product_id": 3, "format_version": main.PROFILE_FORMAT,
+    }
+    if stock_totals is not None:
+        data["stock_totals"] = stock_totals
+    return data
+
+
+def test_missing_stock_totals_built_silently(capsys):
+    data = flour_profile()
+    assert main._upgrade_profile(data)
+    assert data["stock_totals"] == main._build_stock_totals(data["stock"])
+    assert "[!]" not in capsys.readouterr().out
+
+
+def test_stock_totals_not_rechecked_on_load(capsys):
+    stale = dict(main._build_stock_totals({}), total_value=5.0)
+    data = flour_profile(stale)
+    assert not main._upgrade_profile(data)
+    assert data["stock_totals"] is stale
+    assert capsys.readouterr().out == ""
+
+
+def test_stock_totals_checked_in_debug(monkeypatch, capsys):
+    monkeypatch.setattr(main, "VERIFY_STOCK_TOTALS", True)
+    data = flour_profile(main._build_stock_totals(flour_profile()["stock"]))
+    assert not main._upgrade_profile(data)
+    assert capsys.readouterr().out == ""
+
+    data["stock_totals"] = dict(data["stock_totals"], total_value=5.0)
+    assert main._upgrade_profile(data)
+    assert data["stock_totals"]["total_value"] == 1000.0
+    assert "[!] Сводка склада расходилась" in capsys.readouterr().out
+
+
+def test_incremental_totals_match_recount(make_dm):
+    dm = make_dm()
+    dm.update_profile_data("p", flour_profile())
+    # Приход сахара, продажа всей муки, новая позиция и её удаление
+    changes = [("2", (12.5, 875.0)), ("1", (0.0, 0.0)), ("3", (4.2, 63.0)), ("3", None), ("2", (0.1, 7.0))]
+    for key, after in changes:
+        stock = dm.get_profile_data("p")["stock"]
+        before = (stock[key]["current_quantity"], stock[key]["total_value"]) if key in stock else None
+        with dm.transaction("p") as tx:
+            if after is None:
+                tx.delete(["stock", key])
+            else:
+                tx.set(["stock", key], {"current_quantity": after[0], "total_value": after[1], "history": []})
+            main._update_stock_totals(tx, before, after)
+        assert dm.stock_totals("p") == main._build_stock_totals(dm.get_profile_data("p")["stock"])
+    assert dm.stock_totals("p") == {"total_value": 7.0, "total_quantity": 0.1, "sku_count": 2, "in_stock_count": 1}
+    assert dm.check_stock_totals("p")
+
+
+def test_check_stock_totals_repairs(make_dm, capsys):
+    dm = make_dm()
+    dm.update_profile_data("p", flour_profile())
+    with dm.transaction("p") as tx:
+        tx.set(["stock_totals"], dict(dm.stock_totals("p"), sku_count=7))
+    assert not dm.check_stock_totals("p")
+    assert "[!] Сводка склада расходилась" in capsys.readouterr().out
+    assert dm.stock_totals("p")["sku_count"] == 2
+    assert dm.check_stock_totals("p")
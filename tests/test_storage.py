@@ -0,0 +1,183 @@
+import json
+import os
+import shutil
+
+import main
+from conftest import make_profile
+
+
+def test_sqlite_serializes_records_in_extra_and_sections(make_dm):
+    dm = make_dm('sqlite')
+    dm.update_profile_data("p", make_profile(10))
+    data = dm.get_profile_data("p")
+    product = data["products"][0]
+    with dm.transaction("p") as tx:
+        # Записи модели вне столбцов таблиц: в extra строки и в прочем разделе
+        tx.set(["orders", 0, "replaces"], data["orders"][1])
+        tx.set(["favorites"], [product])
+    dm.close()
+
+    loaded = make_dm('sqlite').get_profile_data("p")
+    assert loaded["orders"][0]["replaces"]["number"] == 2
+    assert loaded["favorites"][0]["name"] == product["name"]
+
+
+def plain(data):
+    """Данные профиля без записей модели, для сравнения после перезагрузки"""
+    return json.loads(json.dumps(data, default=main._records_default))
+
+
+def change_profile(dm):
+    """Транзакции всех видов: замена, добавление в список, удаление ключа, история склада"""
+    data = dm.get_profile_data("p")
+    with dm.transaction("p") as tx:
+        tx.set(["products", 1, "cost_price"], 250.0)
+        tx.set(["stock", "1", "current_quantity"], 45.0)
+        tx.set(["stock", "1", "total_value"], 4500.0)
+        main._update_stock_totals(tx, (50.0, 5000.0), (45.0, 4500.0))
+        tx.append(["stock", "1", "history"], {
+            "date": "2024-05-01 12:00:00", "quantity": -5.0, "price_per_kg": 100.0,
+            "operation": "расход", "total_amount": 500.0, "balance_after": 45.0})
+        tx.append(["orders"], dict(data["orders"][0], number=data["next_order_number"], date="2024-05-01"))
+        tx.set(["next_order_number"], data["next_order_number"] + 1)
+        tx.delete(["daily_stats", "2024-01-02"])
+        tx.set(["settings"], {"delivery_enabled": True})
+
+
+def test_backend_round_trip(make_dm, backend):
+    dm = make_dm(backend)
+    dm.update_profile_data("p", make_profile(40))
+    dm.update_profile_data("q", make_profile(5))
+    change_profile(dm)
+    dm.delete_profile("q")
+    expected = plain(dm.get_profile_data("p"))
+    dm.close()
+
+    loaded = make_dm(backend)
+    assert loaded.list_profiles() == ["p"]
+    assert not loaded.has_profile("q")
+    assert plain(loaded.get_profile_data("p")) == expected
+
+    # Изменения поверх перезагруженного профиля тоже сохраняются
+    with loaded.transaction("p") as tx:
+        tx.set(["products", 0, "name"], "Товар переименованный")
+    expected = plain(loaded.get_profile_data("p"))
+    loaded.close()
+    assert plain(make_dm(backend).get_profile_data("p")) == expected
+
+
+def test_write_behind_flush(make_dm, backend):
+    dm = make_dm(backend, write_behind_delay=3600)
+    dm.update_profile_data("p", make_profile(20))
+    dm.flush()
+    change_profile(dm)
+    expected = plain(dm.get_profile_data("p"))
+    assert expected != plain(make_dm(backend).get_profile_data("p"))
+
+    # Отложенная запись выполняется по flush и при закрытии
+    dm.flush()
+    assert plain(make_dm(backend).get_profile_data("p")) == expected
+    with dm.transaction("p") as tx:
+        tx.set(["next_order_number"], 100)
+    dm.close()
+    assert make_dm(backend).get_profile_data("p")["next_order_number"] == 100
+
+
+def add_order(dm, day):
+    """Заказ с дневной статистикой и сводом продаж, как в OrderScreen.save_order"""
+    data = dm.get_profile_data("p")
+    order = dict(data["orders"][0], number=data["next_order_number"], date=day)
+    with dm.transaction("p") as tx:
+        tx.append(["orders"], order)
+        tx.set(["daily_stats", day], {"orders_count": 1, "delivery_count": 0,
+                                      "delivery_sum": 0.0, "total_revenue": order["total"]})
+        tx.set(["sales_rollup", day], main._rollup_add({}, order["items"]))
+        tx.set(["next_order_number"], order["number"] + 1)
+
+
+def test_sharded_order_writes_only_touched_parts(make_dm, monkeypatch):
+    dm = make_dm()
+    dm.update_profile_data("p", make_profile(1200))
+    saved = []
+    save_safe = dm._save_safe
+    monkeypatch.setattr(dm, "_save_safe", lambda data, path: saved.append(path) or save_safe(data, path))
+
+    add_order(dm, "2027-04-15")
+    profile_dir = dm.storage._profile_dir("p")
+    assert sorted(os.path.relpath(path, profile_dir) for path in saved if path.startswith(profile_dir)) == [
+        os.path.join("daily_stats", "2027-04.json"), "meta.json",
+        os.path.join("orders", "000002.json"), os.path.join("sales_rollup", "2027-04.json")]
+    expected = plain(dm.get_profile_data("p"))
+    dm.close()
+    assert plain(make_dm().get_profile_data("p")) == expected
+
+
+def test_sharded_migration_and_rollback(make_dm, tmp_path):
+    dm = make_dm()
+    dm.update_profile_data("p", make_profile(700))
+    expected = plain(dm.get_profile_data("p"))
+    profile_dir = dm.storage._profile_dir("p")
+    dm.close()
+
+    # Каталог прежнего формата 2: разделы заказов и дней целыми файлами
+    for section in ("orders", "daily_stats", "sales_rollup"):
+        section_dir = tmp_path / "profiles" / os.path.basename(profile_dir) / section
+        loaded = [json.loads(path.read_text(encoding="utf-8")) for path in sorted(section_dir.iterdir())]
+        value = [o for part in loaded for o in part] if section == "orders" else \
+            {day: entry for part in loaded for day, entry in part.items()}
+        shutil.rmtree(section_dir)
+        section_dir.with_suffix(".json").write_text(json.dumps(value, ensure_ascii=False), encoding="utf-8")
+    index_file = tmp_path / "profiles" / "index.json"
+    index = json.loads(index_file.read_text(encoding="utf-8"))
+    index["format"] = 2
+    index_file.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+
+    dm = make_dm()
+    assert plain(dm.get_profile_data("p")) == expected
+    assert os.path.exists(os.path.join(profile_dir, "orders.json.migrated"))
+    assert not os.path.exists(os.path.join(profile_dir, "orders.json"))
+    dm.close()
+
+    # Возврат на 'json' переносит профили из каталогов обратно в profiles.json
+    dm = make_dm('json')
+    assert plain(dm.get_profile_data("p")) == expected
+    dm.close()
+    assert (tmp_path / "profiles.migrated").is_dir()
+    assert plain(make_dm().get_profile_data("p")) == expected
+
+
+def cafe(orders_total):
+    """Кафе с одним товаром и одним заказом на сумму orders_total"""
+    return {
+        "products": [{"id": 1, "name": "Капучино", "cost_price": 60.0}],
+        "stock": {"1": {"current_quantity": 2.0, "total_value": 120.0, "history": []}},
+        "orders": [{"number": 1, "date": "2025-03-08", "subtotal": orders_total, "delivery_cost": 0.0,
+                    "total": orders_total, "items": [{"product_id": 1, "quantity": 1.0, "cost_price": 60.0,
+                                                      "total": orders_total}]}],
+        "daily_stats": {}, "next_order_number": 2, "next_product_id": 2, "format_version": main.PROFILE_FORMAT,
+    }
+
+
+def test_sharded_index_lists_profiles_from_profiles_json(make_dm, tmp_path):
+    dm = make_dm('json')
+    dm.update_profile_data("Кафе «Ромашка»", cafe(150.0))
+    dm.update_profile_data("склад/север", cafe(90.0))
+    dm.close()
+
+    dm = make_dm()
+    assert (tmp_path / "profiles.json.migrated").exists()
+    index = json.loads(main._decode_snapshot((tmp_path / "profiles" / "index.json").read_bytes()))
+    assert index["format"] == main.ShardedStorage.FORMAT
+    assert sorted(index["profiles"]) == ["Кафе «Ромашка»", "склад/север"]
+    # Каталоги — безопасные имена: ASCII-часть и хэш полного имени
+    for name, entry in index["profiles"].items():
+        assert entry["dir"] == main.ShardedStorage._file_name(name)
+        assert (tmp_path / "profiles" / entry["dir"] / "orders").is_dir()
+    assert dm.profile_summaries()["склад/север"]["orders"] == 1
+    assert dm.get_profile_data("склад/север")["orders"][0]["total"] == 90.0
+
+    north_dir = dm.storage._profile_dir("склад/север")
+    dm.delete_profile("склад/север")
+    dm.close()
+    assert not os.path.exists(north_dir)
+    assert make_dm().list_profiles() == ["Кафе «Ромашка»"]
@@ -0,0 +1,70 @@
+from datetime import date
+
+import pytest
+
+import main
+
+
+@pytest.mark.parametrize("day, granularity, label", [
+    (date(2024, 3, 15), 'day', "2024-03-15"),
+    (date(2024, 3, 15), 'week', "2024-W11"),
+    (date(2024, 12, 31), 'week', "2025-W01"),
+    (date(2021, 1, 1), 'week', "2020-W53"),
+    (date(2024, 2, 29), 'month', "2024-02"),
+    (date(2024, 3, 31), 'quarter', "2024-Q1"),
+    (date(2024, 10, 1), 'quarter', "2024-Q4"),
+])
+def test_period_label(day, granularity, label):
+    assert main._period_label(main._period_start(day.toordinal(), granularity), granularity) == label
+
+
+def entry(qty, total):
+    return {"quantity": qty, "total": total}
+
+
+ROLLUP = {
+    "2024-03-29": {"1": entry(1.0, 10.0)},
+    "2024-03-31": {"1": entry(2.0, 20.0), "n:Берёза": entry(1.0, 5.0)},
+    "2024-04-01": {"2": entry(4.0, 44.0)},
+    "2024-04-16": {"1": entry(1.0, 10.0)},
+    "2024-07-02": {"2": entry(1.0, 11.0)},
+}
+
+
+def starts(periods, granularity):
+    return [(main._period_label(start, granularity), sums) for start, sums in periods]
+
+
+def test_periods_trim_edges_by_days():
+    tiers = main.SalesRollupTiers(ROLLUP)
+    assert starts(tiers.periods('month', date(2024, 3, 30), date(2024, 4, 30)), 'month') == [
+        ("2024-03", {"1": (2.0, 20.0), "n:Берёза": (1.0, 5.0)}),
+        ("2024-04", {"2": (4.0, 44.0), "1": (1.0, 10.0)}),
+    ]
+    assert starts(tiers.periods('quarter', date(2024, 1, 1), date(2024, 12, 31)), 'quarter') == [
+        ("2024-Q1", {"1": (3.0, 30.0), "n:Берёза": (1.0, 5.0)}),
+        ("2024-Q2", {"2": (4.0, 44.0), "1": (1.0, 10.0)}),
+        ("2024-Q3", {"2": (1.0, 11.0)}),
+    ]
+    # Неделя 25.03–31.03 и неделя 01.04–07.04
+    assert [label for label, _ in starts(tiers.periods('week', date(2024, 3, 25), date(2024, 4, 7)), 'week')] == [
+        "2024-W13", "2024-W14"]
+
+
+def test_tiers_follow_changed_days(make_dm):
+    dm = make_dm()
+    dm.update_profile_data("лес", {"products": [{"id": 1, "name": "Дуб"}, {"id": 2, "name": "Клён"}],
+                                   "stock": {}, "orders": [], "daily_stats": {}, "next_order_number": 1,
+                                   "next_product_id": 3, "sales_rollup": {k: dict(v) for k, v in ROLLUP.items()}})
+    tiers = dm._profile_index("лес", "sales_tiers")
+    with dm.transaction("лес") as tx:
+        tx.set(["sales_rollup", "2024-05-20"], {"1": entry(3.0, 30.0)})
+        tx.delete(["sales_rollup", "2024-04-01"])
+    assert dm._profile_index("лес", "sales_tiers") is tiers
+    assert starts(tiers.periods('quarter', date(2024, 4, 1), date(2024, 6, 30)), 'quarter') == [
+        ("2024-Q2", {"1": (4.0, 40.0)})]
+
+    rows, totals = dm.sales_analysis("лес", date(2024, 3, 1), date(2024, 5, 31), granularity='month')
+    assert [(row[0], row[1], row[3]) for row in rows] == [
+        ("2024-03", "Дуб", 30.0), ("2024-03", "Берёза", 5.0), ("2024-04", "Дуб", 10.0), ("2024-05", "Дуб", 30.0)]
+    assert totals[:2] == (8.0, 75.0)
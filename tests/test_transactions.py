@@ -0,0 +1,57 @@
+import json
+from datetime import date
+
+import pytest
+
+import main
+from conftest import make_profile
+
+
+def plain(data):
+    return json.loads(json.dumps(data, default=main._records_default))
+
+
+def test_failed_transaction_rolls_back(make_dm, backend):
+    dm = make_dm(backend)
+    dm.update_profile_data("p", make_profile(10))
+    data = dm.get_profile_data("p")
+    expected = plain(data)
+    sold = dm.product_sold("p", "Товар 1")
+    totals = dm.daily_totals("p", date(2024, 1, 1), date(2024, 1, 31))
+
+    with pytest.raises(RuntimeError):
+        with dm.transaction("p") as tx:
+            tx.set(["next_order_number"], 999)
+            tx.set(["settings", "theme", "name"], "dark")
+            tx.set(["products", 0, "name"], "Другое название")
+            tx.append(["orders"], dict(data["orders"][0], number=11, date="2024-02-01"))
+            tx.delete(["daily_stats", "2024-01-02"])
+            raise RuntimeError("ошибка посреди транзакции")
+
+    # Память совпадает с тем, что было, индексы — с памятью, хранилище — с памятью
+    assert plain(dm.get_profile_data("p")) == expected
+    assert dm.product_sold("p", "Товар 1") == sold
+    assert dm.daily_totals("p", date(2024, 1, 1), date(2024, 1, 31)) == totals
+    dm.close()
+    assert plain(make_dm(backend).get_profile_data("p")) == expected
+
+
+def test_mark_dirty_drops_all_section_indexes(make_dm):
+    dm = make_dm()
+    dm.update_profile_data("p", make_profile(12))
+    sold = dm.product_sold("p", "Товар 1")
+    first, last = date(2024, 1, 1), date(2024, 1, 31)
+    dm.sales_analysis("p", first, last, granularity='month')
+    data = dm.get_profile_data("p")
+
+    # Изменение разделов напрямую в памяти, без транзакции
+    order = dict(data["orders"][0], number=13, date="2024-01-05")
+    data["orders"].append(main._value_to_records(["orders", 12], order))
+    dm.mark_dirty("p", ("orders",))
+    data["sales_rollup"]["2024-01-05"] = main._rollup_add(data["sales_rollup"]["2024-01-05"], order["items"])
+    dm.mark_dirty("p", ("sales_rollup",))
+
+    assert dm.product_sold("p", "Товар 1") == (sold[0] + order["items"][0]["quantity"],
+                                                sold[1] + order["total"], sold[2] + 1)
+    month = dm.sales_analysis("p", first, last, granularity='month')
+    assert sum(row[3] for row in month[0]) == pytest.approx(sum(o["total"] for o in data["orders"]))